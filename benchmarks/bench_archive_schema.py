@@ -0,0 +1,154 @@
+"""
+歸檔 schema 基準測試：以舊版自由格式 (巢狀 ai_analysis、content/note 重複、任意 frontmatter 欄位) 寫出 N 筆歸檔，
+複製一份執行一次性遷移，再以子行程量測各讀取端 (System State / Rollups / Tag Graph / 全文索引) 的耗時與峰值記憶體，
+並確認遷移前後算出的結果相同。
+
+用法: python benchmarks/bench_archive_schema.py [--count 20000] [--workdir /tmp/lifeos-schema]
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+import pandas as pd
+
+# [Path Fix]
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(ROOT)
+from bench_pipeline import generate_inbox
+
+# 舊版讀取：每段整檔讀入 (除 embedding 外的所有欄位)，讀取端再自行攤平 ai_analysis (計入耗時)
+LEGACY_READ = """
+def read(columns=None):
+    from src.utils.archive_schema import to_archive_frame
+    import pyarrow.parquet as pq
+    frames = []
+    for seg in sorted(json.load(open('data/archive/manifest.json'))['segments'], key=lambda s: s['seq']):
+        path = os.path.join('data/archive', seg['path'])
+        names = pq.read_schema(path).names
+        cols = [c for c in names if c != 'embedding'] if columns is None else [c for c in columns if c in names]
+        frames.append(pd.read_parquet(path, columns=cols))
+    df = pd.concat(frames, ignore_index=True)
+    df['date'] = pd.to_datetime(df['date'])
+    return to_archive_frame(archive_store.dedup_entries(df))
+"""
+
+TYPED_READ = """
+def read(columns=None):
+    return archive_store.read_archive(columns=columns)
+"""
+
+# 讀取端 -> (舊版欄位, 新版欄位, 由 DataFrame 算出可比較結果的程式碼)
+CONSUMERS = {
+    "system_state": (None, "STATE_COLUMNS",
+                     "result = generate_system_state(df)"),
+    "rollups": (None, "rollups.ROLLUP_COLUMNS",
+                "result = rollups.daily_buckets(df)"),
+    "tag_graph": (['uuid', 'date', 'ai_analysis'], ['uuid', 'date', 'entry_tags'],
+                  "g = tag_graph.TagGraph(path=os.devnull + '.json'); g.update(df); result = g.entries"),
+    "fulltext": (['uuid', 'date', 'content', 'note'], ['uuid', 'date', 'content'],
+                 "result = sorted(df['content'].fillna('').map(len).tolist())"),
+}
+
+PROBE = """
+import json, os, sys, time
+sys.path.insert(0, {root!r})
+import pandas as pd
+from src.utils import archive_store, rollups, tag_graph
+from src.utils.analytics import generate_system_state, STATE_COLUMNS
+{reader}
+started = time.perf_counter()
+df = read({columns})
+seconds = time.perf_counter() - started
+{code}
+with open({out!r}, 'w') as f:
+    # VmHWM 在 exec 時重設 (ru_maxrss 會沿用 fork 前父行程的峰值)
+    peak = next(int(line.split()[1]) for line in open('/proc/self/status') if line.startswith('VmHWM'))
+    json.dump({{"seconds": seconds, "peak_rss_mb": peak / 1024,
+               "result": json.loads(json.dumps(result, default=str))}}, f)
+"""
+
+
+def build_legacy_archive(workdir, count):
+    """以 compaction 的解析方式讀 Inbox，並用舊版寫法 (DataFrame.to_parquet) 寫出無 schema 的段"""
+    sys.path.insert(0, ROOT)
+    from src.utils.inbox_reader import load_inbox, filename_date
+
+    generate_inbox(workdir, count, dim=8)
+    rows = []
+    for record in load_inbox(os.path.join(workdir, "data", "inbox")):
+        if not record["md_path"]:
+            continue
+        entry = dict(record["metadata"])
+        entry.setdefault('date', filename_date(record["md_path"]))
+        entry['content'] = entry['note'] = record["content"]
+        entry['ai_analysis'] = record["sidecar"]["analysis"]
+        entry['mood'] = entry.get('mood', entry['ai_analysis'].get('mood'))
+        rows.append(entry)
+    shutil.rmtree(os.path.join(workdir, "data", "inbox"))
+
+    df = pd.DataFrame(rows)
+    df['date'] = pd.to_datetime(df['date'])
+    archive = os.path.join(workdir, "data", "archive")
+    segments = []
+    for seq, (month, group) in enumerate(df.groupby(df['date'].dt.strftime('%Y-%m'), sort=True), 1):
+        rel_path = f"segments/{month[:4]}/{month[5:]}/seg-{seq:06d}-legacy.parquet"
+        os.makedirs(os.path.dirname(os.path.join(archive, rel_path)), exist_ok=True)
+        group.reset_index(drop=True).to_parquet(os.path.join(archive, rel_path), compression='snappy', index=False)
+        segments.append({"id": f"seg-{seq:06d}-legacy", "seq": seq, "month": month, "path": rel_path,
+                         "rows": len(group), "bytes": os.path.getsize(os.path.join(archive, rel_path))})
+    manifest = {"version": 2, "next_seq": len(segments) + 1, "segments": segments, "embeddings_externalized": True}
+    with open(os.path.join(archive, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    return len(df)
+
+
+def dir_size(path):
+    return sum(os.path.getsize(os.path.join(d, f)) for d, _, files in os.walk(path) for f in files)
+
+
+def probe(workdir, reader, columns, code):
+    out = os.path.join(workdir, "probe.json")
+    script = PROBE.format(root=ROOT, reader=reader, columns=columns, code=code, out=out)
+    subprocess.run([sys.executable, "-c", script], cwd=workdir, check=True, stdout=subprocess.DEVNULL)
+    with open(out, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--count", type=int, default=20000)
+    parser.add_argument("--workdir", help="Where to generate data (default: a temp dir, removed afterwards).")
+    args = parser.parse_args()
+
+    base = args.workdir or tempfile.mkdtemp(prefix="lifeos-schema-")
+    legacy_dir, typed_dir = os.path.join(base, "legacy"), os.path.join(base, "typed")
+    try:
+        shutil.rmtree(base, ignore_errors=True)
+        os.makedirs(legacy_dir)
+        rows = build_legacy_archive(legacy_dir, args.count)
+        shutil.copytree(legacy_dir, typed_dir)
+        subprocess.run([sys.executable, "-c", f"import sys; sys.path.insert(0, {ROOT!r})\n"
+                        "from src.utils import archive_store\narchive_store.migrate_archive_schema()"],
+                       cwd=typed_dir, check=True, stdout=subprocess.DEVNULL)
+        seg_dir = os.path.join("data", "archive", "segments")
+        print(f"📦 {rows} rows | segments: legacy {dir_size(os.path.join(legacy_dir, seg_dir)) / 1e6:.2f} MB, "
+              f"typed {dir_size(os.path.join(typed_dir, seg_dir)) / 1e6:.2f} MB")
+
+        print(f"\n{'consumer':<14}{'legacy s':>10}{'typed s':>10}{'legacy MB':>11}{'typed MB':>10}")
+        for name, (legacy_cols, typed_cols, code) in CONSUMERS.items():
+            old = probe(legacy_dir, LEGACY_READ, repr(legacy_cols), code)
+            new = probe(typed_dir, TYPED_READ, typed_cols if isinstance(typed_cols, str) else repr(typed_cols), code)
+            assert old["result"] == new["result"], f"{name}: results differ after migration"
+            print(f"{name:<14}{old['seconds']:>10.2f}{new['seconds']:>10.2f}{old['peak_rss_mb']:>11.0f}{new['peak_rss_mb']:>10.0f}")
+        print("\n✅ Consumer results identical before and after migration.")
+    finally:
+        if not args.workdir:
+            shutil.rmtree(base, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
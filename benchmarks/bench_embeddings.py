@@ -0,0 +1,98 @@
+"""
+Embedding 量化基準測試：以分群的合成向量 (模擬真實 embedding 的主題聚集) 建立 float32 歸檔矩陣與 int8 副本，
+比較儲存大小、載入時間、查詢 / 全歸檔近鄰計算的耗時，以及 int8 計分相對 float32 精確結果的 recall@k。
+
+用法: python benchmarks/bench_embeddings.py [--count 20000] [--dim 768] [--queries 500] [-k 10]
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+# [Path Fix]
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.utils import embedding_store
+from src.utils import semantic_search
+
+
+def synthetic_vectors(count, dim, clusters=64, seed=7):
+    """主題中心 + 雜訊，並加上常見的共同偏移 (真實 embedding 彼此 cosine 多半為正)"""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim)).astype(np.float32)
+    shared = rng.normal(size=dim).astype(np.float32) * 0.8
+    labels = rng.integers(0, clusters, size=count)
+    noise = rng.normal(size=(count, dim)).astype(np.float32) * 1.2
+    return centers[labels] + shared + noise
+
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def recall(exact, approx):
+    hits = sum(len(set(e[0].tolist()) & set(a[0].tolist())) for e, a in zip(exact, approx))
+    return hits / max(1, sum(len(e[0]) for e in exact))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--count", type=int, default=20000)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("-k", type=int, default=10)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="lifeos-embed-")
+    cwd = os.getcwd()
+    try:
+        os.chdir(workdir)
+        vectors = synthetic_vectors(args.count, args.dim)
+        embedding_store.append_embeddings((f"e{i:06d}", v) for i, v in enumerate(vectors))
+        index = embedding_store.load_index()
+        index["quantized"] = 0
+        _, t_build = timed(embedding_store.build_quantized, index)
+        embedding_store.save_index(index)
+
+        f32_bytes = os.path.getsize(embedding_store.VECTORS_PATH)
+        i8_bytes = os.path.getsize(embedding_store.CODES_PATH) + os.path.getsize(embedding_store.SCALES_PATH)
+        print(f"🧮 {args.count} x {args.dim} | float32 {f32_bytes / 1e6:.1f} MB -> int8 {i8_bytes / 1e6:.1f} MB "
+              f"(x{f32_bytes / i8_bytes:.1f}) | quantize {t_build:.2f}s")
+
+        (_, dense), t_load_f32 = timed(semantic_search.load_normalized_matrix, index)
+        codes, scales = embedding_store.open_quantized(index)
+        quant, t_load_i8 = timed(lambda: semantic_search.Int8Matrix(np.array(codes), np.array(scales)))
+        print(f"📂 load: float32 {t_load_f32:.3f}s ({dense.nbytes / 1e6:.0f} MB) | "
+              f"int8 {t_load_i8:.3f}s ({(quant.codes.nbytes + quant.scales.nbytes) / 1e6:.0f} MB)")
+
+        # 查詢：歸檔中隨機取樣的紀錄 (排除自己)
+        rng = np.random.default_rng(11)
+        rows = rng.choice(args.count, size=min(args.queries, args.count), replace=False)
+        queries = dense[rows]
+        exact, t_f32 = timed(semantic_search.top_k, dense, queries, args.k, exclude_rows=list(rows))
+        approx, t_i8 = timed(semantic_search.top_k, quant, queries, args.k, exclude_rows=list(rows))
+        errors = [np.abs(np.sort(e[1]) - np.sort(np.asarray(quant.scores(queries[i:i + 1]))[0, e[0]])).max()
+                  for i, e in enumerate(exact[:50])]
+        print(f"🔍 {len(rows)} queries: float32 {t_f32:.3f}s | int8 {t_i8:.3f}s | "
+              f"recall@{args.k} {recall(exact, approx):.4f} | max |Δscore| {max(errors):.4f}")
+
+        # 全歸檔近鄰 (compaction 的 neighbors.json)：query 本身也來自 int8 副本
+        sample = slice(0, min(2000, args.count))
+        exact_nb, t_nb_f32 = timed(semantic_search.top_k, dense, dense[sample], args.k,
+                                   exclude_rows=list(range(args.count))[sample])
+        approx_nb, t_nb_i8 = timed(semantic_search.top_k, quant, quant[sample], args.k,
+                                   exclude_rows=list(range(args.count))[sample])
+        print(f"🧭 neighbors ({sample.stop} rows): float32 {t_nb_f32:.2f}s | int8 {t_nb_i8:.2f}s | "
+              f"recall@{args.k} {recall(exact_nb, approx_nb):.4f}")
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
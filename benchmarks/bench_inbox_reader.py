@@ -0,0 +1,157 @@
+"""
+Inbox 讀取基準測試：比較舊版逐一讀取 (frontmatter.load + 純 Python YAML + json.load) 與
+inbox_reader.iter_inbox (C YAML loader + 執行緒 / 行程池)，並確認解析結果 (含檔名日期推算) 完全相同。
+
+用法: python benchmarks/bench_inbox_reader.py [--count 5000] [--workers 1,4,8] [--dim 768]
+"""
+import argparse
+import glob
+import json
+import os
+import re
+import shutil
+import sys
+import tempfile
+import time
+
+import yaml
+import frontmatter
+
+# [Path Fix]
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.utils import inbox_reader
+from bench_pipeline import generate_inbox
+
+
+class _PureYAMLHandler(frontmatter.YAMLHandler):
+    def load(self, fm, **kwargs):
+        kwargs.setdefault("Loader", yaml.SafeLoader)
+        return super().load(fm, **kwargs)
+
+
+def legacy_load_inbox(inbox_dir):
+    """舊版：逐一 frontmatter.load / json.load (YAML 固定走純 Python SafeLoader)"""
+    handler = _PureYAMLHandler()
+    records = []
+    for md_path in glob.glob(os.path.join(inbox_dir, "*.md")):
+        json_path = md_path.replace('.md', '.json')
+        record = {"md_path": md_path, "json_path": json_path if os.path.exists(json_path) else None,
+                  "metadata": None, "content": None, "sidecar": None, "error": None, "sidecar_error": None}
+        try:
+            with open(md_path, 'r', encoding='utf-8') as f:
+                text = f.read()
+            detected = frontmatter.detect_format(text, frontmatter.handlers)
+            post = frontmatter.loads(text, handler=handler if isinstance(detected, frontmatter.YAMLHandler) else detected)
+            record["metadata"] = post.metadata
+            record["content"] = post.content
+        except Exception as e:
+            record["error"] = e
+        if record["json_path"]:
+            try:
+                with open(record["json_path"], 'r', encoding='utf-8') as f:
+                    record["sidecar"] = json.load(f)
+            except Exception as e:
+                record["sidecar_error"] = e
+        records.append(record)
+
+    paired = {r["json_path"] for r in records if r["json_path"]}
+    for json_path in glob.glob(os.path.join(inbox_dir, "*.json")):
+        if json_path in paired:
+            continue
+        record = {"md_path": None, "json_path": json_path, "metadata": None, "content": None,
+                  "sidecar": None, "error": None, "sidecar_error": None}
+        try:
+            with open(json_path, 'r', encoding='utf-8') as f:
+                record["sidecar"] = json.load(f)
+        except Exception as e:
+            record["sidecar_error"] = e
+        records.append(record)
+    return records
+
+
+def legacy_entry_date(record):
+    """舊版 compact_inbox 的日期推算"""
+    entry = dict(record["metadata"] or {})
+    if 'date' not in entry:
+        filename = os.path.basename(record["md_path"])
+        if filename[:8].isdigit():
+            entry['date'] = f"{filename[:4]}-{filename[4:6]}-{filename[6:8]}"
+        elif re.match(r"\d{4}-\d{2}-\d{2}", filename):
+            entry['date'] = filename[:10]
+        else:
+            entry['date'] = str(entry.get('date'))[:10] if entry.get('date') else "1970-01-01"
+    return entry['date']
+
+
+def add_edge_cases(inbox_dir):
+    """檔名日期推算、壞掉的 YAML / JSON、孤立 Sidecar、沒有 front matter 的檔案"""
+    files = {
+        "20240305_note.md": "---\nmood: 4\n---\n只有檔名日期 (YYYYMMDD)",
+        "2024-03-06_abcd.md": "---\nuuid: abcd\n---\nprocess_inbox 檔名格式",
+        "scratch.md": "---\ntags: [a, b]\n---\n無法推算日期",
+        "2024-03-07_date.md": "---\ndate: 2024-02-01\nuuid: dated\n---\nfront matter 日期優先",
+        "2024-03-08_plain.md": "沒有 front matter 的純文字\n- [ ] task",
+        "2024-03-09_badyaml.md": "---\nmood: [1, 2\n---\n壞掉的 YAML",
+        "2024-03-10_badjson.md": "---\nuuid: badjson\n---\n壞掉的 Sidecar",
+        "2024-03-10_badjson.json": "{\"uuid\": ",
+        "2024-03-11_orphan.json": "{\"uuid\": \"orphan\", \"analysis\": {\"action_items\": []}}",
+    }
+    for name, text in files.items():
+        with open(os.path.join(inbox_dir, name), "w", encoding="utf-8") as f:
+            f.write(text)
+
+
+def entry_date(record):
+    """現行 compact_inbox 的日期推算"""
+    metadata = record["metadata"]
+    return metadata['date'] if 'date' in metadata else inbox_reader.filename_date(record["md_path"])
+
+
+def _comparable(record, date_fn):
+    out = dict(record)
+    # libyaml 的錯誤訊息措辭與純 Python 版不同，只比較例外型別
+    out["error"] = None if out["error"] is None else type(out["error"]).__name__
+    e = out["sidecar_error"]
+    out["sidecar_error"] = None if e is None else (type(e).__name__, str(e))
+    if out["md_path"] and out["error"] is None:
+        out["date"] = date_fn(record)
+    return out
+
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--count", type=int, default=5000)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--workers", default="1,4,8")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="lifeos-inbox-")
+    try:
+        generate_inbox(workdir, args.count, args.dim)
+        inbox_dir = os.path.join(workdir, "data", "inbox")
+        add_edge_cases(inbox_dir)
+
+        legacy, t_legacy = timed(legacy_load_inbox, inbox_dir)
+        # 舊版順序取決於目錄列舉；比較時以路徑排序
+        expected = sorted((_comparable(r, legacy_entry_date) for r in legacy), key=lambda r: (r["md_path"] is None, r["md_path"] or r["json_path"]))
+        print(f"📥 {len(legacy)} records | legacy serial: {t_legacy:.2f}s")
+
+        for executor in ("thread", "process"):
+            for workers in (int(w) for w in args.workers.split(",")):
+                records, t = timed(lambda: list(inbox_reader.iter_inbox(inbox_dir, workers, executor)))
+                actual = [_comparable(r, entry_date) for r in records]
+                assert actual == expected, f"Parsed records differ ({executor}, workers={workers})"
+                print(f"{executor:>7} x{workers:<2}: {t:6.2f}s | x{t_legacy / max(t, 1e-9):.1f}")
+        print("✅ Records identical (metadata, content, sidecars, error types, dates, order).")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
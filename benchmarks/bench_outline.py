@@ -0,0 +1,109 @@
+"""
+Markdown 大綱解析基準測試：以對抗性輸入 (大量空行、長空白串、上萬個 checkbox、1MB 單行、超長日記)
+量測 outline.parse_outline 隨輸入大小的耗時，確認成長為線性；
+並在子行程中以逾時執行舊版 classify_inbox 的巢狀量詞正則，顯示其回溯爆炸。
+
+用法: python benchmarks/bench_outline.py [--sizes 64,256,1024] [--legacy-timeout 5]
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import re
+import sys
+import time
+
+# [Path Fix]
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.utils.outline import parse_outline, open_tasks
+from bench_pipeline import journal_text
+
+
+def legacy_extract_tasks(content):
+    """舊版 classify_inbox.extract_tasks"""
+    tasks = []
+    mit_match = re.search(r"Tomorrow's MIT.*?(\n(?:[-*].*?|\s*)*)(?=\n#|\n\n|$)", content, re.IGNORECASE | re.DOTALL)
+    if mit_match:
+        for line in mit_match.group(1).strip().split('\n'):
+            clean_line = re.sub(r"^[-*]\s*", "", line).strip()
+            if clean_line:
+                tasks.append(clean_line)
+    tasks.extend(re.findall(r"-\s*\[\s*\]\s*(.*)", content))
+    return list(set(tasks))
+
+
+def _repeat(unit, size, head="", tail=""):
+    return head + unit * max(1, (size - len(head) - len(tail)) // len(unit)) + tail
+
+
+# 輸入名稱 -> 產生約 size 個字元的文字
+INPUTS = {
+    "blank_lines": lambda size: _repeat("\n \n\t\n", size, head="## Tomorrow's MIT\n- a\n", tail="x"),
+    "whitespace_run": lambda size: _repeat(" \t", size, head="## Tomorrow's MIT\n- a\n", tail="x"),
+    "checkboxes": lambda size: _repeat("- [ ] task\n- [x] done\n", size, head="## Tomorrow's MIT\n"),
+    "single_line": lambda size: _repeat("# - [ ] ", size),
+    "journals": lambda size: _repeat(journal_text(1, "2026-01-01", random.Random(1)), size),
+}
+
+
+def timed(fn, *args):
+    best = float("inf")
+    for _ in range(3):
+        start = time.perf_counter()
+        result = fn(*args)
+        best = min(best, time.perf_counter() - start)
+    return result, best
+
+
+def _legacy_worker(text, queue):
+    start = time.perf_counter()
+    legacy_extract_tasks(text)
+    queue.put(time.perf_counter() - start)
+
+
+def run_legacy(text, timeout):
+    """舊版正則可能無法在合理時間內結束，放在子行程中執行並逾時終止"""
+    queue = multiprocessing.Queue()
+    proc = multiprocessing.Process(target=_legacy_worker, args=(text, queue))
+    proc.start()
+    proc.join(timeout)
+    if proc.is_alive():
+        proc.terminate()
+        proc.join()
+        return None
+    return queue.get()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", default="64,256,1024", help="Input sizes in KB.")
+    parser.add_argument("--legacy-timeout", type=float, default=5.0)
+    args = parser.parse_args()
+    sizes = [int(s) * 1024 for s in args.sizes.split(",")]
+
+    print(f"{'input':<16}" + "".join(f"{s // 1024:>9}KB" for s in sizes) + f"{'growth':>10}")
+    for name, make in INPUTS.items():
+        times = []
+        for size in sizes:
+            text = make(size)
+            outline, seconds = timed(parse_outline, text)
+            open_tasks(outline)
+            times.append(seconds / len(text))
+        # 每字元耗時在最大與最小輸入之間的比值：線性成長時接近 1
+        growth = times[-1] / times[0]
+        cells = "".join(f"{t * len(make(s)) * 1000:>9.1f}ms" for t, s in zip(times, sizes))
+        print(f"{name:<16}{cells}{growth:>9.2f}x")
+        assert growth < 3, f"{name}: per-character cost grew {growth:.1f}x (not linear)"
+
+    print("\nLegacy classify_inbox.extract_tasks (whitespace run after the MIT list):")
+    for pairs in (4, 6, 8, 10, 12, 1024):
+        text = "## Tomorrow's MIT\n- a\n" + " \t" * pairs + "x"
+        seconds = run_legacy(text, args.legacy_timeout)
+        shown = f"{seconds * 1000:.1f}ms" if seconds is not None else f"> {args.legacy_timeout:.0f}s (killed)"
+        _, new_seconds = timed(parse_outline, text)
+        print(f"  {len(text):>6} chars: legacy {shown:<18} outline {new_seconds * 1000:.3f}ms")
+    print("✅ Outline parsing cost per character stays flat across input sizes.")
+
+
+if __name__ == "__main__":
+    main()
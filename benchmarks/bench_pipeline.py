@@ -0,0 +1,282 @@
+"""
+Pipeline 合成負載基準測試：產生 N 篇真實 Inbox 格式的雙軌日記 (.md + .json Sidecar，含 768 維 embedding)，
+依序執行 classify / sync (本機 stub webhook) / compact / system state，回報各階段耗時、峰值記憶體與輸出大小。
+每個階段在獨立的子行程中執行，峰值 RSS 不會互相累積。
+
+用法:
+  python benchmarks/bench_pipeline.py [--sizes 1000,10000,100000] [--workdir /tmp/lifeos-bench]
+  python benchmarks/bench_pipeline.py --sizes 0 --ingest 500 --latency 0.3   # 只量測 process_inbox 吞吐量 (假 Gemini)
+"""
+import argparse
+import datetime
+import http.server
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+TAG_POOL = ['trading', 'lifeos', 'health', 'reading', 'family', 'code', '研究', '寫作', 'sakura', 'infra']
+CONTEXTS = ['Work Flow', 'Deep Work', 'Errand', 'Home']
+
+# 子行程：執行一個階段並把耗時 / 峰值 RSS 寫到 result 檔 (stdout 只留作 log)
+PROBE = """
+import json, resource, sys, time
+sys.path.insert(0, {root!r})
+started = time.perf_counter()
+{code}
+seconds = time.perf_counter() - started
+with open({result!r}, 'w') as f:
+    json.dump({{"seconds": seconds, "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}}, f)
+"""
+
+# 階段 -> (程式碼, 計入輸出大小的路徑)
+STAGES = {
+    "classify": (
+        "from src.actions.classify_inbox import process_inbox_files\nprocess_inbox_files()",
+        ["data/life", "data/projects", "data/archive/routing_ledger.json"],
+    ),
+    "sync": (
+        "from src.actions.sync_tasks import sync_tasks_to_cloud\nsync_tasks_to_cloud()",
+        ["data/archive/task_outbox.jsonl"],
+    ),
+    "compact": (
+        "from src.actions.compact_inbox import compaction_process\ncompaction_process()",
+        ["data/archive"],
+    ),
+    "system_state": (
+        "import json\n"
+        "from src.utils import archive_store\n"
+        "from src.utils.analytics import generate_system_state, STATE_COLUMNS\n"
+        "state = generate_system_state(archive_store.read_archive(columns=STATE_COLUMNS))\n"
+        "with open('data/archive/system_state.json', 'w', encoding='utf-8') as f:\n"
+        "    json.dump(state, f, ensure_ascii=False, indent=2)",
+        ["data/archive/system_state.json"],
+    ),
+}
+
+INGEST_CODE = """
+import random
+from src.actions import process_inbox
+from src.utils.fake_genai import FakeGenaiClient
+sys.path.insert(0, {bench_dir!r})
+from bench_pipeline import journal_text
+rng = random.Random(7)
+items = [(f"bench:{{i}}", journal_text(i, "2026-01-01", rng)) for i in range({count})]
+client = FakeGenaiClient(latency={latency})
+results = process_inbox.run_batch(items, client=client, concurrency={concurrency}, rpm={rpm})
+assert all(r["status"] == "ok" for r in results), [r for r in results if r["status"] != "ok"][:3]
+with open("fake_calls.json", "w") as f:
+    json.dump(dict(client.calls, chunks=sum(r["chunks"] for r in results)), f)
+"""
+
+
+def journal_text(i, date, rng):
+    """與實際日記相同的段落結構：Project / Life / Tomorrow's MIT"""
+    tags = rng.sample(TAG_POOL, 2)
+    return (
+        f"# {date} Journal\n"
+        f"## 1. Project Track\n"
+        f"今天在 #{tags[0]} 上推進了第 {i} 項工作，整理 {tags[1]} 的筆記與下一步。\n"
+        f"- 觀察到一個訊號：流程中的瓶頸在資料整理\n\n"
+        f"## 2. Life Track\n"
+        f"精神狀態 {rng.randint(3, 9)}/10，散步 {rng.randint(10, 60)} 分鐘。\n\n"
+        f"## 3. Tomorrow's MIT\n"
+        f"- [ ] 完成 {tags[0]} 任務 {i}\n"
+        f"- [ ] 回顧 {tags[1]} 計畫\n"
+    )
+
+
+def generate_inbox(workdir, count, dim=768, seed=42):
+    """產生與 process_inbox.save_to_inbox 相同格式的 Inbox 檔案"""
+    import frontmatter
+
+    rng = random.Random(seed)
+    inbox = os.path.join(workdir, "data", "inbox")
+    os.makedirs(inbox, exist_ok=True)
+    start = datetime.date(2024, 1, 1)
+    span_days = max(count // 3, 90)
+
+    for i in range(count):
+        date = (start + datetime.timedelta(days=i * span_days // count)).isoformat()
+        entry_id = f"{i:08x}"
+        text = journal_text(i, date, rng)
+        tags = rng.sample(TAG_POOL, 3)
+        analysis = {
+            "mood": rng.randint(1, 10),
+            "focus": rng.randint(1, 10),
+            "tags": tags,
+            "summary": f"Synthetic entry {i}",
+            "action_items": [
+                {"task": f"完成 {tags[0]} 任務 {i}", "priority": rng.choice(["High", "Med", "Low"]), "context": rng.choice(CONTEXTS)},
+                {"task": f"回顧 {tags[1]} 計畫", "priority": "Med", "context": rng.choice(CONTEXTS)},
+            ],
+            "project_data": {
+                "signals": ["bottleneck in data prep"] if i % 2 else [],
+                "blind_spots": ["scope creep"] if i % 3 else [],
+                "open_nodes": ["benchmark harness"],
+            },
+            "life_data": {
+                "energy_stability": "Low" if i % 11 == 0 else "High",
+                "baseline_safety": "Intervene" if i % 97 == 0 else "OK",
+            },
+        }
+        sidecar = {
+            "uuid": entry_id,
+            "date": date,
+            "raw_text": text,
+            "analysis": analysis,
+            "embedding": [round(rng.uniform(-1, 1), 6) for _ in range(dim)],
+        }
+        base = os.path.join(inbox, f"{date}_{entry_id}")
+        with open(f"{base}.json", "w", encoding="utf-8") as f:
+            json.dump(sidecar, f, ensure_ascii=False)
+        post = frontmatter.Post(text, **{"uuid": entry_id, "mood": analysis["mood"]})
+        with open(f"{base}.md", "w", encoding="utf-8") as f:
+            f.write(frontmatter.dumps(post))
+
+
+def path_size(workdir, paths):
+    total = 0
+    for rel in paths:
+        path = os.path.join(workdir, rel)
+        if os.path.isfile(path):
+            total += os.path.getsize(path)
+        elif os.path.isdir(path):
+            for dirpath, _, files in os.walk(path):
+                total += sum(os.path.getsize(os.path.join(dirpath, name)) for name in files)
+    return total
+
+
+def start_stub_webhook(error_rate=0.0):
+    """本機 stub webhook：回傳 200 (或依比例回傳 429 + Retry-After)"""
+    class Handler(http.server.BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        requests = 0
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            Handler.requests += 1
+            code = 429 if random.random() < error_rate else 200
+            body = b'{"status": "ok"}'
+            self.send_response(code)
+            self.send_header('Content-Length', str(len(body)))
+            if code == 429:
+                self.send_header('Retry-After', '0.1')
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, Handler
+
+
+def run_probe(workdir, code, env, log_path):
+    result_path = os.path.join(workdir, ".probe_result.json")
+    script = PROBE.format(root=ROOT, code=code, result=result_path)
+    started = time.perf_counter()
+    with open(log_path, "a", encoding="utf-8") as log:
+        subprocess.run([sys.executable, "-c", script], cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT, check=True)
+    wall = time.perf_counter() - started
+    with open(result_path) as f:
+        result = json.load(f)
+    os.remove(result_path)
+    result["wall"] = wall
+    return result
+
+
+def bench_size(base_dir, count, args, env):
+    workdir = os.path.join(base_dir, f"n{count}")
+    shutil.rmtree(workdir, ignore_errors=True)
+    os.makedirs(workdir)
+    log_path = os.path.join(workdir, "bench.log")
+
+    started = time.perf_counter()
+    generate_inbox(workdir, count, dim=args.dim)
+    inbox_bytes = path_size(workdir, ["data/inbox"])
+    rows = [("generate", time.perf_counter() - started, None, inbox_bytes)]
+
+    for name, (code, outputs) in STAGES.items():
+        result = run_probe(workdir, code, env, log_path)
+        rows.append((name, result["wall"], result["peak_rss_mb"], path_size(workdir, outputs)))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1000,10000", help="Comma-separated entry counts (e.g. 1000,10000,100000).")
+    parser.add_argument("--dim", type=int, default=768, help="Embedding dimension in the synthetic sidecars.")
+    parser.add_argument("--workdir", help="Where to generate data (default: a temp dir, removed afterwards).")
+    parser.add_argument("--webhook-rate", type=float, default=500.0, help="WEBHOOK_RATE_PER_SEC for the sync stage.")
+    parser.add_argument("--webhook-error-rate", type=float, default=0.0, help="Share of stub webhook calls answered with 429.")
+    parser.add_argument("--ingest", type=int, default=0, help="Also run process_inbox batch intake on this many journals.")
+    parser.add_argument("--latency", type=float, default=0.2, help="Fake Gemini latency per call (seconds).")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--rpm", type=int, default=6000)
+    parser.add_argument("--json", help="Write results as JSON to this path.")
+    args = parser.parse_args()
+
+    base_dir = args.workdir or tempfile.mkdtemp(prefix="lifeos-bench-")
+    server, handler = start_stub_webhook(args.webhook_error_rate)
+    env = dict(os.environ)
+    env.update({
+        "ZAPIER_TASK_WEBHOOK": f"http://127.0.0.1:{server.server_address[1]}/hook",
+        "WEBHOOK_RATE_PER_SEC": str(args.webhook_rate),
+        "WEBHOOK_BURST": str(max(int(args.webhook_rate), 1)),
+        "WEBHOOK_CONCURRENCY": "8",
+        "LIFEOS_CACHE": "off",
+    })
+
+    report = {"sizes": {}, "ingest": None}
+    try:
+        for count in [int(s) for s in args.sizes.split(",") if int(s) > 0]:
+            print(f"\n=== {count:,} entries ===")
+            print(f"{'stage':<14}{'wall (s)':>10}{'peak RSS (MB)':>15}{'output (MB)':>13}")
+            rows = bench_size(base_dir, count, args, env)
+            for name, wall, rss, size in rows:
+                rss_text = f"{rss:15.1f}" if rss is not None else f"{'-':>15}"
+                print(f"{name:<14}{wall:10.2f}{rss_text}{size / 1e6:13.2f}")
+            report["sizes"][count] = [
+                {"stage": name, "wall": wall, "peak_rss_mb": rss, "output_bytes": size} for name, wall, rss, size in rows
+            ]
+        print(f"\n🪝 Stub webhook received {handler.requests} requests")
+
+        if args.ingest:
+            workdir = os.path.join(base_dir, "ingest")
+            shutil.rmtree(workdir, ignore_errors=True)
+            os.makedirs(workdir)
+            code = INGEST_CODE.format(bench_dir=os.path.dirname(os.path.abspath(__file__)), count=args.ingest,
+                                      latency=args.latency, concurrency=args.concurrency, rpm=args.rpm)
+            result = run_probe(workdir, code, env, os.path.join(workdir, "bench.log"))
+            throughput = args.ingest / result["seconds"]
+            print(f"\n=== process_inbox: {args.ingest} journals, fake latency {args.latency}s, "
+                  f"concurrency {args.concurrency} ===")
+            with open(os.path.join(workdir, "fake_calls.json")) as f:
+                calls = json.load(f)
+            print(f"{result['seconds']:.2f}s  ({throughput:.1f} entries/s, peak RSS {result['peak_rss_mb']:.1f} MB)")
+            print(f"embed_content requests: {calls['embed']} for {calls['chunks']} chunks "
+                  f"({calls['chunks'] / max(1, calls['embed']):.1f} chunks/request)")
+            report["ingest"] = {"count": args.ingest, "seconds": result["seconds"], "entries_per_sec": throughput,
+                                "peak_rss_mb": result["peak_rss_mb"], "embed_requests": calls["embed"],
+                                "chunks": calls["chunks"]}
+    finally:
+        server.shutdown()
+        if not args.workdir:
+            shutil.rmtree(base_dir, ignore_errors=True)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""
+查詢服務基準測試：在暫存目錄建立多批寫入 (含跨月份改寫與段內重複 uuid) 的歸檔，
+透過 HTTP 對 serve_archive 發出日期 / 標籤 / 門檻 / 分頁查詢，
+與「整份讀入 read_archive 再用 pandas 過濾」比較結果與耗時，並量測快取命中、304 與 Manifest 改變後的失效。
+
+用法: python benchmarks/bench_query.py [--rows 50000] [--batches 20]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+
+# [Path Fix]
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(ROOT)
+import pandas as pd
+from bench_analytics import make_synthetic, TAG_POOL
+
+QUERIES = [
+    "/entries?from=2024-03-01&to=2024-03-31",
+    "/entries?from=2023-01-01&to=2023-12-31&mood_min=7&limit=20",
+    "/entries?tag={tag}&limit=100&offset=100",
+    "/entries?focus_min=8&mood_max=3&order=asc&fields=uuid,date,mood,focus",
+    "/entries?from=2022-06-01&tag={tag}&focus_max=4&limit=5",
+    "/state?window=30",
+]
+
+
+def build_archive(rows, batches, seed=7):
+    """分批 append；後面的批次改寫前面的 uuid (部分移到其他月份)，並在同一批內放入重複 uuid"""
+    from src.utils import archive_store
+    rng = random.Random(seed)
+    df = make_synthetic(rows, seed=seed)
+    df['mood'] = [rng.randint(1, 10) for _ in range(len(df))]
+    df['focus'] = [rng.randint(1, 10) for _ in range(len(df))]
+    df['content'] = [f"entry {i}" for i in range(len(df))]
+    for part in range(batches):
+        batch = df.iloc[part::batches].copy()
+        if part:
+            rewrites = df.sample(n=max(1, len(batch) // 10), random_state=part).copy()
+            rewrites['mood'] = [rng.randint(1, 10) for _ in range(len(rewrites))]
+            rewrites['date'] = rewrites['date'] + pd.to_timedelta([rng.choice([0, 0, 40]) for _ in range(len(rewrites))], unit='D')
+            batch = pd.concat([batch, rewrites, rewrites.head(3)], ignore_index=True)
+        archive_store.append_entries(batch.reset_index(drop=True))
+    # 與 compaction 相同的定期合併
+    archive_store.merge_small_segments(force=True)
+
+
+def reference(path):
+    """整份讀入後以 pandas 過濾 (查詢服務之前，消費端的唯一做法)"""
+    from urllib.parse import urlsplit, parse_qs
+    from src.utils import archive_store, archive_query, json_export
+    url = urlsplit(path)
+    query = archive_query.parse_entries_query(parse_qs(url.query))
+    df = archive_store.read_archive()
+    if query['from']:
+        df = df[df['date'] >= pd.Timestamp(query['from'])]
+    if query['to']:
+        df = df[df['date'] < pd.Timestamp(query['to']) + pd.Timedelta(days=1)]
+    for name, column, op in archive_query._THRESHOLDS:
+        if query[name] is not None:
+            df = df[df[column] >= query[name]] if op == '>=' else df[df[column] <= query[name]]
+    for tag in query['tags']:
+        df = df[[tag in list(t) for t in df['entry_tags']]]
+    df = df.sort_values(['date', 'uuid'], ascending=query['order'] == 'asc', na_position='last', kind='mergesort')
+    page = df.iloc[query['offset']:query['offset'] + query['limit']][query['fields']]
+    return len(df), json.loads(json_export.to_records(page)) if len(page) else []
+
+
+def get(base, path, etag=None):
+    request = urllib.request.Request(base + path, headers={"If-None-Match": etag} if etag else {})
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request) as response:
+            body = response.read()
+            return response.status, response.headers.get("ETag"), body, time.perf_counter() - start
+    except urllib.error.HTTPError as e:
+        return e.code, e.headers.get("ETag"), e.read(), time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=50_000)
+    parser.add_argument("--batches", type=int, default=20)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="lifeos-query-")
+    os.chdir(workdir)
+    from src.utils import archive_store
+    from src.actions.serve_archive import make_server
+
+    build_archive(args.rows, args.batches)
+    manifest = archive_store.load_manifest()
+    print(f"📦 {sum(s['rows'] for s in manifest['segments'])} rows in {len(manifest['segments'])} segments ({workdir})")
+
+    server = make_server(port=0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+
+    tag = TAG_POOL[0]
+    print(f"\n{'query':<72}{'rows':>7}{'full read':>11}{'cold':>9}{'cached':>9}{'304':>8}")
+    for template in QUERIES:
+        path = template.format(tag=tag)
+        status, etag, body, cold = get(base, path)
+        assert status == 200, (path, status, body)
+        _, _, cached_body, cached = get(base, path)
+        assert cached_body == body
+        status_304, _, _, not_modified = get(base, path, etag)
+        assert status_304 == 304, status_304
+
+        payload = json.loads(body)
+        if path.startswith("/entries"):
+            start = time.perf_counter()
+            total, entries = reference(path)
+            full = time.perf_counter() - start
+            assert payload["total"] == total, (path, payload["total"], total)
+            assert payload["entries"] == entries, path
+            rows = total
+        else:
+            from src.utils.analytics import generate_system_state, STATE_COLUMNS
+            start = time.perf_counter()
+            state = generate_system_state(archive_store.read_recent(30, columns=STATE_COLUMNS), window=30)
+            full = time.perf_counter() - start
+            assert payload == json.loads(json.dumps(state, default=str)), path
+            rows = "-"
+        print(f"{path:<72}{rows:>7}{full * 1000:>9.0f}ms{cold * 1000:>7.0f}ms{cached * 1000:>7.1f}ms{not_modified * 1000:>6.1f}ms")
+
+    # 同一組條件翻頁：符合條件的紀錄清單已快取，只讀取新一頁的列
+    path = f"/entries?tag={tag}&limit=100&offset=200"
+    status, _, body, seconds = get(base, path)
+    assert status == 200 and json.loads(body)["entries"] == reference(path)[1]
+    print(f"{'next page, same filter (' + path + ')':<72}{'':>7}{'':>11}{seconds * 1000:>7.0f}ms")
+
+    # Manifest 改變 (新寫入一批) 後，舊 ETag 不再有效且結果反映新資料
+    path = QUERIES[0]
+    _, etag, body, _ = get(base, path)
+    extra = make_synthetic(1, seed=99).assign(uuid="feedface", date=pd.Timestamp("2024-03-15"), mood=5, focus=5)
+    archive_store.append_entries(extra)
+    status, new_etag, new_body, _ = get(base, path, etag)
+    assert status == 200 and new_etag != etag
+    assert json.loads(new_body)["total"] == json.loads(body)["total"] + 1
+    print(f"\n🔄 Manifest change: ETag {etag} -> {new_etag}, total +1")
+
+    _, _, health, _ = get(base, "/health")
+    print(f"🩺 {json.loads(health)['cache']}")
+    server.shutdown()
+    print("✅ Query service results match full-archive filtering.")
+
+
+if __name__ == "__main__":
+    main()
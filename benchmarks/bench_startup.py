@@ -0,0 +1,65 @@
+"""
+冷啟動基準測試：在全新的直譯器中載入各子指令，量測 import 時間與是否載入重量級模組。
+輕量子指令 (classify / sync) 超過門檻或載入 pandas / pyarrow / numpy / genai 時以非零狀態結束。
+
+用法: python benchmarks/bench_startup.py [--threshold-ms 150] [--repeat 5]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(ROOT)
+from src.cli import COMMANDS, HEAVY_MODULES
+
+PROBE = """
+import json, sys, time
+t0 = time.perf_counter()
+sys.path.insert(0, {root!r})
+import src.cli as cli
+cli.resolve({name!r})
+elapsed = time.perf_counter() - t0
+print(json.dumps({{"ms": elapsed * 1000, "heavy": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def probe(name):
+    """在子行程中量測：python 啟動 + 子指令模組載入的總時間"""
+    code = PROBE.format(root=ROOT, name=name, heavy=list(HEAVY_MODULES))
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, cwd=ROOT, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--threshold-ms", type=float, default=150.0, help="Import budget for lightweight subcommands.")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    failures = []
+    for name, (_, _, _, light, _) in COMMANDS.items():
+        runs = [probe(name) for _ in range(args.repeat)]
+        median_ms = statistics.median(r["ms"] for r in runs)
+        heavy = sorted(set(m for r in runs for m in r["heavy"]))
+        flag = ""
+        if light:
+            if median_ms > args.threshold_ms:
+                failures.append(f"{name}: {median_ms:.0f} ms > {args.threshold_ms:.0f} ms")
+                flag = " ❌ over budget"
+            if heavy:
+                failures.append(f"{name}: imports {', '.join(heavy)}")
+                flag += " ❌ heavy imports"
+        kind = "light" if light else "heavy"
+        print(f"{name:<9} [{kind}] median {median_ms:7.1f} ms  heavy modules: {', '.join(heavy) or '-'}{flag}")
+
+    if failures:
+        print("\n".join(["", "❌ Startup budget exceeded:"] + failures))
+        sys.exit(1)
+    print("✅ Lightweight subcommands within budget.")
+
+
+if __name__ == "__main__":
+    main()
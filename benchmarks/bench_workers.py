@@ -0,0 +1,153 @@
+"""
+平行 worker 基準測試：模擬多個重疊的 dispatch 同時對同一個 Inbox 執行 `lifeos pipeline --limit`，
+外加一個當掉的 worker 遺留的暫存區 (租約指向已結束的行程)，檢查結束後：
+- Inbox 與 .claims 暫存區都清空 (過期租約的紀錄被回收並處理)
+- 歸檔、embedding 索引、匯出分片中每筆紀錄恰好一次；磁碟上沒有 Manifest 之外的段檔案 (沒有被覆蓋的 Manifest 更新)
+- Life Track 每個 uuid 只寫入一次；webhook 收到的任務數等於不重複任務數 (沒有重複送出)
+並與單一 worker 的結果比較。
+
+用法: python benchmarks/bench_workers.py [--entries 600] [--workers 1,2,4] [--dim 64]
+"""
+import argparse
+import glob
+import json
+import math
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+# [Path Fix]
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(ROOT)
+from bench_pipeline import generate_inbox, start_stub_webhook
+
+STALE_ENTRIES = 25
+
+
+def plant_stale_claim(workdir, count):
+    """把前 count 筆紀錄移進一個「已當掉」worker 的暫存區 (租約的 pid 已不存在)"""
+    inbox = os.path.join(workdir, "data", "inbox")
+    claim_dir = os.path.join(inbox, ".claims", "crashed-worker")
+    os.makedirs(claim_dir)
+    dead = subprocess.Popen([sys.executable, "-c", "pass"])
+    dead.wait()
+    with open(os.path.join(claim_dir, ".lease"), "w") as f:
+        json.dump({"worker": "crashed-worker", "host": socket.gethostname(), "pid": dead.pid, "heartbeat": 0}, f)
+    for md_path in sorted(glob.glob(os.path.join(inbox, "*.md")))[:count]:
+        for path in (md_path, md_path.replace('.md', '.json')):
+            os.rename(path, os.path.join(claim_dir, os.path.basename(path)))
+
+
+def run_workers(workdir, count, workers, env):
+    limit = math.ceil(count / workers)
+    started = time.perf_counter()
+    procs = []
+    for i in range(workers):
+        log = open(os.path.join(workdir, f"worker-{i}.log"), "w", encoding="utf-8")
+        cmd = [sys.executable, os.path.join(ROOT, "lifeos"), "pipeline", "--limit", str(limit), "--worker-id", f"w{i}"]
+        procs.append((subprocess.Popen(cmd, cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT), log))
+    for proc, log in procs:
+        proc.wait()
+        log.close()
+        assert proc.returncode == 0, f"worker failed, see {log.name}"
+    wall = time.perf_counter() - started
+
+    # 下一個 dispatch：收尾 (例如被其他 worker 的 limit 切剩的紀錄)
+    with open(os.path.join(workdir, "sweep.log"), "w", encoding="utf-8") as log:
+        subprocess.run([sys.executable, os.path.join(ROOT, "lifeos"), "pipeline"], cwd=workdir, env=env,
+                       stdout=log, stderr=subprocess.STDOUT, check=True)
+    return wall
+
+
+def inspect(workdir, dim):
+    """在 workdir 中讀取所有輸出並回傳檢查用的摘要"""
+    code = f"""
+import glob, json, os, re, sys
+sys.path.insert(0, {ROOT!r})
+from src.utils import archive_store, embedding_store, json_export
+manifest = archive_store.load_manifest()
+listed = {{os.path.normpath(os.path.join(archive_store.ARCHIVE_DIR, s["path"])) for s in manifest["segments"]}}
+on_disk = {{os.path.normpath(p) for p in glob.glob(os.path.join(archive_store.SEGMENTS_DIR, "**", "*.parquet"), recursive=True)}}
+df = archive_store.read_archive(columns=["uuid", "date"])
+index = embedding_store.load_index()
+export = json_export.load_export_manifest()
+records = []
+for shard in export["shards"].values():
+    with open(os.path.join(json_export.EXPORT_DIR, shard["path"]), encoding="utf-8") as f:
+        records.extend(json.load(f))
+refs = []
+for path in glob.glob("data/life/*.md"):
+    with open(path, encoding="utf-8") as f:
+        refs.extend(re.findall(r"\\(Ref: ([^)\\s]+)\\)", f.read()))
+with open("data/archive/task_outbox.jsonl", encoding="utf-8") as f:
+    tasks = {{json.loads(line)["id"] for line in f if line.strip()}}
+appended = 0
+with open("data/archive/metrics.jsonl", encoding="utf-8") as f:
+    for line in f:
+        appended += json.loads(line)["spans"].get("compact.append", {{}}).get("items", 0)
+print(json.dumps({{
+    "archive_rows": len(df), "archive_unique": int(df["uuid"].nunique()), "appended": appended,
+    "orphan_segments": len(on_disk - listed), "missing_segments": len(listed - on_disk),
+    "embedding_rows": index["count"],
+    "vector_bytes": os.path.getsize(embedding_store.VECTORS_PATH),
+    "export_rows": len(records), "export_unique": len({{r["uuid"] for r in records}}),
+    "export": sorted(json.dumps(r, sort_keys=True, ensure_ascii=False) for r in records),
+    "life_refs": len(refs), "life_unique": len(set(refs)), "tasks": len(tasks),
+    "inbox_left": len(glob.glob("data/inbox/*.md")) + len(glob.glob("data/inbox/*.json")),
+    "claims_left": len(glob.glob("data/inbox/.claims/*")),
+}}))
+"""
+    out = subprocess.run([sys.executable, "-c", code], cwd=workdir, capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--entries", type=int, default=600)
+    parser.add_argument("--workers", default="1,2,4")
+    parser.add_argument("--dim", type=int, default=64)
+    args = parser.parse_args()
+
+    server, handler = start_stub_webhook()
+    base_dir = tempfile.mkdtemp(prefix="lifeos-workers-")
+    baseline = None
+    print(f"{'workers':>8}{'wall':>9}{'archive':>9}{'appended':>10}{'vectors':>9}{'export':>8}{'life refs':>11}{'webhook':>9}  leftover")
+    for workers in [int(w) for w in args.workers.split(",")]:
+        workdir = os.path.join(base_dir, f"w{workers}")
+        os.makedirs(workdir)
+        generate_inbox(workdir, args.entries, dim=args.dim)
+        plant_stale_claim(workdir, STALE_ENTRIES)
+        env = dict(os.environ, LIFEOS_CACHE_DIR=os.path.join(workdir, ".cache"),
+                   ZAPIER_TASK_WEBHOOK=f"http://127.0.0.1:{server.server_address[1]}/hook",
+                   WEBHOOK_RATE_PER_SEC="1000", WEBHOOK_BURST="100", LIFEOS_INBOX_WORKERS="1")
+        handler.requests = 0
+        wall = run_workers(workdir, args.entries, workers, env)
+        result = inspect(workdir, args.dim)
+
+        n = args.entries
+        assert result["inbox_left"] == 0 and result["claims_left"] == 0, result
+        assert result["archive_rows"] == result["archive_unique"] == n, result
+        assert result["appended"] == n, f"{result['appended']} rows appended for {n} entries"
+        assert result["orphan_segments"] == 0 and result["missing_segments"] == 0, result
+        assert result["embedding_rows"] == n and result["vector_bytes"] == n * args.dim * 4, result
+        assert result["export_rows"] == result["export_unique"] == n, result
+        assert result["life_refs"] == result["life_unique"] == n, result
+        assert handler.requests == result["tasks"], f"{handler.requests} webhook calls for {result['tasks']} tasks"
+        if baseline is None:
+            baseline = result["export"]
+        assert result["export"] == baseline, "export differs from the single-worker run"
+
+        print(f"{workers:>8}{wall:>8.1f}s{result['archive_rows']:>9}{result['appended']:>10}{result['embedding_rows']:>9}"
+              f"{result['export_rows']:>8}{result['life_refs']:>11}{handler.requests:>9}  inbox 0, claims 0")
+
+    server.shutdown()
+    shutil.rmtree(base_dir, ignore_errors=True)
+    print(f"✅ Every entry archived, routed and delivered exactly once (including {STALE_ENTRIES} recovered from a crashed worker).")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,17 @@
 import os
-import json
 import re
-import glob
+import hashlib
 import datetime
-import frontmatter
-import requests
+import sys
+from collections import OrderedDict
+
+# [Path Fix]
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+from src.utils.routing_ledger import RoutingLedger
+from src.utils.inbox_reader import load_inbox, markdown_records
+from src.utils.outline import parse_outline, open_tasks
+from src.utils import metrics
+from src.utils.file_lock import file_lock
 
 # 定義路徑
 INBOX_DIR = "data/inbox"
@@ -18,127 +25,151 @@ def ensure_dir(directory):
     if not os.path.exists(directory):
         os.makedirs(directory)
 
-def append_to_log(filepath, date, content, source_uuid):
+def format_log_block(date, content, source_uuid):
+    header = f"\n\n### {date} (Ref: {source_uuid})\n"
+    return header + content.strip()
+
+def source_key(uuid_str, date, content):
+    """帳本鍵：有 uuid 用 uuid；沒有 uuid 的紀錄以日期 + 內容雜湊代替，不同紀錄不會共用同一個鍵而被當成重複"""
+    if uuid_str:
+        return str(uuid_str)
+    digest = hashlib.sha1(f"{date}\n{content.strip()}".encode('utf-8')).hexdigest()[:12]
+    return f"nouuid-{digest}"
+
+def queue_append(pending, ledger, filepath, date, content, source_uuid):
     """
-    通用寫入函數：將內容 Append 到指定的 Markdown 檔案
+    將寫入需求依目標檔案分組；已記錄在帳本 (或本次已排入) 的 uuid 直接略過
     """
-    header = f"\n\n### {date} (Ref: {source_uuid})\n"
-    
-    # 簡單的防重複檢查 (讀取最後 1000 字，看是否已存在相同的 UUID)
-    if os.path.exists(filepath):
-        with open(filepath, 'r', encoding='utf-8') as f:
-            # 讀取檔尾
-            try:
-                f.seek(0, 2)
-                size = f.tell()
-                f.seek(max(size - 2000, 0), 0)
-                tail = f.read()
-                if source_uuid in tail:
-                    print(f"Skipping duplicate entry for {filepath}")
-                    return
-            except:
-                pass # 新檔案或讀取錯誤直接寫入
-
-    with open(filepath, 'a+', encoding='utf-8') as f:
-        f.write(header)
-        f.write(content.strip())
-    
-    print(f"📝 Appended to {os.path.basename(filepath)}")
+    source_uuid = str(source_uuid)
+    queued = pending.setdefault(filepath, OrderedDict())
+    if source_uuid in queued or ledger.has(filepath, source_uuid):
+        print(f"Skipping duplicate entry for {filepath}")
+        metrics.count("classify.duplicates_skipped")
+        return
+    queued[source_uuid] = format_log_block(date, content, source_uuid)
+
+def flush_appends(pending, ledger):
+    """
+    每個目標檔案只開啟一次，寫完即更新帳本；帳本在所有檔案寫完後存檔一次 (中途出錯時也會存下已寫入的部分)。
+    持有 routing 鎖並重新載入帳本，平行的 worker 不會把同一個 uuid 寫入同一個檔案兩次。
+    """
+    with file_lock("routing"), metrics.span("classify.write") as span:
+        ledger.reload()
+        try:
+            for filepath, blocks in pending.items():
+                blocks = OrderedDict((u, b) for u, b in blocks.items() if not ledger.has(filepath, u))
+                if not blocks:
+                    continue
+                data = ''.join(blocks.values())
+                with open(filepath, 'a+', encoding='utf-8') as f:
+                    f.write(data)
+                for source_uuid in blocks:
+                    ledger.add(filepath, source_uuid)
+                span.items += len(blocks)
+                span.bytes_written += len(data.encode('utf-8'))
+                print(f"📝 Appended {len(blocks)} entries to {os.path.basename(filepath)}")
+        finally:
+            ledger.save()
 
 def extract_tasks(content):
-    """從日記內容中抓取待辦事項"""
-    tasks = []
-    # 模式 A: Tomorrow's MIT
-    mit_match = re.search(r"Tomorrow's MIT.*?(\n(?:[-*].*?|\s*)*)(?=\n#|\n\n|$)", content, re.IGNORECASE | re.DOTALL)
-    if mit_match:
-        lines = mit_match.group(1).strip().split('\n')
-        for line in lines:
-            clean_line = re.sub(r"^[-*]\s*", "", line).strip()
-            if clean_line: tasks.append(clean_line)
-
-    # 模式 B: Checkbox [ ]
-    checkboxes = re.findall(r"-\s*\[\s*\]\s*(.*)", content)
-    tasks.extend(checkboxes)
-    return list(set(tasks))
+    """從日記內容中抓取待辦事項：Tomorrow's MIT 區塊的項目與未勾選的 Checkbox (單次掃描大綱)"""
+    return open_tasks(parse_outline(content))
 
 def send_to_zapier(tasks, date):
     if not ZAPIER_TASK_WEBHOOK: return
-    for task in tasks:
-        try:
-            requests.post(ZAPIER_TASK_WEBHOOK, json={"title": task, "date": date, "source": "LifeOS"})
-        except Exception as e:
-            print(f"❌ Failed to send task: {e}")
-
-def process_inbox_files():
+    # requests 只在真的要送出時才載入
+    from src.utils.delivery import WebhookDelivery, print_report
+    engine = WebhookDelivery(ZAPIER_TASK_WEBHOOK)
+    report = engine.deliver([{"title": task, "date": date, "source": "LifeOS"} for task in tasks])
+    print_report(report)
+    return report
+
+def process_inbox_files(records=None):
     ensure_dir(PROJECTS_DIR)
     ensure_dir(LIFE_DIR)
     
-    # 讀取 Inbox 所有 .md
-    files = glob.glob(os.path.join(INBOX_DIR, "*.md"))
+    # 讀取 Inbox 所有 .md (由 pipeline 傳入時共用已解析的紀錄)
+    if records is None:
+        records = load_inbox(INBOX_DIR)
+    files = markdown_records(records)
     if not files:
         print("No files to classify.")
         return
 
-    for filepath in files:
-        try:
-            # 1. 讀取 Markdown & Frontmatter
-            post = frontmatter.load(filepath)
-            content = post.content
-            metadata = post.metadata
+    ledger = RoutingLedger()
+    pending = OrderedDict()
+
+    with metrics.span("classify.route", items=len(files)):
+        for record in files:
+            filepath = record["md_path"]
+            try:
+                # 1. 讀取 Markdown & Frontmatter
+                if record["error"]:
+                    raise record["error"]
+                content = record["content"]
+                metadata = record["metadata"]
             
-            # 取得關鍵元數據
-            uuid_str = metadata.get('uuid', 'unknown')
-            date_str = metadata.get('date', datetime.datetime.now().strftime('%Y-%m-%d'))
-            # 確保 date_str 是字串 (有時 YAML 會解析成 datetime 物件)
-            if isinstance(date_str, datetime.date):
-                date_str = date_str.strftime('%Y-%m-%d')
+                # 取得關鍵元數據
+                date_str = metadata.get('date', datetime.datetime.now().strftime('%Y-%m-%d'))
+                # 確保 date_str 是字串 (有時 YAML 會解析成 datetime 物件)
+                if isinstance(date_str, datetime.date):
+                    date_str = date_str.strftime('%Y-%m-%d')
+                uuid_str = source_key(metadata.get('uuid'), date_str, content)
             
-            # 嘗試讀取 Sidecar JSON 以獲得更精準的 tags
-            json_path = filepath.replace('.md', '.json')
-            tags = metadata.get('tags', [])
-            if os.path.exists(json_path):
-                with open(json_path, 'r', encoding='utf-8') as jf:
-                    sidecar = json.load(jf)
+                # 嘗試讀取 Sidecar JSON 以獲得更精準的 tags
+                # (複製 list，避免改動與其他階段共用的 metadata)
+                tags = metadata.get('tags', [])
+                if isinstance(tags, list):
+                    tags = list(tags)
+                if record["json_path"]:
+                    if record["sidecar_error"]:
+                        raise record["sidecar_error"]
+                    sidecar = record["sidecar"]
                     if 'analysis' in sidecar and 'tags' in sidecar['analysis']:
                         # 合併 tags
                         ai_tags = sidecar['analysis']['tags']
                         if isinstance(ai_tags, list):
                             tags.extend(ai_tags)
             
-            # 去重並正規化 Tags
-            tags = list(set([t.lower().replace('#', '') for t in tags if isinstance(t, str)]))
-
-            # --- 路由邏輯 (Routing Logic) ---
-
-            # A. Life Track (全量備份)
-            # 按年份歸檔，例如 data/life/2026_log.md
-            year = date_str[:4]
-            life_file = os.path.join(LIFE_DIR, f"{year}_log.md")
-            append_to_log(life_file, date_str, content, uuid_str)
-
-            # B. Project Track (專案分流)
-            # 如果 Tag 符合現有專案，或看起來像專案名，則寫入
-            # 這裡簡單判定：只要有 Tag，就視為一個 Topic/Project
-            for tag in tags:
-                # 過濾掉通用 Tags
-                if tag in ['journal', 'log', 'daily', 'life']:
-                    continue
+                # 去重並正規化 Tags
+                tags = list(set([t.lower().replace('#', '') for t in tags if isinstance(t, str)]))
+
+                # --- 路由邏輯 (Routing Logic) ---
+
+                # A. Life Track (全量備份)
+                # 按年份歸檔，例如 data/life/2026_log.md
+                year = date_str[:4]
+                life_file = os.path.join(LIFE_DIR, f"{year}_log.md")
+                queue_append(pending, ledger, life_file, date_str, content, uuid_str)
+
+                # B. Project Track (專案分流)
+                # 如果 Tag 符合現有專案，或看起來像專案名，則寫入
+                # 這裡簡單判定：只要有 Tag，就視為一個 Topic/Project
+                for tag in tags:
+                    # 過濾掉通用 Tags
+                    if tag in ['journal', 'log', 'daily', 'life']:
+                        continue
                 
-                # 檔名清理 (避免非法字元)
-                safe_tag = re.sub(r'[\\/*?:"<>|]', "", tag).title()
-                project_file = os.path.join(PROJECTS_DIR, f"{safe_tag}.md")
+                    # 檔名清理 (避免非法字元)
+                    safe_tag = re.sub(r'[\\/*?:"<>|]', "", tag).title()
+                    project_file = os.path.join(PROJECTS_DIR, f"{safe_tag}.md")
                 
-                # 寫入專案日誌
-                append_to_log(project_file, date_str, content, uuid_str)
+                    # 寫入專案日誌
+                    queue_append(pending, ledger, project_file, date_str, content, uuid_str)
+
+                # C. Task Extraction
+                tasks = extract_tasks(content)
+                if tasks:
+                    print(f"Found {len(tasks)} tasks via regex.")
+                    metrics.count("classify.tasks_found", len(tasks))
+                    #send_to_zapier(tasks, date_str)
 
-            # C. Task Extraction
-            tasks = extract_tasks(content)
-            if tasks:
-                print(f"Found {len(tasks)} tasks via regex.")
-                #send_to_zapier(tasks, date_str)
+            except Exception as e:
+                print(f"Error classifying {filepath}: {e}")
+                metrics.count("classify.errors")
 
-        except Exception as e:
-            print(f"Error classifying {filepath}: {e}")
+    flush_appends(pending, ledger)
 
 if __name__ == "__main__":
-    process_inbox_files()
+    with metrics.run("classify"):
+        process_inbox_files()
@@ -1,120 +1,208 @@
 import pandas as pd
-import glob
 import os
 import json
-import frontmatter
 import sys
 
 # [Path Fix] 確保可以從 src.utils 導入模組
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
-from src.utils.analytics import generate_system_state
+from src.utils.analytics import generate_system_state, STATE_COLUMNS
+from src.utils import archive_store
+from src.utils import semantic_search
+from src.utils import embedding_store
+from src.utils import json_export
+from src.utils import tag_graph
+from src.utils import fulltext_index
+from src.utils import rollups
+from src.utils import metrics
+from src.utils import inbox_claim
+from src.utils.inbox_reader import load_inbox, markdown_records, filename_date
 
 # 定義路徑
 INBOX_PATH = "data/inbox/"
-ARCHIVE_PARQUET_PATH = "data/archive/journal.parquet"
-ARCHIVE_JSON_PATH = "data/archive/lifeos_db.json"
 SYSTEM_STATE_PATH = "data/archive/system_state.json"
 
-def compaction_process():
-    # 1. 檢查是否有新檔案
-    md_files = glob.glob(os.path.join(INBOX_PATH, "*.md"))
-    if not md_files:
-        print("No files to compact.")
-        if not os.path.exists(ARCHIVE_PARQUET_PATH):
-            return
-            
-    print(f"Starting compaction for {len(md_files)} entries...")
-
-    # 2. 讀取現有 Parquet
-    if os.path.exists(ARCHIVE_PARQUET_PATH):
-        try:
-            df_base = pd.read_parquet(ARCHIVE_PARQUET_PATH)
-        except Exception as e:
-            print(f"Warning: Could not read parquet, starting fresh. {e}")
-            df_base = pd.DataFrame()
-    else:
-        df_base = pd.DataFrame()
+# System State 只需要最近 30 筆
+SYSTEM_STATE_WINDOW = 30
 
-    # 3. 解析 Inbox 資料
+def parse_records(md_files):
+    """Inbox 紀錄 -> (歸檔列, 段落向量, 歸檔後要刪除的檔案)；不碰歸檔，可與其他 worker 平行執行"""
     new_data = []
+    chunk_items = []
     files_to_delete = []
 
-    for md_file in md_files:
-        try:
-            post = frontmatter.load(md_file)
-            entry = post.metadata
+    with metrics.span("compact.parse", items=len(md_files)):
+        for record in md_files:
+            md_file = record["md_path"]
+            try:
+                if record["error"]:
+                    raise record["error"]
+                # 複製一份，避免改動與其他階段共用的 metadata
+                entry = dict(record["metadata"])
             
-            if 'date' not in entry: 
-                filename = os.path.basename(md_file)
-                if filename[:8].isdigit():
-                    entry['date'] = f"{filename[:4]}-{filename[4:6]}-{filename[6:8]}"
-                else:
-                    entry['date'] = str(post.get('date'))[:10] if post.get('date') else "1970-01-01"
+                if 'date' not in entry: 
+                    entry['date'] = filename_date(md_file)
             
-            entry['content'] = post.content
-            entry['note'] = post.content 
+                entry['content'] = record["content"]
             
-            json_file = md_file.replace(".md", ".json")
-            if os.path.exists(json_file):
-                with open(json_file, 'r', encoding='utf-8') as f:
-                    sidecar = json.load(f)
+                json_file = record["json_path"]
+                if json_file:
+                    if record["sidecar_error"]:
+                        raise record["sidecar_error"]
+                    sidecar = record["sidecar"]
                     if 'analysis' in sidecar:
                         entry['ai_analysis'] = sidecar['analysis'] 
                         if 'mood' not in entry and 'mood' in sidecar['analysis']:
                             entry['mood'] = sidecar['analysis']['mood']
                     entry['embedding'] = sidecar.get('embedding') 
-                files_to_delete.append(json_file)
+                    if sidecar.get('chunks'):
+                        chunk_items.append((entry.get('uuid'), sidecar['chunks']))
+                    files_to_delete.append(json_file)
             
-            files_to_delete.append(md_file)
-            new_data.append(entry)
+                files_to_delete.append(md_file)
+                new_data.append(entry)
             
-        except Exception as e:
-            print(f"Error compacting {md_file}: {e}")
+            except Exception as e:
+                print(f"Error compacting {md_file}: {e}")
+                metrics.count("compact.errors")
+
+    return new_data, chunk_items, files_to_delete
+
 
-    # 4. 合併與寫入
-    if new_data or not df_base.empty:
+def commit_to_archive(new_data, chunk_items):
+    """
+    寫入歸檔並更新所有衍生檔案 (System State、分片、彙總、近鄰、標籤圖、全文索引)。
+    整段持有 archive 鎖並以最新的 Manifest 計算，平行的 worker 依序提交，不會覆蓋彼此的段或衍生檔案。
+    """
+    with archive_store.locked_manifest() as manifest:
+        # 0. 一次性遷移舊版單一 Parquet
+        with metrics.span("compact.migrate"):
+            archive_store.migrate_legacy_parquet(manifest)
+            archive_store.externalize_segment_embeddings(manifest)
+            archive_store.migrate_archive_schema(manifest)
+
+        # 3. Append-only 寫入新段 (不讀取、不改寫既有歷史)
+        touched_months = set()
         if new_data:
-            df_new = pd.DataFrame(new_data)
-            if 'date' in df_new.columns:
-                df_new['date'] = pd.to_datetime(df_new['date'])
-            if not df_base.empty and 'date' in df_base.columns:
-                df_base['date'] = pd.to_datetime(df_base['date'])
-            df_combined = pd.concat([df_base, df_new], ignore_index=True)
-        else:
-            df_combined = df_base.copy()
-        
-        if 'uuid' in df_combined.columns:
-            df_combined = df_combined.drop_duplicates(subset=['uuid'], keep='last')
-        else:
-            df_combined = df_combined.drop_duplicates(subset=['date'], keep='last')
-
-        df_combined = df_combined.sort_values(by='date')
-
-        # 生成 System State (使用共用模組)
-        try:
-            print("Analyzing System State...")
-            system_state = generate_system_state(df_combined)
-            os.makedirs(os.path.dirname(SYSTEM_STATE_PATH), exist_ok=True)
-            with open(SYSTEM_STATE_PATH, "w", encoding="utf-8") as f:
-                json.dump(system_state, f, ensure_ascii=False, indent=2)
-            print(f"✅ System State Updated: {SYSTEM_STATE_PATH}")
-        except Exception as e:
-            print(f"❌ System State Generation Failed: {e}")
-
-        if not df_combined.empty:
-            os.makedirs(os.path.dirname(ARCHIVE_PARQUET_PATH), exist_ok=True)
-            df_combined.to_parquet(ARCHIVE_PARQUET_PATH, compression='snappy')
-            print(f"Compacted to {ARCHIVE_PARQUET_PATH}")
-
-            df_export = df_combined.copy()
-            if 'embedding' in df_export.columns:
-                df_export = df_export.drop(columns=['embedding'])
-            if 'date' in df_export.columns:
-                df_export['date'] = df_export['date'].dt.strftime('%Y-%m-%d')
-            
-            df_export.to_json(ARCHIVE_JSON_PATH, orient='records', force_ascii=False, date_format='iso')
-            print(f"Exported JSON to {ARCHIVE_JSON_PATH}")
+            with metrics.span("compact.append", items=len(new_data)) as span:
+                df_new = pd.DataFrame(new_data)
+                written = archive_store.append_entries(df_new, manifest)
+                span.bytes_written = sum(seg["bytes"] for seg in written)
+                # 段落向量 (與整篇 pooled 向量分開存放)
+                embedding_store.append_chunks(chunk_items)
+            print(f"Appended {len(df_new)} entries as {len(written)} segment(s).")
+            touched_months = {seg["month"] for seg in written}
+            with metrics.span("compact.merge"):
+                archive_store.merge_small_segments(manifest)
+
+        if not manifest["segments"]:
+            return
+
+        # 3b. 選用的 int8 量化向量 (第一次由 float32 矩陣建立，之後隨 append 同步)
+        if embedding_store.QUANTIZE:
+            with metrics.span("compact.quantize") as span:
+                span.items = embedding_store.ensure_quantized() + embedding_store.ensure_quantized(embedding_store.CHUNK_DIR)
+                if span.items:
+                    print(f"🗜️ Quantized {span.items} embeddings to int8: {embedding_store.CODES_PATH}")
+
+        # 4. 生成 System State (只讀取最近幾個月份的段)
+        with metrics.span("compact.system_state"):
+            try:
+                print("Analyzing System State...")
+                df_recent = archive_store.read_recent(SYSTEM_STATE_WINDOW, manifest, columns=STATE_COLUMNS)
+                system_state = generate_system_state(df_recent, window=SYSTEM_STATE_WINDOW)
+                os.makedirs(os.path.dirname(SYSTEM_STATE_PATH), exist_ok=True)
+                with open(SYSTEM_STATE_PATH, "w", encoding="utf-8") as f:
+                    json.dump(system_state, f, ensure_ascii=False, indent=2)
+                print(f"✅ System State Updated: {SYSTEM_STATE_PATH}")
+            except Exception as e:
+                print(f"❌ System State Generation Failed: {e}")
+
+        # 5. 匯出前端用 JSON 分片 (只重寫有新資料的月份)
+        with metrics.span("compact.index") as span:
+            index = json_export.entry_index(manifest)
+            span.items = len(index)
+        if not index.empty:
+            with metrics.span("compact.export") as span:
+                summary = json_export.export_shards(touched_months, manifest, index)
+                span.items = len(summary['written'])
+                span.bytes_written = summary['bytes']
+            print(f"Exported {len(summary['written'])} of {summary['shards']} JSON shard(s) to {json_export.EXPORT_DIR}")
+
+            # 5b. 日 / 週 / 月彙總 (只重算受影響的月份)
+            with metrics.span("compact.rollups") as span:
+                try:
+                    result = rollups.update_rollups(touched_months, manifest, index)
+                    span.items = result['days']
+                    if result['months']:
+                        print(f"📈 Rollups refreshed for {len(result['months'])} month(s): {rollups.ROLLUP_PATH}")
+                except Exception as e:
+                    print(f"⚠️ Rollup update failed: {e}")
+
+            # 6. 預先計算語意近鄰 (前端 Related Entries 直接讀取；只重算新紀錄的列，再併入其他列的清單)
+            if (new_data or not os.path.exists(semantic_search.NEIGHBORS_PATH)) and 'uuid' in index.columns:
+                with metrics.span("compact.neighbors", items=len(new_data)):
+                    try:
+                        dates = index['date'].dt.strftime('%Y-%m-%d')
+                        uuid_to_date = dict(zip(index['uuid'].astype(str), dates))
+                        changed = {str(entry['uuid']) for entry in new_data if entry.get('uuid')}
+                        count = semantic_search.write_neighbors(uuid_to_date, changed=changed)
+                        print(f"🧭 Precomputed neighbors for {count} entries: {semantic_search.NEIGHBORS_PATH}")
+                    except Exception as e:
+                        print(f"⚠️ Neighbor precompute failed: {e}")
+
+            # 7. 標籤共現圖 (第一次由完整歸檔建立，之後只合併新紀錄)
+            with metrics.span("compact.tag_graph"):
+                try:
+                    graph = tag_graph.TagGraph()
+                    if not graph.exists:
+                        graph.update(archive_store.read_archive(columns=['uuid', 'date', 'entry_tags'], manifest=manifest))
+                        graph.save()
+                    elif new_data:
+                        graph.update(pd.DataFrame(new_data))
+                        graph.save()
+                    print(f"🕸️ Tag graph: {len(graph.tag_counts)} tags, {len(graph.edges)} edges: {tag_graph.GRAPH_PATH}")
+                except Exception as e:
+                    print(f"⚠️ Tag graph update failed: {e}")
+
+            # 8. 全文倒排索引 (第一次或索引格式改變時由完整歸檔建立，之後新紀錄寫成新段)
+            with metrics.span("compact.fulltext") as span:
+                try:
+                    ft_manifest = fulltext_index.load_manifest()
+                    docs = None
+                    if not fulltext_index.is_current(ft_manifest):
+                        docs = archive_store.read_archive(columns=['uuid', 'date', 'content'], manifest=manifest)
+                        fulltext_index.rebuild(docs, ft_manifest)
+                    elif new_data:
+                        docs = pd.DataFrame(new_data)
+                        fulltext_index.add_documents(docs, ft_manifest)
+                    if docs is not None:
+                        span.items = len(docs)
+                        print(f"🔎 Full-text index: {len(docs)} entries indexed, {len(ft_manifest['segments'])} segment(s): {fulltext_index.INDEX_DIR}")
+                except Exception as e:
+                    print(f"⚠️ Full-text index update failed: {e}")
+
+
+def compaction_process(records=None):
+    # 單獨執行時先認領整個 Inbox：與平行的 pipeline worker 不會處理或刪除同一筆紀錄
+    if records is None:
+        with inbox_claim.claimed(INBOX_PATH) as claim:
+            return compaction_process(load_inbox(claim.dir))
+
+    # 1. 檢查是否有新檔案
+    # (由 pipeline 傳入時共用已解析的紀錄)
+    md_files = markdown_records(records)
+    if md_files:
+        print(f"Starting compaction for {len(md_files)} entries...")
+    else:
+        print("No files to compact.")
+
+    # 2. 解析 Inbox 資料
+    new_data, chunk_items, files_to_delete = parse_records(md_files)
+
+    # 3-8. 提交到歸檔 (歸檔是空的且沒有新資料時不做任何事)
+    commit_to_archive(new_data, chunk_items)
 
+    with metrics.span("compact.cleanup", items=len(files_to_delete)):
         for f in files_to_delete:
             if os.path.exists(f):
                 os.remove(f)
@@ -122,4 +210,5 @@ def compaction_process():
             print("Inbox cleaned.")
 
 if __name__ == "__main__":
-    compaction_process()
+    with metrics.run("compact"):
+        compaction_process()
@@ -3,17 +3,52 @@ import glob
 import os
 import json
 import sys
+import datetime
 
 # [Path Fix]
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
-from src.utils.analytics import generate_system_state
+from src.utils.analytics import generate_system_state, STATE_COLUMNS
+from src.utils import archive_store
+from src.utils import rollups
+from src.utils import metrics
 
 # 定義路徑
 INBOX_PATH = "data/inbox/"
-ARCHIVE_PARQUET_PATH = "data/archive/journal.parquet"
-ARCHIVE_JSON_PATH = "data/archive/lifeos_db.json"
 SYSTEM_STATE_PATH = "data/archive/system_state.json"
 
+# System State 只需要最近 30 筆；長期趨勢由彙總表回答
+SYSTEM_STATE_WINDOW = 30
+TREND_DAYS = 90
+TREND_MONTHS = 12
+
+
+def _avg(total, n):
+    return f"{total / n:.2f}" if n else "-"
+
+
+def print_trends(table):
+    """由日 / 月彙總印出長期趨勢 (不讀取原始紀錄)"""
+    daily = rollups.series("daily", rollups=table)
+    if not daily:
+        return
+    last_day = datetime.date.fromisoformat(daily[-1][0])
+    start = (last_day - datetime.timedelta(days=TREND_DAYS - 1)).isoformat()
+    window = [(day, b) for day, b in daily if day >= start]
+    mood = sum(b["mood_sum"] for _, b in window), sum(b["mood_n"] for _, b in window)
+    focus = sum(b["focus_sum"] for _, b in window), sum(b["focus_n"] for _, b in window)
+    maintenance = sum(1 for _, b in window if b["governor_triggers"])
+    print(f"\n📈 Last {TREND_DAYS} days (to {last_day}): {sum(b['entries'] for _, b in window)} entries, "
+          f"mood {_avg(*mood)}, focus {_avg(*focus)}, {maintenance} MAINTENANCE day(s)")
+
+    monthly = rollups.series("monthly", rollups=table)[-TREND_MONTHS:]
+    print(f"\n{'month':<10}{'entries':>8}{'mood':>7}{'focus':>7}{'maint.':>8}  top tags")
+    for month, b in monthly:
+        tags = ", ".join(tag for tag, _ in rollups.top_tags([(month, b)], 3))
+        print(f"{month:<10}{b['entries']:>8}{_avg(b['mood_sum'], b['mood_n']):>7}{_avg(b['focus_sum'], b['focus_n']):>7}"
+              f"{b['maintenance_days']:>8}  {tags}")
+    top = ", ".join(f"{tag} ({n})" for tag, n in rollups.top_tags(monthly, 5))
+    print(f"\n🏷️ Most active tags over {len(monthly)} month(s): {top}")
+
 def compaction_process():
     # ... (此處可考慮進一步重構，目前為保持最小變動，僅替換 generate_system_state 邏輯)
     # 這裡的邏輯與 compact_inbox.py 幾乎一致，建議長期只需保留一個。
@@ -21,17 +56,17 @@ def compaction_process():
     
     # 1. 檢查是否有新檔案 (同 compact_inbox)
     md_files = glob.glob(os.path.join(INBOX_PATH, "*.md"))
-    if not md_files and not os.path.exists(ARCHIVE_PARQUET_PATH):
+    manifest = archive_store.load_manifest()
+    if not md_files and not manifest["segments"]:
         return
             
-    # 2. 讀取現有 Parquet
-    if os.path.exists(ARCHIVE_PARQUET_PATH):
-        try:
-            df_base = pd.read_parquet(ARCHIVE_PARQUET_PATH)
-        except Exception as e:
-            print(f"Warning: Could not read parquet. {e}")
-            df_base = pd.DataFrame()
-    else:
+    # 2. 只讀取最近幾個月份的段 (System State 只看最近 30 筆)
+    try:
+        with metrics.span("report.read") as span:
+            df_base = archive_store.read_recent(SYSTEM_STATE_WINDOW, manifest, columns=STATE_COLUMNS)
+            span.items = len(df_base)
+    except Exception as e:
+        print(f"Warning: Could not read archive. {e}")
         df_base = pd.DataFrame()
 
     # (省略中間解析步驟，因為 generate_report 主要用途若是生成報告，應該依賴已歸檔的資料)
@@ -43,11 +78,25 @@ def compaction_process():
         
         try:
             print("Analyzing System State (Report Mode)...")
-            system_state = generate_system_state(df_sorted)
+            with metrics.span("report.system_state", items=len(df_sorted)):
+                system_state = generate_system_state(df_sorted)
             # 這裡可以做不同的輸出，例如打印報告
             print(json.dumps(system_state, indent=2, ensure_ascii=False))
         except Exception as e:
             print(f"❌ System State Generation Failed: {e}")
 
+    # 3. 長期趨勢改讀彙總表 (尚未建立時由歸檔建立一次)
+    try:
+        with metrics.span("report.rollups"):
+            if not os.path.exists(rollups.ROLLUP_PATH) and manifest["segments"]:
+                # 與 compaction 共用 archive 鎖，避免同時改寫彙總表
+                with archive_store.locked_manifest(manifest) as manifest:
+                    if not os.path.exists(rollups.ROLLUP_PATH):
+                        rollups.update_rollups(manifest=manifest)
+            print_trends(rollups.load_rollups())
+    except Exception as e:
+        print(f"⚠️ Rollup trends unavailable: {e}")
+
 if __name__ == "__main__":
-    compaction_process()
+    with metrics.run("report"):
+        compaction_process()
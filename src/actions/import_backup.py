@@ -0,0 +1,120 @@
+import argparse
+import os
+import sys
+
+# [Path Fix]
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+from src.utils import backup_import
+from src.utils import metrics
+from src.utils.inbox_reader import INBOX_DIR
+
+
+class _Batcher:
+    """累積一批紀錄後一次寫入 Inbox，並在寫入後才推進斷點 (中斷時最多重做一批)"""
+
+    def __init__(self, checkpoint, state, batch_size, inbox_dir):
+        self.checkpoint = checkpoint
+        self.state = state
+        self.batch_size = batch_size
+        self.inbox_dir = inbox_dir
+        self.entries = []
+        self.done = state["done"]
+
+    def add(self, entry, done):
+        if entry is not None:
+            self.entries.append(entry)
+        else:
+            self.state["skipped"] += 1
+        self.done = done
+        if len(self.entries) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if self.entries:
+            with metrics.span("import.write", items=len(self.entries)) as span:
+                span.bytes_written = backup_import.write_entries(self.entries, self.inbox_dir)
+            self.state["imported"] += len(self.entries)
+            self.checkpoint["pending_compaction"] = True
+            print(f"📦 {self.state['imported']} entries written to {self.inbox_dir}")
+        self.entries = []
+        self.state["done"] = self.done
+        backup_import.save_checkpoint(self.checkpoint)
+
+
+def import_bundle(path, batcher, archive_keys):
+    done = batcher.state["done"]
+    for position, log in enumerate(backup_import.iter_bundle_logs(path), 1):
+        if position <= done:
+            continue
+        batcher.add(backup_import.log_to_entry(log, archive_keys), position)
+
+
+def import_markdown(root, batcher):
+    """只匯入新增或修改過的檔案；seen 隨批次寫入一起存入斷點"""
+    seen = batcher.state["done"]
+    for rel_path, md_path in backup_import.iter_markdown(root):
+        mtime_ns = os.stat(md_path).st_mtime_ns
+        if seen.get(rel_path) == mtime_ns:
+            continue
+        try:
+            entry = backup_import.markdown_to_entry(md_path, root)
+        except Exception as e:
+            print(f"⚠️ Skipped {rel_path}: {e}")
+            entry = None
+        seen[rel_path] = mtime_ns
+        batcher.add(entry, seen)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk-import dashboard backups or markdown journals into the archive.")
+    parser.add_argument("sources", nargs="+", help="life_os_backup_*.json bundles and/or folders of .md journals.")
+    parser.add_argument("--batch-size", type=int, default=backup_import.DEFAULT_BATCH_SIZE)
+    parser.add_argument("--inbox", default=INBOX_DIR)
+    parser.add_argument("--restart", action="store_true", help="Ignore the checkpoint and import everything again.")
+    parser.add_argument("--no-compact", action="store_true", help="Only write inbox records; compact later.")
+    args = parser.parse_args(argv)
+
+    checkpoint = backup_import.load_checkpoint()
+    if args.restart:
+        checkpoint["sources"] = {}
+
+    archive_keys = None
+    for source in args.sources:
+        if not os.path.exists(source):
+            print(f"❌ Not found: {source}")
+            continue
+        state = backup_import.source_state(checkpoint, source)
+        is_dir = os.path.isdir(source)
+        # 資料夾每次都重新比對 (之後新增的日記也要匯入)；備份檔內容不變時不必重讀
+        if state["finished"] and not is_dir:
+            print(f"⏭️ Already imported: {source} ({state['imported']} entries)")
+            continue
+        if state["done"] and not is_dir:
+            print(f"↩️ Resuming {source} after {state['done']}")
+
+        batcher = _Batcher(checkpoint, state, max(1, args.batch_size), args.inbox)
+        with metrics.span("import.read") as span:
+            if is_dir:
+                import_markdown(source, batcher)
+            else:
+                if archive_keys is None:
+                    with metrics.span("import.archive_keys") as keys_span:
+                        archive_keys = backup_import.load_archive_keys()
+                        keys_span.items = len(archive_keys)
+                import_bundle(source, batcher, archive_keys)
+            state["finished"] = True
+            batcher.flush()
+            span.items = state["imported"]
+        print(f"✅ {source}: {state['imported']} imported, {state['skipped']} skipped.")
+
+    # 整批匯入只做一次 compaction (中斷後重跑時，已寫入但尚未歸檔的紀錄在這裡補上)
+    if checkpoint.get("pending_compaction") and not args.no_compact:
+        from src.actions.compact_inbox import compaction_process
+        compaction_process()
+        checkpoint["pending_compaction"] = False
+        backup_import.save_checkpoint(checkpoint)
+
+
+if __name__ == "__main__":
+    with metrics.run("import"):
+        main()
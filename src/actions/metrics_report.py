@@ -0,0 +1,66 @@
+import os
+import sys
+import argparse
+
+# [Path Fix]
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+from src.utils import metrics
+
+
+def summarize(runs):
+    """把多次執行的紀錄整理成 {指令: 總耗時}、{階段: 各次耗時 / 筆數 / 位元組}、{計數器: 各次數值}"""
+    totals, stages, counters = {}, {}, {}
+    for record in runs:
+        totals.setdefault(record.get("command", "?"), []).append(record.get("seconds", 0.0))
+        for name, agg in record.get("spans", {}).items():
+            stage = stages.setdefault(name, {"seconds": [], "items": [], "bytes": []})
+            stage["seconds"].append(agg["seconds"])
+            stage["items"].append(agg["items"])
+            stage["bytes"].append(agg["bytes_read"] + agg["bytes_written"])
+        for name, value in record.get("counters", {}).items():
+            counters.setdefault(name, []).append(value)
+    return totals, stages, counters
+
+
+def _fmt(value, digits=2):
+    return "-" if value is None else f"{value:.{digits}f}"
+
+
+def print_report(runs):
+    if not runs:
+        print(f"No metrics recorded yet ({metrics.METRICS_PATH}).")
+        return
+    totals, stages, counters = summarize(runs)
+    print(f"📊 {len(runs)} run(s) from {runs[0].get('started')} to {runs[-1].get('started')}")
+    failed = sum(1 for r in runs if r.get("status") != "ok")
+    if failed:
+        print(f"⚠️ {failed} run(s) did not finish ok")
+
+    print(f"\n{'command':<28}{'runs':>6}{'p50 s':>10}{'p95 s':>10}")
+    for name, values in sorted(totals.items()):
+        print(f"{name:<28}{len(values):>6}{_fmt(metrics.percentile(values, 50)):>10}{_fmt(metrics.percentile(values, 95)):>10}")
+
+    print(f"\n{'stage':<28}{'runs':>6}{'p50 s':>10}{'p95 s':>10}{'p50 items':>11}{'p50 MB r/w':>12}")
+    for name, stage in sorted(stages.items(), key=lambda kv: -metrics.percentile(kv[1]["seconds"], 95)):
+        seconds = stage["seconds"]
+        mb = metrics.percentile(stage["bytes"], 50) / 1e6
+        print(f"{name:<28}{len(seconds):>6}{_fmt(metrics.percentile(seconds, 50)):>10}{_fmt(metrics.percentile(seconds, 95)):>10}"
+              f"{metrics.percentile(stage['items'], 50):>11}{_fmt(mb):>12}")
+
+    if counters:
+        print(f"\n{'counter':<28}{'runs':>6}{'total':>10}{'p50':>10}{'p95':>10}")
+        for name, values in sorted(counters.items()):
+            print(f"{name:<28}{len(values):>6}{sum(values):>10}{metrics.percentile(values, 50):>10}{metrics.percentile(values, 95):>10}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Per-stage p50/p95 timings across recorded runs.")
+    parser.add_argument("--command", help="Only include runs of this command (e.g. pipeline, compact).")
+    parser.add_argument("--last", type=int, default=30, help="Number of most recent runs to include (0 = all).")
+    parser.add_argument("--path", default=metrics.METRICS_PATH)
+    args = parser.parse_args(argv)
+    print_report(metrics.load_runs(args.path, command=args.command, last=args.last or None))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,50 +1,73 @@
 import os
+import sys
 import json
 import uuid
+import glob
+import asyncio
+import argparse
 import datetime
-from google import genai
+import concurrent.futures
 import frontmatter
 import re
 
-API_KEY = os.getenv("GEMINI_API_KEY")
-if not API_KEY:
-    raise ValueError("FATAL: GEMINI_API_KEY is not set.")
+# [Path Fix]
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+from src.utils.rate_limit import TokenBucket, backoff_delay, is_quota_error
+from src.utils.response_cache import get_cache, cache_key
+from src.utils import metrics
+from src.utils import chunking
+from src.utils.outline import parse_outline, MIT_HEADING_RE
 
-# [MIGRATION] 初始化新版 Client
-client = genai.Client(api_key=API_KEY)
+GENERATION_MODEL = 'gemini-2.5-flash'
+EMBEDDING_MODEL = "text-embedding-004"
+EMBEDDING_TASK_TYPE = 'RETRIEVAL_DOCUMENT'
+
+# 修改 build_prompt 內容時必須遞增，讓舊的分析快取自動失效
+PROMPT_TEMPLATE_VERSION = "v1"
+
+# Batch Mode 預設值
+DEFAULT_CONCURRENCY = 8
+DEFAULT_RPM = 60
+DEFAULT_MAX_RETRIES = 5
+
+# 段落 embedding：每次 embed_content 最多送出的段落數 (API 上限 100)，
+# 批次模式下多篇日記的段落最多等待 EMBED_LINGER 秒合併成同一個請求
+MAX_EMBED_BATCH = 100
+EMBED_BATCH_SIZE = min(MAX_EMBED_BATCH, int(os.getenv("LIFEOS_EMBED_BATCH_SIZE", "32")))
+EMBED_LINGER = 0.05
+
+_client = None
+
+def get_client():
+    """延遲建立 Gemini Client：只有真正需要呼叫 API 時才檢查金鑰"""
+    global _client
+    if _client is None:
+        API_KEY = os.getenv("GEMINI_API_KEY")
+        if not API_KEY:
+            raise ValueError("FATAL: GEMINI_API_KEY is not set.")
+        # [MIGRATION] 初始化新版 Client
+        from google import genai
+        _client = genai.Client(api_key=API_KEY)
+    return _client
 
 def regex_fallback_extract(raw_text):
     """
-    如果 AI 失敗，使用強化的正則表達式強制提取 'Tomorrow's MIT' 區塊
+    如果 AI 失敗，由 Markdown 大綱 (與 classify_inbox 共用的單次掃描) 強制提取 'Tomorrow's MIT' 區塊
     """
-    tasks = []
-    # (?:##|###) -> 匹配二級或三級標題
-    mit_pattern = r"(?:##|###)\s*(?:\d+\.?\s*)?Tomorrow.s\s*MIT.*?(?:\n|$)(.*?)(?=\n#|\Z)"
-    
-    match = re.search(mit_pattern, raw_text, re.DOTALL | re.IGNORECASE)
-    
-    if match:
-        block_content = match.group(1)
-        print(f"🔍 DEBUG: Regex found MIT block content (len={len(block_content)})")
-        lines = block_content.split('\n')
-        for line in lines:
-            line = line.strip()
-            # 支援 "- [ ]", "- ", "TODO:"
-            if line.startswith('- [ ]') or line.startswith('- ') or line.startswith('TODO'):
-                clean_task = re.sub(r"^(-\s*\[\s*\]|-\s*|TODO\s*:?)\s*", "", line)
-                if clean_task:
-                    tasks.append({
-                        "task": clean_task,
-                        "priority": "High", 
-                        "context": "Fallback Extraction"
-                    })
+    outline = parse_outline(raw_text)
+    mit_headings = [h for h in outline["headings"] if MIT_HEADING_RE.search(h["title"])]
+    if mit_headings or outline["mit"]:
+        print(f"🔍 DEBUG: Outline found MIT block with {len(outline['mit'])} item(s)")
     else:
-        print("🔍 DEBUG: Regex could not find 'Tomorrow's MIT' header (Check numbering or spelling).")
-        
-    return tasks
+        print("🔍 DEBUG: Outline could not find 'Tomorrow's MIT' header (Check numbering or spelling).")
+
+    return [
+        {"task": task, "priority": "High", "context": "Fallback Extraction"}
+        for task in outline["mit"]
+    ]
 
-def analyze_dual_track_entry(raw_text):
-    prompt = f"""
+def build_prompt(raw_text):
+    return f"""
     You are the parser for LifeOS. Convert the raw "Dual-Track" journal into structured JSON.
     
     ### Input Text:
@@ -62,44 +85,125 @@ def analyze_dual_track_entry(raw_text):
     }}
     """
 
-    try:
-        # [MIGRATION] 新版生成調用 (google-genai)
+def _generation_key(raw_text):
+    return cache_key(GENERATION_MODEL, PROMPT_TEMPLATE_VERSION, raw_text)
+
+def _embedding_key(raw_text):
+    return cache_key(EMBEDDING_MODEL, EMBEDDING_TASK_TYPE, raw_text)
+
+def cached_analysis(raw_text):
+    """查詢分析快取，未命中回傳 None"""
+    cache = get_cache('generation')
+    return cache.get(_generation_key(raw_text)) if cache else None
+
+def cached_embedding(raw_text):
+    cache = get_cache('embedding')
+    return cache.get(_embedding_key(raw_text)) if cache else None
+
+def generate_analysis(client, raw_text):
+    """先查快取，未命中才呼叫生成模型 (錯誤直接拋出，由呼叫端決定重試或 Fallback)"""
+    cached = cached_analysis(raw_text)
+    if cached is not None:
+        return cached
+    return request_analysis(client, raw_text)
+
+def request_analysis(client, raw_text):
+    """呼叫生成模型並解析 JSON，成功後寫入快取"""
+    return parse_analysis(raw_text, request_generation(client, raw_text))
+
+def request_generation(client, raw_text):
+    """只呼叫生成模型並回傳文字 (批次模式只重試這一步)"""
+    # [MIGRATION] 新版生成調用 (google-genai)
+    with metrics.span("ingest.generate", items=1) as span:
         response = client.models.generate_content(
-            model='gemini-2.5-flash',
-            contents=prompt
+            model=GENERATION_MODEL,
+            contents=build_prompt(raw_text)
         )
-        # 移除 markdown code block 標記
-        clean_text = response.text.replace('```json', '').replace('```', '').strip()
-        analysis = json.loads(clean_text)
-    except Exception as e:
-        print(f"❌ AI Parse Failed: {e}")
-        analysis = {"action_items": [], "summary": "AI Parse Error"}
+        span.bytes_read = len(response.text.encode('utf-8'))
+    return response.text
+
+def parse_analysis(raw_text, response_text):
+    """解析生成模型的 JSON 回應，成功後寫入快取"""
+    # 移除 markdown code block 標記
+    clean_text = response_text.replace('```json', '').replace('```', '').strip()
+    analysis = json.loads(clean_text)
+
+    # 只快取成功解析的結果
+    cache = get_cache('generation')
+    if cache:
+        cache.put(_generation_key(raw_text), analysis)
+    return analysis
+
+def request_embeddings(client, texts):
+    """一次 embed_content 送出多個段落，成功後逐段寫入快取 (快取鍵為段落文字)"""
+    # [MIGRATION] 新版 Embedding 調用 (google-genai)
+    with metrics.span("ingest.embed", items=len(texts)):
+        embedding_resp = client.models.embed_content(
+            model=EMBEDDING_MODEL,
+            contents=list(texts),
+            config={'task_type': EMBEDDING_TASK_TYPE}
+        )
+    # 新版 SDK 回傳結構：embedding_resp.embeddings[i].values，順序與輸入相同
+    vectors = [list(e.values) for e in embedding_resp.embeddings]
+
+    cache = get_cache('embedding')
+    if cache:
+        for text, vector in zip(texts, vectors):
+            cache.put(_embedding_key(text), vector)
+    return vectors
+
+def embed_chunks(client, texts, batch_size=EMBED_BATCH_SIZE):
+    """快取命中的段落直接取用，其餘每 batch_size 段合併成一次請求"""
+    vectors = [cached_embedding(t) for t in texts]
+    missing = [i for i, v in enumerate(vectors) if v is None]
+    for start in range(0, len(missing), batch_size):
+        rows = missing[start:start + batch_size]
+        for i, vector in zip(rows, request_embeddings(client, [texts[i] for i in rows])):
+            vectors[i] = vector
+    return vectors
+
+def build_embedding(chunks, vectors):
+    """段落向量 -> (整篇 pooled 向量, Sidecar 的 chunks 清單)"""
+    pooled = chunking.pool(vectors, [len(c["text"]) for c in chunks])
+    return pooled, [{"heading": c["heading"], "chars": len(c["text"]), "embedding": v} for c, v in zip(chunks, vectors)]
 
+def embed_entry(client, raw_text, batch_size=EMBED_BATCH_SIZE):
+    """依 Markdown 標題切段後批次 embedding，回傳 (pooled 向量, chunks)"""
+    chunks = chunking.chunk_entry(raw_text)
+    return build_embedding(chunks, embed_chunks(client, [c["text"] for c in chunks], batch_size))
+
+def apply_fallback(analysis, raw_text):
     # 如果 AI 沒抓到，啟用 Regex Fallback
     if not analysis.get('action_items'):
         print("⚠️ AI found no actions. Engaging Regex Fallback Protocol...")
+        metrics.count("ingest.regex_fallback")
         fallback_actions = regex_fallback_extract(raw_text)
         if fallback_actions:
             analysis['action_items'] = fallback_actions
+    return analysis
+
+def analyze_dual_track_entry(raw_text, client=None):
+    if client is None:
+        client = get_client()
+
+    try:
+        analysis = generate_analysis(client, raw_text)
+    except Exception as e:
+        print(f"❌ AI Parse Failed: {e}")
+        analysis = {"action_items": [], "summary": "AI Parse Error"}
+
+    apply_fallback(analysis, raw_text)
 
     # Embedding
     try:
-        # [MIGRATION] 新版 Embedding 調用 (google-genai)
-        # 注意：LifeOS 目前僅使用單一文檔 embedding
-        embedding_resp = client.models.embed_content(
-            model="text-embedding-004",
-            contents=raw_text,
-            config={'task_type': 'RETRIEVAL_DOCUMENT'}
-        )
-        # 新版 SDK 回傳結構：embedding_resp.embeddings[0].values
-        embedding = embedding_resp.embeddings[0].values
+        embedding, chunks = embed_entry(client, raw_text)
     except Exception as e:
         print(f"⚠️ Embedding Failed: {e}")
-        embedding = []
+        embedding, chunks = [], []
     
-    return analysis, embedding
+    return analysis, embedding, chunks
 
-def save_to_inbox(raw_text, analysis, embedding):
+def save_to_inbox(raw_text, analysis, embedding, chunks=None):
     date_str = datetime.datetime.now().strftime("%Y-%m-%d")
     date_match = re.search(r'(\d{4}-\d{2}-\d{2})', raw_text)
     if date_match:
@@ -113,27 +217,270 @@ def save_to_inbox(raw_text, analysis, embedding):
         "date": date_str,
         "raw_text": raw_text, 
         "analysis": analysis, 
-        "embedding": embedding 
+        "embedding": embedding,
+        "chunks": chunks or []
     }
 
     os.makedirs("data/inbox", exist_ok=True)
     
-    json_path = f"{filename_base}.json"
-    with open(json_path, "w", encoding="utf-8") as f:
-        json.dump(frontend_data, f, ensure_ascii=False, indent=2)
+    # 兩個檔案都先寫暫存檔再 rename，且 Sidecar 先於 .md 出現：
+    # 認領 Inbox 的 worker 看到 .md 時，內容與 Sidecar 一定已經完整
+    with metrics.span("ingest.save", items=1) as span:
+        json_path = f"{filename_base}.json"
+        with open(f"{json_path}.tmp", "w", encoding="utf-8") as f:
+            json.dump(frontend_data, f, ensure_ascii=False, indent=2)
+        os.replace(f"{json_path}.tmp", json_path)
 
-    md_path = f"{filename_base}.md"
-    post = frontmatter.Post(raw_text, **{"uuid": entry_id, "mood": analysis.get("mood")})
-    with open(md_path, "w", encoding="utf-8") as f:
-        f.write(frontmatter.dumps(post))
+        md_path = f"{filename_base}.md"
+        post = frontmatter.Post(raw_text, **{"uuid": entry_id, "mood": analysis.get("mood")})
+        with open(f"{md_path}.tmp", "w", encoding="utf-8") as f:
+            f.write(frontmatter.dumps(post))
+        os.replace(f"{md_path}.tmp", md_path)
+        span.bytes_written = metrics.file_size(json_path) + metrics.file_size(md_path)
 
     print(f"✅ FILE WRITTEN: {os.path.abspath(json_path)}")
+    return entry_id
 
-if __name__ == "__main__":
-    journal_text = os.getenv("JOURNAL_TEXT")
-    if not journal_text:
-        print("⚠️ No text provided.")
+# ============================================================================
+# Batch Mode：多篇日記並行解析 (asyncio worker pool + RPM 限速 + 指數退避)
+# ============================================================================
+
+def load_batch_texts(source):
+    """
+    讀取批次輸入，回傳 [(source_id, text), ...]
+    - 目錄：每個 .md / .txt 檔案為一篇
+    - JSONL：每行為字串或 {"text": ...} (source 為 '-' 時讀 stdin)
+    """
+    items = []
+    if source != '-' and os.path.isdir(source):
+        paths = sorted(glob.glob(os.path.join(source, "*.md")) + glob.glob(os.path.join(source, "*.txt")))
+        for path in paths:
+            with open(path, 'r', encoding='utf-8') as f:
+                items.append((os.path.basename(path), f.read()))
+        return items
+
+    stream = sys.stdin if source == '-' else open(source, 'r', encoding='utf-8')
+    try:
+        for line_no, line in enumerate(stream, 1):
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            text = record if isinstance(record, str) else record.get('text')
+            if text:
+                items.append((f"line:{line_no}", text))
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+    return items
+
+async def _call_with_retry(limiter, fn, *args, max_retries=DEFAULT_MAX_RETRIES):
+    """限速後在執行緒中呼叫同步 SDK；遇到配額錯誤時指數退避重試"""
+    attempt = 0
+    while True:
+        await limiter.acquire_async()
+        try:
+            return await asyncio.to_thread(fn, *args), attempt
+        except Exception as e:
+            if not is_quota_error(e) or attempt >= max_retries:
+                raise
+            delay = backoff_delay(attempt)
+            metrics.count("ingest.retries")
+            print(f"⏳ Quota hit, retry {attempt + 1}/{max_retries} in {delay:.1f}s: {e}")
+            await asyncio.sleep(delay)
+            attempt += 1
+
+class EmbeddingBatcher:
+    """
+    批次模式的段落 embedding：多篇日記的段落合併成同一個 embed_content 請求。
+    累積滿 batch_size 段立即送出，否則等待 linger 秒收集其他日記的段落；
+    每個請求都經過共用的限速器與退避重試，失敗時該請求內的所有段落一起失敗。
+    """
+
+    def __init__(self, client, limiter, batch_size=EMBED_BATCH_SIZE, linger=EMBED_LINGER, max_retries=DEFAULT_MAX_RETRIES):
+        self.client = client
+        self.limiter = limiter
+        self.batch_size = max(1, min(batch_size, MAX_EMBED_BATCH))
+        self.linger = linger
+        self.max_retries = max_retries
+        self.requests = 0
+        self._pending = []
+        self._timer = None
+        self._tasks = set()
+
+    async def embed(self, texts):
+        loop = asyncio.get_running_loop()
+        futures = []
+        for text in texts:
+            future = loop.create_future()
+            cached = cached_embedding(text)
+            if cached is not None:
+                future.set_result(cached)
+            else:
+                self._pending.append((text, future))
+            futures.append(future)
+        if len(self._pending) >= self.batch_size:
+            self._flush()
+        elif self._pending and self._timer is None:
+            self._timer = loop.call_later(self.linger, self._flush)
+        return list(await asyncio.gather(*futures))
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        while self._pending:
+            batch, self._pending = self._pending[:self.batch_size], self._pending[self.batch_size:]
+            task = asyncio.ensure_future(self._send(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _send(self, batch):
+        self.requests += 1
+        try:
+            vectors, _ = await _call_with_retry(self.limiter, request_embeddings, self.client,
+                                                [text for text, _ in batch], max_retries=self.max_retries)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), vector in zip(batch, vectors):
+            if not future.done():
+                future.set_result(vector)
+
+async def _analyze_async(client, limiter, text, max_retries):
+    """快取命中則不佔用配額；只有生成請求會重試，JSON 解析在重試迴圈外 (解析失敗直接回報)"""
+    cached = cached_analysis(text)
+    if cached is not None:
+        return cached, 0
+    response_text, retries = await _call_with_retry(limiter, request_generation, client, text, max_retries=max_retries)
+    return parse_analysis(text, response_text), retries
+
+async def _embed_entry_async(batcher, text):
+    chunks = chunking.chunk_entry(text)
+    return build_embedding(chunks, await batcher.embed([c["text"] for c in chunks]))
+
+async def _process_one(client, limiter, semaphore, batcher, index, source_id, text, max_retries):
+    async with semaphore:
+        started = datetime.datetime.now()
+        result = {"index": index, "source": source_id}
+        # 生成與 Embedding 同時進行
+        gen_task = _analyze_async(client, limiter, text, max_retries)
+        emb_task = _embed_entry_async(batcher, text)
+        gen_res, emb_res = await asyncio.gather(gen_task, emb_task, return_exceptions=True)
+
+        # 與單篇模式相同：生成或解析失敗時以 "AI Parse Error" + Regex Fallback 存檔，Embedding 失敗時不帶向量，
+        # 紀錄不會因暫時性錯誤而遺失；錯誤仍記在結果中 (status 為 fallback)
+        errors = []
+        if isinstance(gen_res, Exception):
+            errors.append(f"generate: {type(gen_res).__name__}: {gen_res}")
+            analysis, gen_retries = {"action_items": [], "summary": "AI Parse Error"}, 0
+        else:
+            analysis, gen_retries = gen_res
+        if isinstance(emb_res, Exception):
+            errors.append(f"embed: {type(emb_res).__name__}: {emb_res}")
+            embedding, chunks = [], []
+        else:
+            embedding, chunks = emb_res
+
+        try:
+            apply_fallback(analysis, text)
+            result.update({
+                "status": "fallback" if errors else "ok",
+                "uuid": save_to_inbox(text, analysis, embedding, chunks),
+                "chunks": len(chunks),
+                "retries": gen_retries,
+            })
+        except Exception as e:
+            errors.append(f"save: {type(e).__name__}: {e}")
+            result["status"] = "error"
+        if errors:
+            result["error"] = "; ".join(errors)
+        result["seconds"] = round((datetime.datetime.now() - started).total_seconds(), 3)
+        return result
+
+async def run_batch_async(items, client, concurrency=DEFAULT_CONCURRENCY, rpm=DEFAULT_RPM, max_retries=DEFAULT_MAX_RETRIES):
+    limiter = TokenBucket.per_minute(rpm)
+    semaphore = asyncio.Semaphore(concurrency)
+    # 每篇同時有兩個 API 呼叫，執行緒數需為並行度的兩倍
+    loop = asyncio.get_running_loop()
+    loop.set_default_executor(concurrent.futures.ThreadPoolExecutor(max_workers=concurrency * 2))
+    batcher = EmbeddingBatcher(client, limiter, max_retries=max_retries)
+    tasks = [
+        _process_one(client, limiter, semaphore, batcher, i, source_id, text, max_retries)
+        for i, (source_id, text) in enumerate(items)
+    ]
+    results = await asyncio.gather(*tasks)
+    metrics.count("ingest.embed_requests", batcher.requests)
+    return results
+
+def run_batch(items, client=None, concurrency=DEFAULT_CONCURRENCY, rpm=DEFAULT_RPM, max_retries=DEFAULT_MAX_RETRIES):
+    """同步入口：回傳每篇的結果，順序與輸入相同；status 為 ok、fallback (以 Fallback 分析存檔) 或 error (未存檔)"""
+    if client is None:
+        client = get_client()
+    return asyncio.run(run_batch_async(items, client, concurrency, rpm, max_retries))
+
+def report_cache_stats():
+    for namespace in ('generation', 'embedding'):
+        cache = get_cache(namespace)
+        if cache:
+            print(f"🗄️ Cache {cache.summary()}")
+            metrics.count(f"cache.{namespace}.hits", cache.stats["hits"])
+            metrics.count(f"cache.{namespace}.misses", cache.stats["misses"])
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="LifeOS neural intake (single entry or batch).")
+    parser.add_argument("--batch", help="Directory of .md/.txt journals, or a JSONL file ('-' for stdin).")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY)
+    parser.add_argument("--rpm", type=int, default=DEFAULT_RPM, help="Requests-per-minute budget shared by all workers.")
+    parser.add_argument("--max-retries", type=int, default=DEFAULT_MAX_RETRIES)
+    parser.add_argument("--report", help="Write per-item results as JSONL to this path.")
+    parser.add_argument("--fake", action="store_true", help="Use the offline fake Gemini client.")
+    parser.add_argument("--no-cache", action="store_true", help="Bypass the on-disk response cache.")
+    args = parser.parse_args(argv)
+
+    if args.no_cache:
+        os.environ["LIFEOS_CACHE"] = "off"
+
+    client = None
+    if args.fake:
+        from src.utils.fake_genai import FakeGenaiClient
+        client = FakeGenaiClient()
+
+    if not args.batch:
+        journal_text = os.getenv("JOURNAL_TEXT")
+        if not journal_text:
+            print("⚠️ No text provided.")
+            exit(1)
+
+        analysis_data, vector_data, chunk_data = analyze_dual_track_entry(journal_text, client)
+        save_to_inbox(journal_text, analysis_data, vector_data, chunk_data)
+        report_cache_stats()
+        return
+
+    items = load_batch_texts(args.batch)
+    print(f"🧠 Batch intake: {len(items)} entries (concurrency={args.concurrency}, rpm={args.rpm})")
+    results = run_batch(items, client, args.concurrency, args.rpm, args.max_retries)
+
+    failed = [r for r in results if r["status"] == "error"]
+    degraded = [r for r in results if r["status"] == "fallback"]
+    metrics.count("ingest.failed", len(failed))
+    metrics.count("ingest.fallback", len(degraded))
+    for r in degraded:
+        print(f"⚠️ [{r['source']}] saved with fallback analysis: {r['error']}")
+    for r in failed:
+        print(f"❌ [{r['source']}] {r['error']}")
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            for r in results:
+                f.write(json.dumps(r, ensure_ascii=False) + "\n")
+    print(f"✅ Batch done: {len(results) - len(failed) - len(degraded)} ok, {len(degraded)} fallback, {len(failed)} failed.")
+    report_cache_stats()
+    if failed:
         exit(1)
-    
-    analysis_data, vector_data = analyze_dual_track_entry(journal_text)
-    save_to_inbox(journal_text, analysis_data, vector_data)
+
+if __name__ == "__main__":
+    with metrics.run("ingest"):
+        main()
+    
\ No newline at end of file
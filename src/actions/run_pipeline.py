@@ -0,0 +1,64 @@
+import argparse
+import os
+import sys
+import time
+
+# [Path Fix]
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+from src.utils.inbox_reader import load_inbox, INBOX_DIR
+from src.actions.classify_inbox import process_inbox_files
+from src.actions.sync_tasks import sync_tasks_to_cloud
+from src.actions.compact_inbox import compaction_process
+from src.utils import metrics
+from src.utils import inbox_claim
+
+# (階段名稱, 函數, 失敗時是否繼續) —— 對應原 workflow 的 continue-on-error 設定
+STAGES = [
+    ("🔀 Dual-Track Splitter", process_inbox_files, True),
+    ("✅ Sync Tasks", sync_tasks_to_cloud, True),
+    ("🗜️ Compaction & Cleanup", compaction_process, False),
+]
+
+def run_pipeline(inbox_dir=INBOX_DIR, limit=None, worker=None):
+    """
+    單次掃描 Inbox：先以 rename 認領紀錄到這個 worker 的暫存區，每筆紀錄只解析一次，依序交給分流、任務同步、歸檔三個階段。
+    多個 pipeline 可同時執行，各自只處理自己認領的紀錄；結束時沒歸檔成功的檔案放回 Inbox。
+    回傳是否有「不可忽略」的階段失敗。
+    """
+    with inbox_claim.claimed(inbox_dir, limit, worker) as claim:
+        started = time.monotonic()
+        records = load_inbox(claim.dir)
+        print(f"📥 Claimed and loaded {len(records)} inbox records as {claim.worker} in {time.monotonic() - started:.2f}s")
+
+        fatal = False
+        for name, stage, continue_on_error in STAGES:
+            print(f"\n=== {name} ===")
+            stage_started = time.monotonic()
+            claim.heartbeat()
+            try:
+                stage(records)
+            except Exception as e:
+                print(f"❌ Stage failed: {name}: {e}")
+                metrics.count("pipeline.stage_failures")
+                if not continue_on_error:
+                    fatal = True
+                    break
+            print(f"⏱️ {name} finished in {time.monotonic() - stage_started:.2f}s")
+    return not fatal
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="classify + sync + compact the inbox in a single pass.")
+    parser.add_argument("--limit", type=int, default=None,
+                        help="Claim at most this many entries (other workers take the rest).")
+    parser.add_argument("--worker-id", default=None,
+                        help="Name of this worker's staging area (default: LIFEOS_WORKER_ID or host-pid).")
+    args = parser.parse_args(argv)
+    return run_pipeline(limit=args.limit, worker=args.worker_id)
+
+if __name__ == "__main__":
+    with metrics.run("pipeline") as record:
+        ok = main()
+        if not ok:
+            record["status"] = "failed"
+    if not ok:
+        sys.exit(1)
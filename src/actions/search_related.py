@@ -0,0 +1,51 @@
+import argparse
+import os
+import sys
+
+# [Path Fix]
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+from src.utils import archive_store
+from src.utils import semantic_search
+from src.utils import metrics
+
+
+def describe_hits(hits):
+    """補上日期與內容摘要，方便在終端機閱讀"""
+    if not hits:
+        print("💡 No related entries found.")
+        return
+    df = archive_store.read_archive(columns=['uuid', 'date', 'content'])
+    lookup = {}
+    if not df.empty:
+        for row in df.itertuples(index=False):
+            lookup[row.uuid] = row
+    for rank, (uuid_str, score, *section) in enumerate(hits, 1):
+        row = lookup.get(uuid_str)
+        date_str = row.date.strftime('%Y-%m-%d') if row is not None else "Unknown"
+        snippet = (row.content or "").strip().replace('\n', ' ')[:60] if row is not None else ""
+        heading = f" §{section[0]}" if section and section[0] else ""
+        print(f"{rank:>2}. [{score:.3f}] {date_str} ({uuid_str}){heading} {snippet}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Semantic related-entry search over archived embeddings.")
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--uuid", help="Find entries related to an archived entry.")
+    group.add_argument("--text", help="Free-text query (embedded with Gemini).")
+    parser.add_argument("-k", type=int, default=semantic_search.DEFAULT_K)
+    parser.add_argument("--chunks", action="store_true", help="Match --text against individual sections instead of whole entries.")
+    args = parser.parse_args(argv)
+
+    with metrics.span("search.query", items=args.k):
+        if args.uuid:
+            hits = semantic_search.related_by_uuid(args.uuid, args.k)
+        elif args.chunks:
+            hits = semantic_search.related_chunks_by_text(args.text, args.k)
+        else:
+            hits = semantic_search.related_by_text(args.text, args.k)
+    describe_hits(hits)
+
+
+if __name__ == "__main__":
+    with metrics.run("search"):
+        main()
@@ -0,0 +1,44 @@
+import argparse
+import os
+import sys
+
+# [Path Fix]
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+from src.utils import archive_store
+from src.utils import fulltext_index
+from src.utils import metrics
+
+
+def describe_hits(hits):
+    """只讀取命中紀錄所在月份的段，補上內容摘要"""
+    if not hits:
+        print("💡 No matching entries found.")
+        return
+    months = sorted({date[:7] for _, date, _ in hits})
+    df = archive_store.read_archive(months=months, columns=['uuid', 'date', 'content'])
+    lookup = {}
+    if not df.empty:
+        for row in df.itertuples(index=False):
+            lookup[str(row.uuid)] = row
+    for rank, (key, date_str, score) in enumerate(hits, 1):
+        row = lookup.get(key)
+        snippet = (row.content or "").strip().replace('\n', ' ')[:60] if row is not None else ""
+        print(f"{rank:>2}. [{score:.3f}] {date_str} ({key}) {snippet}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Ranked full-text search over archived journal content.")
+    parser.add_argument("query", nargs="+", help="Search terms (Chinese, English or mixed).")
+    parser.add_argument("-k", "--limit", type=int, default=20)
+    parser.add_argument("--from", dest="date_from", help="Earliest date (YYYY-MM-DD).")
+    parser.add_argument("--to", dest="date_to", help="Latest date (YYYY-MM-DD).")
+    args = parser.parse_args(argv)
+
+    with metrics.span("search.fulltext", items=args.limit):
+        hits = fulltext_index.search(" ".join(args.query), args.limit, args.date_from, args.date_to)
+    describe_hits(hits)
+
+
+if __name__ == "__main__":
+    with metrics.run("find"):
+        main()
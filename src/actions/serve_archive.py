@@ -0,0 +1,97 @@
+import argparse
+import os
+import sys
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# [Path Fix]
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+from src.utils.archive_query import ArchiveQuery
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+
+def parse_etags(header):
+    """If-None-Match 標頭 -> ETag 清單 (弱比對：忽略 W/ 前綴)"""
+    tags = []
+    for tag in (header or "").split(","):
+        tag = tag.strip()
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        if tag:
+            tags.append(tag)
+    return tags
+
+
+class ArchiveRequestHandler(BaseHTTPRequestHandler):
+    """只實作 GET / HEAD；其他方法由 BaseHTTPRequestHandler 回覆 501，服務不會改動歸檔"""
+
+    server_version = "LifeOSQuery/1"
+
+    def _reply(self, send_body):
+        url = urllib.parse.urlsplit(self.path)
+        path = url.path.rstrip("/") or "/"
+        params = urllib.parse.parse_qs(url.query, keep_blank_values=True)
+        try:
+            status, etag, body = self.server.engine.respond(path, params, parse_etags(self.headers.get("If-None-Match")))
+        except Exception as e:
+            print(f"⚠️ {self.path}: {e}")
+            status, etag, body = 500, None, b'{"error": "Internal error"}'
+
+        self.send_response(status)
+        if status != 304:
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+        if etag:
+            self.send_header("ETag", etag)
+            # 每次都向服務驗證 (帶 If-None-Match)，歸檔未變時只回 304
+            self.send_header("Cache-Control", "no-cache")
+        if self.server.allow_origin:
+            self.send_header("Access-Control-Allow-Origin", self.server.allow_origin)
+        self.end_headers()
+        if send_body and status != 304:
+            self.wfile.write(body)
+
+    def do_GET(self):
+        self._reply(True)
+
+    def do_HEAD(self):
+        self._reply(False)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+def make_server(host=DEFAULT_HOST, port=DEFAULT_PORT, engine=None, allow_origin=None, verbose=False):
+    server = ThreadingHTTPServer((host, port), ArchiveRequestHandler)
+    server.daemon_threads = True
+    server.engine = engine or ArchiveQuery()
+    server.allow_origin = allow_origin
+    server.verbose = verbose
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Read-only HTTP query service over the archive.")
+    parser.add_argument("--host", default=DEFAULT_HOST, help="Bind address (default: localhost only).")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--allow-origin", default=None,
+                        help="Value for Access-Control-Allow-Origin (e.g. the dashboard origin); omitted by default.")
+    parser.add_argument("--verbose", action="store_true", help="Log every request.")
+    args = parser.parse_args(argv)
+
+    server = make_server(args.host, args.port, allow_origin=args.allow_origin, verbose=args.verbose)
+    host, port = server.server_address[:2]
+    print(f"🌐 Serving archive (read-only) on http://{host}:{port}  [/entries /state /health]")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n👋 Query service stopped.")
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,16 @@
 import os
-import json
-import glob
-import requests
-import time
+import sys
+
+# [Path Fix]
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+from src.utils.task_outbox import TaskOutbox
+from src.utils.inbox_reader import load_inbox, sidecar_records
+from src.utils import metrics
+from src.utils.file_lock import file_lock
 
 ZAPIER_TASK_WEBHOOK = os.getenv("ZAPIER_TASK_WEBHOOK")
 
-def sync_tasks_to_cloud():
+def sync_tasks_to_cloud(records=None):
     print(f"📂 Current Working Directory: {os.getcwd()}")
     
     # 確保目錄存在
@@ -14,61 +18,88 @@ def sync_tasks_to_cloud():
         print("❌ ERROR: data/inbox directory does not exist!")
         return
 
-    inbox_files = glob.glob("data/inbox/*.json")
-    tasks_to_sync = []
+    # 由 pipeline 傳入時共用已解析的 Sidecar
+    if records is None:
+        records = load_inbox("data/inbox")
+    inbox_files = sidecar_records(records)
+    # Outbox 的登記、送出與改寫都持有 outbox 鎖並在鎖內載入：平行的 worker 不會重複送出同一個待送任務，
+    # 也不會在 compact() 改寫時蓋掉其他 worker 剛追加的事件
+    with file_lock("outbox"):
+        outbox = TaskOutbox()
+        new_tasks = 0
     
-    print(f"🔍 Found {len(inbox_files)} JSON files to scan.")
+        print(f"🔍 Found {len(inbox_files)} JSON files to scan.")
 
-    for filepath in inbox_files:
-        try:
-            with open(filepath, 'r', encoding='utf-8') as f:
-                data = json.load(f)
+        with metrics.span("sync.enqueue", items=len(inbox_files)):
+            for record in inbox_files:
+                filepath = record["json_path"]
+                try:
+                    if record["sidecar_error"]:
+                        raise record["sidecar_error"]
+                    data = record["sidecar"]
             
-            analysis = data.get('analysis', {})
-            # 相容性：有些舊格式可能是直接 list，有些是 dict
-            ai_actions = analysis.get('action_items', [])
+                    entry_uuid = data.get('uuid') or os.path.splitext(os.path.basename(filepath))[0]
+                    analysis = data.get('analysis', {})
+                    # 相容性：有些舊格式可能是直接 list，有些是 dict
+                    ai_actions = analysis.get('action_items', [])
             
-            if ai_actions:
-                print(f"✅ [{filepath}] Extracted {len(ai_actions)} tasks.")
-                for item in ai_actions:
-                    task_obj = item if isinstance(item, dict) else {"task": item}
+                    if ai_actions:
+                        print(f"✅ [{filepath}] Extracted {len(ai_actions)} tasks.")
+                        for item in ai_actions:
+                            task_obj = item if isinstance(item, dict) else {"task": item}
                     
-                    # [VISUAL CLEANUP] 視覺淨化處理
-                    # 1. 移除 [LifeOS] 前綴，直接顯示任務
-                    # 2. Context 改用 Hashtag 格式，較為現代且不佔版面
-                    # 3. Priority 若為 High 才標示 emoji，否則隱藏
+                            # [VISUAL CLEANUP] 視覺淨化處理
+                            # 1. 移除 [LifeOS] 前綴，直接顯示任務
+                            # 2. Context 改用 Hashtag 格式，較為現代且不佔版面
+                            # 3. Priority 若為 High 才標示 emoji，否則隱藏
                     
-                    raw_task = task_obj.get('task', 'Untitled')
-                    context = task_obj.get('context', 'General').replace(" ", "")
-                    priority = task_obj.get('priority', 'Med')
+                            raw_task = task_obj.get('task', 'Untitled')
+                            context = task_obj.get('context', 'General').replace(" ", "")
+                            priority = task_obj.get('priority', 'Med')
                     
-                    # 只有高優先級才加紅點，保持清爽
-                    priority_mark = "🔴 " if priority.lower() == 'high' else ""
+                            # 只有高優先級才加紅點，保持清爽
+                            priority_mark = "🔴 " if priority.lower() == 'high' else ""
                     
-                    tasks_to_sync.append({
-                        "title": f"{priority_mark}{raw_task}",
-                        "notes": f"#{context}", # 極簡化備註
-                        "due": "today" # 或是 tomorrow，視您的習慣
-                    })
-            else:
-                pass # 靜默處理無任務的檔案
+                            # 以 uuid + 任務文字登記到 Outbox，已送達過的任務不會再次送出
+                            if outbox.enqueue(entry_uuid, raw_task, {
+                                "title": f"{priority_mark}{raw_task}",
+                                "notes": f"#{context}", # 極簡化備註
+                                "due": "today" # 或是 tomorrow，視您的習慣
+                            }):
+                                new_tasks += 1
+                    else:
+                        pass # 靜默處理無任務的檔案
                 
-        except Exception as e:
-            print(f"❌ Error processing {filepath}: {e}")
+                except Exception as e:
+                    print(f"❌ Error processing {filepath}: {e}")
             
-    if tasks_to_sync and ZAPIER_TASK_WEBHOOK:
-        print(f"🚀 Sending {len(tasks_to_sync)} tasks to Zapier...")
-        for i, task in enumerate(tasks_to_sync):
-            try:
-                requests.post(ZAPIER_TASK_WEBHOOK, json=task)
-                print(f"📨 Sent ({i+1}/{len(tasks_to_sync)}): {task['title']}")
-                time.sleep(0.5)
-            except Exception as e:
-                print(f"❌ Send Failed: {e}")
-    elif not tasks_to_sync:
-        print("💡 No actionable tasks found.")
-    else:
-        print("⚠️ Tasks found but Webhook URL is missing.")
+        metrics.count("sync.tasks_new", new_tasks)
+
+        # 只送出尚未送達的任務 (包含上次中斷時未完成的)
+        pending = outbox.pending()
+        print(f"📤 Outbox: {new_tasks} new, {len(pending)} undelivered, {outbox.counts()['sent']} already sent.")
+        tasks_to_sync = [r["payload"] for r in pending]
+
+        if tasks_to_sync and ZAPIER_TASK_WEBHOOK:
+            print(f"🚀 Sending {len(tasks_to_sync)} tasks to Zapier...")
+            # requests 只在真的要送出時才載入
+            from src.utils.delivery import WebhookDelivery, print_report
+            engine = WebhookDelivery(ZAPIER_TASK_WEBHOOK)
+            with metrics.span("sync.deliver", items=len(tasks_to_sync)):
+                report = engine.deliver(
+                    tasks_to_sync,
+                    on_result=lambda i, payload, result: outbox.mark(pending[i]["id"], result["ok"], result["error"]),
+                )
+            metrics.count("sync.sent", report["sent"])
+            metrics.count("sync.failed", report["failed"])
+            metrics.count("sync.retries", report["retries"])
+            print_report(report)
+            outbox.compact()
+        elif not tasks_to_sync:
+            print("💡 No actionable tasks found.")
+        else:
+            print("⚠️ Tasks found but Webhook URL is missing.")
 
 if __name__ == "__main__":
-    sync_tasks_to_cloud()
+    with metrics.run("sync"):
+        sync_tasks_to_cloud()
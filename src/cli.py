@@ -0,0 +1,77 @@
+"""
+LifeOS 指令列入口：lifeos <subcommand>
+
+每個子指令只在被執行時才 import 對應模組，pandas / pyarrow / google-genai
+等重量級依賴只會出現在需要它們的子指令中 (見 benchmarks/bench_startup.py)。
+"""
+import argparse
+import importlib
+import os
+import sys
+
+# 子指令 -> (模組, 函數, 是否轉傳剩餘參數, 是否為輕量指令, 說明)
+COMMANDS = {
+    "ingest":   ("src.actions.process_inbox",  "main",                 True,  False, "Analyse JOURNAL_TEXT or a batch of journals into the inbox (Gemini)."),
+    "classify": ("src.actions.classify_inbox", "process_inbox_files",  False, True,  "Route inbox entries into life / project logs."),
+    "sync":     ("src.actions.sync_tasks",     "sync_tasks_to_cloud",  False, True,  "Deliver undelivered action items to the task webhook."),
+    "compact":  ("src.actions.compact_inbox",  "compaction_process",   False, False, "Compact the inbox into the archive and refresh exports."),
+    "report":   ("src.actions.generate_report", "compaction_process",  False, False, "Print the current system state from the archive."),
+    "pipeline": ("src.actions.run_pipeline",   "main",                 True,  False, "classify + sync + compact in a single inbox pass."),
+    "search":   ("src.actions.search_related", "main",                 True,  False, "Semantic related-entry search."),
+    "find":     ("src.actions.search_text",    "main",                 True,  False, "Ranked full-text search (Chinese / English)."),
+    "import":   ("src.actions.import_backup",  "main",                 True,  False, "Resumable bulk import of dashboard backups / markdown folders."),
+    "serve":    ("src.actions.serve_archive",  "main",                 True,  False, "Local read-only HTTP query service over the archive."),
+    "metrics":  ("src.actions.metrics_report", "main",                 True,  True,  "Per-stage p50/p95 timings across recorded runs."),
+}
+
+# 不產生 metrics 紀錄的指令 (serve 為常駐服務，整段執行時間沒有意義)
+UNRECORDED = ("metrics", "serve")
+
+# 輕量指令不得載入的模組
+HEAVY_MODULES = ("pandas", "pyarrow", "numpy", "google.genai")
+
+
+def resolve(name):
+    """載入子指令對應的函數 (此時才 import 模組)"""
+    module_name, func_name = COMMANDS[name][:2]
+    return getattr(importlib.import_module(module_name), func_name)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="lifeos", description="LifeOS journal pipeline.")
+    sub = parser.add_subparsers(dest="command", metavar="<command>")
+    sub.required = True
+    for name, (_, _, _, _, help_text) in COMMANDS.items():
+        sub.add_parser(name, help=help_text)
+    return parser
+
+
+def main(argv=None):
+    # 專案根目錄只在這裡加入一次，子指令模組以 src.* 匯入
+    root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+    if root not in sys.path:
+        sys.path.insert(0, root)
+
+    argv = sys.argv[1:] if argv is None else list(argv)
+    if argv and argv[0] in COMMANDS and COMMANDS[argv[0]][2]:
+        # 自帶 argparse 的子指令：其餘參數原樣轉交
+        command, call = argv[0], lambda func: func(argv[1:])
+    else:
+        command, call = build_parser().parse_args(argv).command, lambda func: func()
+
+    func = resolve(command)
+    if command in UNRECORDED:
+        result = call(func)
+    else:
+        from src.utils import metrics
+        with metrics.run(command) as record:
+            result = call(func)
+            if result is False:
+                record["status"] = "failed"
+    # pipeline 回傳 False 表示有不可忽略的階段失敗
+    if result is False:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
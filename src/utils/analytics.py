@@ -1,5 +1,20 @@
+import numpy as np
 import pandas as pd
-from collections import Counter
+
+# 預設視窗大小：Gardener / Idea 看最近 30 筆，Governor 看最近 2 筆
+DEFAULT_WINDOW = 30
+DEFAULT_GOVERNOR_WINDOW = 2
+
+# flatten_analysis 產生的欄位 (巢狀 ai_analysis 攤平後的型別化欄位)
+FLAT_COLUMNS = [
+    'entry_tags',
+    'has_signal', 'has_blind_spot', 'has_open_node',
+    'signal_text', 'open_node_text',
+    'life_energy', 'life_safety',
+]
+
+# System State 需要的歸檔欄位 (歸檔段已保存攤平欄位，不必讀取 content)
+STATE_COLUMNS = ['uuid', 'date'] + FLAT_COLUMNS
 
 def safe_get_dict(obj, default=None):
     """防禦性取得字典，若為 NaN/Float 則返回空字典"""
@@ -9,7 +24,86 @@ def safe_get_dict(obj, default=None):
         return obj
     return default
 
-def generate_system_state(df):
+def _as_list(obj):
+    """將 list 或 Parquet 讀回的 ndarray 統一成 list，其餘回傳 None"""
+    if isinstance(obj, list):
+        return obj
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    return None
+
+def _normalize(obj):
+    """ndarray -> list，讓 bool()/str() 的行為與 JSON 來源的資料一致"""
+    as_list = _as_list(obj)
+    return obj if as_list is None else as_list
+
+def flatten_analysis(df):
+    """
+    載入時一次性攤平 ai_analysis：tags、project_data 旗標、life_data 能量/安全。
+    回傳與 df 同 index 的型別化欄位 DataFrame。
+    """
+    n = len(df)
+    analysis_col = df['ai_analysis'] if 'ai_analysis' in df.columns else pd.Series([None] * n, index=df.index)
+    tags_col = df['tags'] if 'tags' in df.columns else pd.Series([None] * n, index=df.index)
+
+    entry_tags = []
+    has_signal = np.zeros(n, dtype=bool)
+    has_blind_spot = np.zeros(n, dtype=bool)
+    has_open_node = np.zeros(n, dtype=bool)
+    signal_text = []
+    open_node_text = []
+    life_energy = []
+    life_safety = []
+
+    for i, (raw_analysis, raw_tags) in enumerate(zip(analysis_col.values, tags_col.values)):
+        analysis = safe_get_dict(raw_analysis)
+
+        # AI tags 優先，否則使用 frontmatter tags
+        tags = _as_list(analysis.get('tags')) or _as_list(raw_tags) or []
+        entry_tags.append([str(t).replace('#', '') for t in tags])
+
+        p_data = safe_get_dict(analysis.get('project_data'))
+        signals = _normalize(p_data.get('signals'))
+        open_nodes = _normalize(p_data.get('open_nodes'))
+        has_signal[i] = bool(signals)
+        has_blind_spot[i] = bool(_normalize(p_data.get('blind_spots')))
+        has_open_node[i] = bool(open_nodes)
+        signal_text.append(str(_normalize(p_data.get('signals', '')))[:20])
+        open_node_text.append(str(_normalize(p_data.get('open_nodes', '')))[:20])
+
+        life = safe_get_dict(analysis.get('life_data'))
+        life_energy.append(life.get('energy_stability'))
+        life_safety.append(life.get('baseline_safety'))
+
+    return pd.DataFrame({
+        'entry_tags': pd.Series(entry_tags, index=df.index, dtype=object),
+        'has_signal': has_signal,
+        'has_blind_spot': has_blind_spot,
+        'has_open_node': has_open_node,
+        'signal_text': signal_text,
+        'open_node_text': open_node_text,
+        'life_energy': pd.Series(life_energy, index=df.index, dtype=object),
+        'life_safety': pd.Series(life_safety, index=df.index, dtype=object),
+    }, index=df.index)
+
+def with_flat_columns(df):
+    """若尚未攤平，附加 FLAT_COLUMNS 欄位 (已存在則原樣返回)"""
+    if all(c in df.columns for c in FLAT_COLUMNS):
+        return df
+    base = df.drop(columns=[c for c in FLAT_COLUMNS if c in df.columns])
+    return pd.concat([base, flatten_analysis(base)], axis=1)
+
+def flat_columns(df, columns=FLAT_COLUMNS):
+    """取得攤平欄位：歸檔段已保存的直接使用，否則由 ai_analysis 攤平"""
+    columns = list(columns)
+    if all(c in df.columns for c in columns):
+        return df[columns]
+    return flatten_analysis(df)[columns]
+
+def _format_dates(dates):
+    return pd.to_datetime(dates, errors='coerce').dt.strftime('%Y-%m-%d').fillna("Unknown")
+
+def generate_system_state(df, window=DEFAULT_WINDOW, governor_window=DEFAULT_GOVERNOR_WINDOW):
     """
     統一的系統狀態計算邏輯 (The Analytics Core)
     """
@@ -22,67 +116,37 @@ def generate_system_state(df):
 
     # 確保是日期倒序
     df_sorted = df.sort_values(by='date', ascending=False)
-    recent_df = df_sorted.head(30)
-    
+    # 只攤平需要的視窗 (若呼叫端已在載入時攤平則直接使用)
+    head = with_flat_columns(df_sorted.head(max(window, governor_window)))
+    recent_df = head.head(window)
+
     # 1. Gardener Logic (專案索引)
-    all_tags = []
-    for _, row in recent_df.iterrows():
-        # [Fix] 使用 safe_get_dict 防禦 float/nan
-        analysis = safe_get_dict(row.get('ai_analysis'))
-        
-        # 取得 tags，並防禦 row.get('tags') 可能回傳 float 的情況
-        tags_from_ai = analysis.get('tags')
-        tags_from_row = row.get('tags')
-        
-        # 確保 tags 是 list
-        if not isinstance(tags_from_ai, list): tags_from_ai = []
-        if not isinstance(tags_from_row, list): tags_from_row = []
-        
-        # 合併
-        tags = tags_from_ai or tags_from_row
-        
-        if isinstance(tags, list):
-            all_tags.extend([str(t).replace('#', '') for t in tags])
-    
-    tag_counts = Counter(all_tags)
-    active_projects = [tag for tag, count in tag_counts.items() if count >= 3]
+    all_tags = recent_df['entry_tags'].explode().dropna()
+    tag_counts = all_tags.groupby(all_tags, sort=False).size()
+    active_projects = tag_counts[tag_counts >= 3].index.tolist()
 
     # 2. Idea Generator (想法萃取)
-    ideas = []
-    for _, row in recent_df.iterrows():
-        analysis = safe_get_dict(row.get('ai_analysis'))
-        p_data = safe_get_dict(analysis.get('project_data'))
-        
-        has_signal = bool(p_data.get('signals'))
-        has_blind_spot = bool(p_data.get('blind_spots'))
-        has_open_node = bool(p_data.get('open_nodes'))
-
-        if has_signal and has_blind_spot and has_open_node:
-            signal_txt = str(p_data.get('signals', ''))[:20]
-            node_txt = str(p_data.get('open_nodes', ''))[:20]
-            ideas.append({
-                "date": row['date'].strftime('%Y-%m-%d') if pd.notnull(row['date']) else "Unknown",
-                "core_concept": f"{signal_txt}... + {node_txt}..."
-            })
+    idea_mask = (recent_df['has_signal'] & recent_df['has_blind_spot'] & recent_df['has_open_node']).to_numpy(dtype=bool)
+    idea_rows = recent_df[idea_mask]
+    idea_dates = _format_dates(idea_rows['date'])
+    idea_concepts = idea_rows['signal_text'] + "... + " + idea_rows['open_node_text'] + "..."
+    ideas = [
+        {"date": d, "core_concept": c}
+        for d, c in zip(idea_dates.tolist(), idea_concepts.tolist())
+    ]
 
     # 3. Governor Logic (降速機制)
-    last_2_days = df_sorted.head(2)
+    last_days = head.head(governor_window)
     throttle_mode = "BUILD"
     reason = "All Systems Nominal"
-    
-    for _, row in last_2_days.iterrows():
-        analysis = safe_get_dict(row.get('ai_analysis'))
-        life = safe_get_dict(analysis.get('life_data'))
-        
-        safety = life.get('baseline_safety')
-        energy = life.get('energy_stability')
-
-        if safety == 'Intervene' or energy == 'Low':
-            throttle_mode = "MAINTENANCE"
-            date_str = row['date'].strftime('%Y-%m-%d') if pd.notnull(row['date']) else "Unknown"
-            reason = f"Safety Protocol Triggered on {date_str}"
-            break
-            
+
+    trigger = ((last_days['life_safety'] == 'Intervene') | (last_days['life_energy'] == 'Low')).to_numpy(dtype=bool)
+    if trigger.any():
+        throttle_mode = "MAINTENANCE"
+        first = last_days.iloc[[int(trigger.argmax())]]
+        date_str = _format_dates(first['date']).iloc[0]
+        reason = f"Safety Protocol Triggered on {date_str}"
+
     return {
         "active_projects": active_projects,
         "idea_seeds": ideas,
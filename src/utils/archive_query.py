@@ -0,0 +1,379 @@
+import os
+import json
+import hashlib
+import datetime
+import functools
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from src.utils import archive_store
+from src.utils import archive_schema
+from src.utils import json_export
+from src.utils.analytics import generate_system_state, STATE_COLUMNS
+
+# 分頁預設與上限
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 1000
+# 記憶體快取的項目數 (回應本體與符合條件的紀錄清單各一份)
+CACHE_ENTRIES = 256
+STATE_WINDOW = 30
+
+_THRESHOLDS = (('mood_min', 'mood', '>='), ('mood_max', 'mood', '<='),
+               ('focus_min', 'focus', '>='), ('focus_max', 'focus', '<='))
+
+
+# --- 查詢參數 ---
+
+def _last(params, name):
+    values = params.get(name)
+    return values[-1].strip() if values else ""
+
+
+def _date(value, name):
+    try:
+        return datetime.date.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"{name} must be YYYY-MM-DD, got {value!r}")
+
+
+def _int(params, name, default, low, high):
+    value = _last(params, name)
+    if not value:
+        return default
+    try:
+        number = int(value)
+    except ValueError:
+        raise ValueError(f"{name} must be an integer, got {value!r}")
+    if not low <= number <= high:
+        raise ValueError(f"{name} must be between {low} and {high}")
+    return number
+
+
+def parse_entries_query(params):
+    """
+    查詢字串 (urllib.parse.parse_qs 的結果) -> 正規化的查詢；格式錯誤時丟出 ValueError。
+    from / to: 含頭尾的日期；tag: 可重複或以逗號分隔，須全部符合；mood_min / mood_max / focus_min / focus_max；
+    fields: 逗號分隔的欄位 (預設與匯出分片相同)；order: desc (預設) / asc；limit / offset: 分頁。
+    """
+    query = {}
+    for name in ('from', 'to'):
+        value = _last(params, name)
+        query[name] = _date(value, name).isoformat() if value else None
+    if query['from'] and query['to'] and query['from'] > query['to']:
+        raise ValueError("from must not be after to")
+
+    query['tags'] = sorted({t.strip().lstrip('#') for v in params.get('tag', []) for t in v.split(',') if t.strip().lstrip('#')})
+    for name, _, _ in _THRESHOLDS:
+        value = _last(params, name)
+        try:
+            query[name] = float(value) if value else None
+        except ValueError:
+            raise ValueError(f"{name} must be a number, got {value!r}")
+
+    fields = [f.strip() for f in _last(params, 'fields').split(',') if f.strip()] or json_export.EXPORT_COLUMNS
+    fields = ['entry_tags' if f == 'tags' else f for f in fields]
+    unknown = [f for f in fields if f not in archive_schema.COLUMNS]
+    if unknown:
+        raise ValueError(f"Unknown field(s): {', '.join(unknown)}")
+    # uuid / date 一律回傳 (分頁組裝與前端都依賴這兩欄)，欄位順序固定以共用快取
+    wanted = set(fields) | {'uuid', 'date'}
+    query['fields'] = [c for c in archive_schema.COLUMNS if c in wanted]
+
+    query['order'] = _last(params, 'order').lower() or 'desc'
+    if query['order'] not in ('asc', 'desc'):
+        raise ValueError("order must be asc or desc")
+    query['limit'] = _int(params, 'limit', DEFAULT_LIMIT, 1, MAX_LIMIT)
+    query['offset'] = _int(params, 'offset', 0, 0, 1 << 31)
+    return query
+
+
+def parse_state_query(params):
+    return {'window': _int(params, 'window', STATE_WINDOW, 1, MAX_LIMIT)}
+
+
+def _predicate(query):
+    """日期與 mood / focus 門檻 -> Arrow 表達式，交給 Parquet 讀取端做 row group 剪枝與逐列過濾；沒有條件時為 None"""
+    terms = []
+    if query['from']:
+        start = datetime.datetime.fromisoformat(query['from'])
+        terms.append(pc.field('date') >= pa.scalar(start, pa.timestamp('ms')))
+    if query['to']:
+        end = datetime.datetime.fromisoformat(query['to']) + datetime.timedelta(days=1)
+        terms.append(pc.field('date') < pa.scalar(end, pa.timestamp('ms')))
+    for name, column, op in _THRESHOLDS:
+        if query[name] is not None:
+            value = pa.scalar(query[name], pa.float32())
+            terms.append(pc.field(column) >= value if op == '>=' else pc.field(column) <= value)
+    return functools.reduce(lambda a, b: a & b, terms) if terms else None
+
+
+def _months(query, manifest):
+    """依日期範圍挑出需要讀取的月份 (段以月份分區，範圍外的段完全不開檔)"""
+    if not query['from'] and not query['to']:
+        return None
+    low = query['from'][:7] if query['from'] else ''
+    high = query['to'][:7] if query['to'] else '9999-99'
+    return [m for m in archive_store.list_months(manifest) if low <= m <= high]
+
+
+# --- 段讀取 ---
+
+def _last_positions(keys):
+    """每個 uuid 最後一次出現的位置 (null 視為同一鍵，與 dedup_entries 相同)"""
+    last = {k: i for i, k in enumerate(keys)}
+    return sorted(last.values())
+
+
+def _segment_rows(seg, columns, predicate=None, mixed=False):
+    """
+    讀取一個段中符合條件的列。固定 schema 的段把欄位與條件下推到 Parquet 讀取；
+    舊版自由格式段或段內有重複 uuid 的段 (mixed) 須先整段去重再過濾，否則可能留下被覆寫的舊版本。
+    """
+    path = os.path.join(archive_store.ARCHIVE_DIR, seg["path"])
+    legacy = seg.get("schema") != archive_schema.SCHEMA_VERSION
+    if not legacy and not mixed:
+        return pq.read_table(path, columns=columns, filters=predicate)
+
+    table = archive_schema.to_table(archive_store._read_legacy_segment(path)) if legacy else pq.read_table(path)
+    table = table.take(pa.array(_last_positions(table.column('uuid').to_pylist()), pa.int64()))
+    if predicate is not None:
+        table = table.filter(predicate)
+    return table.select(columns)
+
+
+def _tag_mask(column, tags):
+    """list<dictionary> 標籤欄：每列是否包含全部 tags (在 Arrow 端比對，不轉成 Python 清單)"""
+    lists = column.cast(pa.list_(pa.string())).combine_chunks()
+    flat = pc.list_flatten(lists)
+    parents = pc.list_parent_indices(lists).to_numpy()
+    mask = np.ones(len(lists), dtype=bool)
+    for tag in tags:
+        hit = np.zeros(len(lists), dtype=bool)
+        hit[parents[pc.fill_null(pc.equal(flat, tag), False).to_numpy(zero_copy_only=False)]] = True
+        mask &= hit
+    return mask
+
+
+def build_owner_index(manifest):
+    """
+    每個 uuid 最終版本所在的段 (seq)，對應 dedup_entries「後寫入者勝」的規則 (uuid 可能被改寫到其他月份)。
+    只讀 uuid 一欄；同時回傳段內有重複 uuid 的段。
+    """
+    owner, mixed = {}, set()
+    for seg in archive_store.list_segments(manifest):
+        if seg.get("schema") == archive_schema.SCHEMA_VERSION:
+            path = os.path.join(archive_store.ARCHIVE_DIR, seg["path"])
+            keys = pq.read_table(path, columns=['uuid']).column('uuid').to_pylist()
+        else:
+            keys = _segment_rows(seg, ['uuid']).column('uuid').to_pylist()
+            mixed.add(seg["seq"])
+        if len(set(keys)) < len(keys):
+            mixed.add(seg["seq"])
+        owner.update(dict.fromkeys(keys, seg["seq"]))
+    return owner, mixed
+
+
+def match_entries(query, manifest, index):
+    """
+    第一階段：只讀 uuid / date (有標籤條件時加上 entry_tags)，得到符合條件的最終版本紀錄，
+    依日期排序 (同日以 uuid 排序，分頁穩定)。回傳 DataFrame[uuid, date, seq]。
+    """
+    owner, mixed = index
+    predicate = _predicate(query)
+    columns = ['uuid', 'date'] + (['entry_tags'] if query['tags'] else [])
+    frames = []
+    for seg in archive_store.list_segments(manifest, _months(query, manifest)):
+        table = _segment_rows(seg, columns, predicate, seg["seq"] in mixed)
+        if query['tags'] and table.num_rows:
+            table = table.filter(pa.array(_tag_mask(table.column('entry_tags'), query['tags'])))
+        keys = table.column('uuid').to_pylist()
+        live = np.fromiter((owner.get(k) == seg["seq"] for k in keys), dtype=bool, count=len(keys))
+        if live.any():
+            table = table.filter(pa.array(live))
+            frames.append(pd.DataFrame({'uuid': pd.Series(table.column('uuid').to_pylist(), dtype=object),
+                                        'date': pd.to_datetime(table.column('date').to_pandas()),
+                                        'seq': seg["seq"]}))
+    if not frames:
+        return pd.DataFrame({'uuid': pd.Series([], dtype=object), 'date': pd.Series([], dtype='datetime64[ms]'), 'seq': []})
+    matches = pd.concat(frames, ignore_index=True)
+    ascending = query['order'] == 'asc'
+    return matches.sort_values(['date', 'uuid'], ascending=ascending, na_position='last', kind='mergesort').reset_index(drop=True)
+
+
+def read_page(matches, query, manifest, index):
+    """第二階段：只對這一頁的紀錄、只讀 fields 指定的欄位 (uuid 條件下推)，依第一階段的順序組裝"""
+    page = matches.iloc[query['offset']:query['offset'] + query['limit']]
+    if page.empty:
+        return page.iloc[:0][['uuid', 'date']]
+    _, mixed = index
+    segments = {seg["seq"]: seg for seg in manifest["segments"]}
+    frames = []
+    for seq, group in page.groupby('seq', sort=False):
+        keys = [k for k in group['uuid'] if k is not None]
+        predicate = pc.field('uuid').isin(keys)
+        if len(keys) < len(group):
+            predicate = predicate | pc.field('uuid').is_null()
+        table = _segment_rows(segments[seq], query['fields'], predicate, seq in mixed)
+        frames.append(archive_schema.table_to_frame(table))
+    rows = pd.concat(frames, ignore_index=True)
+    rows['date'] = pd.to_datetime(rows['date'])
+    position = {k: i for i, k in enumerate(page['uuid'])}
+    rows['_pos'] = [position[None if pd.isna(k) else k] for k in rows['uuid']]
+    return rows.sort_values('_pos', kind='mergesort').drop(columns=['_pos']).reset_index(drop=True)
+
+
+# --- 快取與服務核心 ---
+
+class _LRU:
+    def __init__(self, size):
+        self.size = size
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            if key not in self.items:
+                return None
+            self.items.move_to_end(key)
+            return self.items[key]
+
+    def put(self, key, value):
+        with self.lock:
+            self.items[key] = value
+            self.items.move_to_end(key)
+            while len(self.items) > self.size:
+                self.items.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.items.clear()
+
+
+def _json(obj):
+    return json.dumps(obj, ensure_ascii=False, default=str).encode('utf-8')
+
+
+class ArchiveQuery:
+    """
+    唯讀查詢服務的核心。每次請求先 stat Manifest，內容改變時重新載入並清空快取 (段檔案不可變，
+    Manifest 就是歸檔的版本)。回應以 (Manifest 版本, 路徑, 正規化查詢) 為鍵快取；
+    ETag 也由這三者推得，客戶端帶 If-None-Match 時不必計算回應即可回覆 304。
+    """
+
+    def __init__(self, cache_entries=CACHE_ENTRIES):
+        self._lock = threading.Lock()
+        self._stamp = None
+        self.manifest = None
+        self.version = None
+        self._index = None
+        self._responses = _LRU(cache_entries)
+        self._matches = _LRU(cache_entries)
+        self.stats = {"hits": 0, "misses": 0, "not_modified": 0, "reloads": 0}
+        self.routes = {
+            "/entries": (parse_entries_query, self._entries),
+            "/state": (parse_state_query, self._state),
+        }
+
+    def refresh(self, force=False):
+        """回傳 (manifest, version)；Manifest 檔案的 mtime / 大小 / inode 改變時重新載入"""
+        try:
+            st = os.stat(archive_store.MANIFEST_PATH)
+            stamp = (st.st_mtime_ns, st.st_size, st.st_ino)
+        except FileNotFoundError:
+            stamp = None
+        with self._lock:
+            if self.manifest is not None and stamp == self._stamp and not force:
+                return self.manifest, self.version
+            try:
+                with open(archive_store.MANIFEST_PATH, 'rb') as f:
+                    raw = f.read()
+                manifest = json.loads(raw)
+            except FileNotFoundError:
+                raw, manifest = b"", archive_store.load_manifest()
+            self._stamp, self.manifest = stamp, manifest
+            self.version = hashlib.sha256(raw).hexdigest()[:16]
+            self._index = None
+            self._responses.clear()
+            self._matches.clear()
+            self.stats["reloads"] += 1
+            return self.manifest, self.version
+
+    def _owner_index(self, manifest, version):
+        index = self._index
+        if index is None or index[0] != version:
+            index = (version, build_owner_index(manifest))
+            self._index = index
+        return index[1]
+
+    def _entries(self, query, manifest, version):
+        index = self._owner_index(manifest, version)
+        filters = {k: v for k, v in query.items() if k not in ('fields', 'limit', 'offset')}
+        key = (version, json.dumps(filters, sort_keys=True))
+        matches = self._matches.get(key)
+        if matches is None:
+            matches = match_entries(query, manifest, index)
+            self._matches.put(key, matches)
+
+        page = read_page(matches, query, manifest, index)
+        total, end = len(matches), query['offset'] + query['limit']
+        return _json({
+            "total": total,
+            "offset": query['offset'],
+            "limit": query['limit'],
+            "next_offset": end if end < total else None,
+            "entries": json.loads(json_export.to_records(page)) if not page.empty else [],
+        })
+
+    def _state(self, query, manifest, version):
+        df = archive_store.read_recent(query['window'], manifest, columns=STATE_COLUMNS)
+        return _json(generate_system_state(df, window=query['window']))
+
+    def health(self):
+        manifest, version = self.refresh()
+        return _json({
+            "status": "ok",
+            "version": version,
+            "segments": len(manifest["segments"]),
+            "rows": sum(seg["rows"] for seg in manifest["segments"]),
+            "months": archive_store.list_months(manifest),
+            "cache": dict(self.stats),
+        })
+
+    def respond(self, path, params, etags=()):
+        """(路徑, parse_qs 參數, If-None-Match 的 ETag 清單) -> (HTTP 狀態碼, ETag 或 None, 回應本體)"""
+        if path == "/health":
+            return 200, None, self.health()
+        if path not in self.routes:
+            return 404, None, _json({"error": f"Unknown endpoint {path}", "endpoints": ["/entries", "/state", "/health"]})
+        parse, handler = self.routes[path]
+        try:
+            query = parse(params)
+        except ValueError as e:
+            return 400, None, _json({"error": str(e)})
+        canonical = json.dumps(query, sort_keys=True)
+
+        for attempt in (0, 1):
+            manifest, version = self.refresh(force=attempt > 0)
+            etag = '"' + hashlib.sha1(f"{version}|{path}|{canonical}".encode('utf-8')).hexdigest()[:20] + '"'
+            if etag in etags or "*" in etags:
+                self.stats["not_modified"] += 1
+                return 304, etag, b""
+            key = (version, path, canonical)
+            body = self._responses.get(key)
+            if body is not None:
+                self.stats["hits"] += 1
+                return 200, etag, body
+            try:
+                body = handler(query, manifest, version)
+            except FileNotFoundError:
+                # 讀取途中段被合併刪除：Manifest 已換版，重新載入後再試一次
+                if attempt:
+                    raise
+                continue
+            self.stats["misses"] += 1
+            self._responses.put(key, body)
+            return 200, etag, body
@@ -0,0 +1,161 @@
+import json
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from src.utils.analytics import FLAT_COLUMNS, flatten_analysis, safe_get_dict
+
+# 段檔案的版本化固定 schema：ai_analysis 攤平成型別化欄位，文字只存一份 (content)，
+# 標籤與 life_data 狀態以字典編碼保存。embedding 不在段中 (固定寬度的 float32 矩陣見 embedding_store)。
+SCHEMA_VERSION = 1
+
+_TAGS = pa.list_(pa.dictionary(pa.int32(), pa.string()))
+_TEXT_LIST = pa.list_(pa.string())
+_STATE = pa.dictionary(pa.int8(), pa.string())
+
+ARCHIVE_SCHEMA = pa.schema([
+    ('uuid', pa.string()),
+    ('date', pa.timestamp('ms')),
+    ('content', pa.string()),
+    ('mood', pa.float32()),
+    ('focus', pa.float32()),
+    ('summary', pa.string()),
+    # 以下與 analytics.FLAT_COLUMNS 同名，讀取後不必再攤平
+    ('entry_tags', _TAGS),
+    ('has_signal', pa.bool_()),
+    ('has_blind_spot', pa.bool_()),
+    ('has_open_node', pa.bool_()),
+    ('signal_text', pa.string()),
+    ('open_node_text', pa.string()),
+    ('life_energy', _STATE),
+    ('life_safety', _STATE),
+    # project_data 原始清單
+    ('signals', _TEXT_LIST),
+    ('blind_spots', _TEXT_LIST),
+    ('open_nodes', _TEXT_LIST),
+    # 未攤平的 ai_analysis 欄位 (例如 action_items) 與其他 frontmatter 欄位，以 JSON 保存
+    ('analysis_extra', pa.string()),
+    ('extra', pa.string()),
+], metadata={b"lifeos_schema": str(SCHEMA_VERSION).encode()})
+
+COLUMNS = ARCHIVE_SCHEMA.names
+
+# 舊版自由格式中已被 schema 吸收的欄位 (其餘 frontmatter 鍵放進 extra)
+_ABSORBED = {'uuid', 'date', 'content', 'note', 'mood', 'focus', 'tags', 'ai_analysis', 'embedding'} | set(COLUMNS)
+_PROJECT_LISTS = ('signals', 'blind_spots', 'open_nodes')
+_LIFE_FIELDS = ('energy_stability', 'baseline_safety')
+
+
+def _plain(obj):
+    """Parquet 讀回的 ndarray / numpy 純量 -> JSON 可序列化的 Python 物件"""
+    if isinstance(obj, dict):
+        return {k: _plain(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple, np.ndarray)):
+        return [_plain(v) for v in obj]
+    if isinstance(obj, np.generic):
+        return obj.item()
+    return obj
+
+
+def _to_json(obj):
+    return json.dumps(obj, ensure_ascii=False, default=str) if obj else None
+
+
+def _text_list(value):
+    value = _plain(value)
+    if isinstance(value, list):
+        return [str(v) for v in value]
+    if value is None or value == '' or (isinstance(value, float) and np.isnan(value)):
+        return []
+    return [str(value)]
+
+
+def _metric(df, analyses, name):
+    """紀錄本身的數值 (frontmatter) 優先，否則取 ai_analysis 中的值"""
+    values = pd.to_numeric(df[name], errors='coerce') if name in df.columns else pd.Series(np.nan, index=df.index)
+    fallback = pd.to_numeric(pd.Series([a.get(name) for a in analyses], index=df.index, dtype=object), errors='coerce')
+    return values.fillna(fallback).astype('float32')
+
+
+def _analysis_extra(analysis):
+    rest = {k: v for k, v in analysis.items() if k not in ('tags', 'mood', 'focus', 'summary', 'project_data', 'life_data')}
+    project = {k: v for k, v in safe_get_dict(analysis.get('project_data')).items() if k not in _PROJECT_LISTS}
+    life = {k: v for k, v in safe_get_dict(analysis.get('life_data')).items() if k not in _LIFE_FIELDS}
+    if project:
+        rest['project_data'] = project
+    if life:
+        rest['life_data'] = life
+    return _to_json(_plain(rest))
+
+
+def _is_missing(value):
+    return value is None or (isinstance(value, float) and np.isnan(value))
+
+
+def to_archive_frame(df):
+    """
+    任意 frontmatter 欄位 + 巢狀 ai_analysis 的 DataFrame -> 符合 ARCHIVE_SCHEMA 的 DataFrame。
+    已是新 schema 的 DataFrame 原樣返回 (只補齊欄位順序)。
+    """
+    if set(COLUMNS).issubset(df.columns):
+        return df[COLUMNS].reset_index(drop=True)
+
+    n = len(df)
+    index = df.index
+    analyses = [safe_get_dict(_plain(a)) for a in (df['ai_analysis'].values if 'ai_analysis' in df.columns else [None] * n)]
+    flat = flatten_analysis(df)
+
+    contents = df['content'] if 'content' in df.columns else pd.Series([None] * n, index=index)
+    notes = df['note'] if 'note' in df.columns else pd.Series([None] * n, index=index)
+    content = [c if isinstance(c, str) else (nt if isinstance(nt, str) else None) for c, nt in zip(contents.values, notes.values)]
+
+    other = [c for c in df.columns if c not in _ABSORBED]
+    extra = []
+    for i in range(n):
+        row = {c: _plain(df[c].values[i]) for c in other}
+        extra.append(_to_json({k: v for k, v in row.items() if not _is_missing(v)}))
+
+    uuids = df['uuid'] if 'uuid' in df.columns else pd.Series([None] * n, index=index)
+    dates = pd.to_datetime(df['date'], errors='coerce') if 'date' in df.columns else pd.Series(pd.NaT, index=index)
+    project = [safe_get_dict(a.get('project_data')) for a in analyses]
+    out = pd.DataFrame({
+        'uuid': [str(u) if not _is_missing(u) else None for u in uuids.values],
+        'date': dates.values,
+        'content': content,
+        'mood': _metric(df, analyses, 'mood').values,
+        'focus': _metric(df, analyses, 'focus').values,
+        'summary': [a.get('summary') if isinstance(a.get('summary'), str) else None for a in analyses],
+        'analysis_extra': [_analysis_extra(a) for a in analyses],
+        'extra': extra,
+    })
+    for col in FLAT_COLUMNS:
+        out[col] = flat[col].values
+    for col in _PROJECT_LISTS:
+        out[col] = pd.Series([_text_list(p.get(col)) for p in project], dtype=object)
+    return out[COLUMNS]
+
+
+def to_table(df):
+    """DataFrame -> 固定 schema 的 Arrow Table (不符合 schema 的 DataFrame 先轉換)"""
+    return pa.Table.from_pandas(to_archive_frame(df), schema=ARCHIVE_SCHEMA, preserve_index=False)
+
+
+def table_to_frame(table):
+    """在 Arrow 端一次解碼字典編碼欄位再轉成 DataFrame (不產生 category 欄位，與 Inbox 來源的資料行為一致)"""
+    for i, field in enumerate(table.schema):
+        if pa.types.is_dictionary(field.type):
+            table = table.set_column(i, field.name, table.column(i).cast(field.type.value_type))
+        elif pa.types.is_list(field.type) and pa.types.is_dictionary(field.type.value_type):
+            table = table.set_column(i, field.name, table.column(i).cast(pa.list_(field.type.value_type.value_type)))
+    return table.to_pandas()
+
+
+def expand_extra(df):
+    """把 extra 中的 frontmatter 欄位還原成獨立欄位 (前端匯出用)"""
+    if 'extra' not in df.columns:
+        return df
+    parsed = [json.loads(x) if isinstance(x, str) else {} for x in df['extra'].values]
+    keys = sorted({k for row in parsed for k in row if k not in df.columns})
+    df = df.drop(columns=['extra'])
+    for key in keys:
+        df[key] = [row.get(key) for row in parsed]
+    return df
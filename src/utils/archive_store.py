@@ -0,0 +1,334 @@
+import os
+import json
+import uuid
+import datetime
+from contextlib import contextmanager
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from src.utils import embedding_store
+from src.utils import archive_schema
+from src.utils.file_lock import file_lock
+
+# 定義路徑
+ARCHIVE_DIR = "data/archive"
+SEGMENTS_DIR = os.path.join(ARCHIVE_DIR, "segments")
+MANIFEST_PATH = os.path.join(ARCHIVE_DIR, "manifest.json")
+LEGACY_PARQUET_PATH = os.path.join(ARCHIVE_DIR, "journal.parquet")
+
+MANIFEST_VERSION = 3
+
+# 合併策略：同一個月份的小段 (rows < SMALL_SEGMENT_ROWS) 累積超過 MERGE_TRIGGER 個就合併成一段
+SMALL_SEGMENT_ROWS = 500
+MERGE_TRIGGER = 8
+
+
+def _empty_manifest():
+    return {"version": MANIFEST_VERSION, "next_seq": 1, "segments": [], "embeddings_externalized": True,
+            "schema": archive_schema.SCHEMA_VERSION}
+
+
+def load_manifest():
+    """讀取 Manifest，不存在時回傳空的 Manifest"""
+    if not os.path.exists(MANIFEST_PATH):
+        return _empty_manifest()
+    with open(MANIFEST_PATH, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_manifest(manifest):
+    """原子寫入 Manifest (先寫暫存檔再 rename)，避免中斷時留下半個檔案"""
+    os.makedirs(os.path.dirname(MANIFEST_PATH), exist_ok=True)
+    tmp_path = f"{MANIFEST_PATH}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, MANIFEST_PATH)
+
+
+@contextmanager
+def locked_manifest(manifest=None):
+    """
+    持有 archive 鎖並取得磁碟上最新的 Manifest (傳入的 manifest 會就地更新，呼叫端之後讀到的也是新版本)。
+    所有改寫 Manifest 的操作都在鎖內「重新載入 -> 修改 -> 原子寫回」，平行的 worker 不會互相覆蓋段或重複配發 seq。
+    """
+    with file_lock("archive"):
+        fresh = load_manifest()
+        if manifest is None:
+            manifest = fresh
+        elif fresh != manifest:
+            manifest.clear()
+            manifest.update(fresh)
+        yield manifest
+
+
+def _month_keys(dates):
+    """將日期欄位轉成 'YYYY-MM' 分區鍵，無法解析的日期歸到 '1970-01'"""
+    return pd.to_datetime(dates, errors='coerce').dt.strftime('%Y-%m').fillna('1970-01')
+
+
+def dedup_entries(df):
+    """與舊版 compaction 相同的去重規則：以 uuid (或 date) 保留最後一筆，並依日期排序"""
+    if df.empty:
+        return df
+    if 'uuid' in df.columns:
+        df = df.drop_duplicates(subset=['uuid'], keep='last')
+    else:
+        df = df.drop_duplicates(subset=['date'], keep='last')
+    return df.sort_values(by='date')
+
+
+def _write_segment(manifest, month, df):
+    """寫入一個不可變的段檔案並登記到 Manifest (呼叫端負責 save_manifest)"""
+    seq = manifest["next_seq"]
+    manifest["next_seq"] = seq + 1
+
+    year, mon = month.split('-')
+    seg_id = f"seg-{seq:06d}-{uuid.uuid4().hex[:6]}"
+    rel_path = os.path.join("segments", year, mon, f"{seg_id}.parquet")
+    abs_path = os.path.join(ARCHIVE_DIR, rel_path)
+    os.makedirs(os.path.dirname(abs_path), exist_ok=True)
+
+    pq.write_table(archive_schema.to_table(df), abs_path, compression='snappy')
+
+    segment = {
+        "id": seg_id,
+        "seq": seq,
+        "month": month,
+        "path": rel_path.replace(os.sep, '/'),
+        "schema": archive_schema.SCHEMA_VERSION,
+        "rows": int(len(df)),
+        "bytes": os.path.getsize(abs_path),
+        "created": datetime.datetime.now().isoformat(timespec='seconds'),
+    }
+    manifest["segments"].append(segment)
+    return segment
+
+
+def append_entries(df, manifest=None):
+    """
+    Append-only 寫入：依年月分區，每個月份寫成一個新的小段。
+    不讀取、不改寫任何既有段檔案，成本只與新資料量成正比。
+    """
+    if df.empty:
+        return []
+
+    # 向量一律存入 embedding_store，段檔案不保存 embedding 欄位
+    df, pairs = embedding_store.split_embeddings(df)
+    df = archive_schema.to_archive_frame(df)
+    months = _month_keys(df['date'])
+
+    with locked_manifest(manifest) as manifest:
+        if pairs:
+            embedding_store.append_embeddings(pairs)
+        written = []
+        for month, group in df.groupby(months, sort=True):
+            written.append(_write_segment(manifest, month, group.reset_index(drop=True)))
+        save_manifest(manifest)
+    return written
+
+
+def list_segments(manifest=None, months=None):
+    """依寫入順序 (seq) 列出段，可用 months 過濾"""
+    if manifest is None:
+        manifest = load_manifest()
+    segments = sorted(manifest["segments"], key=lambda s: s["seq"])
+    if months is not None:
+        months = set(months)
+        segments = [s for s in segments if s["month"] in months]
+    return segments
+
+
+def list_months(manifest=None):
+    if manifest is None:
+        manifest = load_manifest()
+    return sorted({s["month"] for s in manifest["segments"]})
+
+
+def _read_legacy_segment(path):
+    """舊版自由格式段：整段讀入後轉成固定 schema"""
+    names = pq.read_schema(path).names
+    return archive_schema.to_archive_frame(pd.read_parquet(path, columns=[c for c in names if c != 'embedding']))
+
+
+def _read_segments(segments, columns=None):
+    """
+    讀取段檔案。固定 schema 的段只讀取 columns 指定的欄位 (projection)，
+    連續的段在 Arrow 端串接後一次轉成 DataFrame；
+    尚未遷移的舊段整段讀入並轉換，讓呼叫端看到的欄位一致。順序與 segments 相同 (去重依賴寫入順序)。
+    """
+    seg_columns = archive_schema.COLUMNS if columns is None else [c for c in columns if c in archive_schema.COLUMNS]
+    frames, tables = [], []
+
+    def flush():
+        if tables:
+            frames.append(archive_schema.table_to_frame(pa.concat_tables(tables)))
+            tables.clear()
+
+    for seg in segments:
+        path = os.path.join(ARCHIVE_DIR, seg["path"])
+        try:
+            if seg.get("schema") == archive_schema.SCHEMA_VERSION:
+                tables.append(pq.read_table(path, columns=seg_columns))
+            else:
+                flush()
+                df = _read_legacy_segment(path)
+                frames.append(df if columns is None else df[[c for c in columns if c in df.columns]])
+        except Exception as e:
+            print(f"⚠️ Could not read segment {seg['path']}: {e}")
+    flush()
+    frames = [f for f in frames if not f.empty]
+    if not frames:
+        return pd.DataFrame()
+    df = pd.concat(frames, ignore_index=True)
+    if 'date' in df.columns:
+        df['date'] = pd.to_datetime(df['date'])
+    return df
+
+
+def read_archive(months=None, columns=None, manifest=None):
+    """讀取歸檔 (可只讀指定月份)，並套用與舊版相同的去重與排序"""
+    segments = list_segments(manifest, months)
+    return dedup_entries(_read_segments(segments, columns))
+
+
+def read_recent(min_rows, manifest=None, columns=None):
+    """由最新月份往回讀，直到至少取得 min_rows 筆資料 (供 System State 使用)"""
+    if manifest is None:
+        manifest = load_manifest()
+    rows_by_month = {}
+    for seg in manifest["segments"]:
+        rows_by_month[seg["month"]] = rows_by_month.get(seg["month"], 0) + seg["rows"]
+
+    pending = sorted(rows_by_month, reverse=True)
+    selected = []
+    df = pd.DataFrame()
+    while pending:
+        # 先依 Manifest 的筆數估計需要幾個月份，去重後不足再往回補
+        budget = 0
+        while pending and budget < min_rows:
+            month = pending.pop(0)
+            selected.append(month)
+            budget += rows_by_month[month]
+        df = read_archive(months=selected, columns=columns, manifest=manifest)
+        if len(df) >= min_rows:
+            break
+    return df
+
+
+def merge_small_segments(manifest=None, trigger=MERGE_TRIGGER, force=False):
+    """
+    定期合併：把同一月份的小段折疊成一段。
+    合併後的段承接被合併段中最大的 seq 位置，確保去重時「後寫入者勝」的語意不變。
+    """
+    with locked_manifest(manifest) as manifest:
+        # 只合併「最後一個大段之後」的小段，合併結果才不會越過其他段而改變覆寫順序
+        last_large = {}
+        for seg in manifest["segments"]:
+            if seg["rows"] >= SMALL_SEGMENT_ROWS:
+                last_large[seg["month"]] = max(last_large.get(seg["month"], 0), seg["seq"])
+
+        by_month = {}
+        for seg in manifest["segments"]:
+            if seg["rows"] < SMALL_SEGMENT_ROWS and seg["seq"] > last_large.get(seg["month"], 0):
+                by_month.setdefault(seg["month"], []).append(seg)
+
+        merged_months = []
+        for month, small in sorted(by_month.items()):
+            if len(small) < 2 or (len(small) < trigger and not force):
+                continue
+
+            small = sorted(small, key=lambda s: s["seq"])
+            max_seq = small[-1]["seq"]
+            df = dedup_entries(_read_segments(small))
+
+            old_ids = {s["id"] for s in small}
+            manifest["segments"] = [s for s in manifest["segments"] if s["id"] not in old_ids]
+            if not df.empty:
+                segment = _write_segment(manifest, month, df.reset_index(drop=True))
+                segment["seq"] = max_seq
+            save_manifest(manifest)
+
+            for seg in small:
+                path = os.path.join(ARCHIVE_DIR, seg["path"])
+                if os.path.exists(path):
+                    os.remove(path)
+            merged_months.append(month)
+            print(f"🧩 Merged {len(small)} segments for {month} ({len(df)} rows)")
+
+        return merged_months
+
+
+def migrate_legacy_parquet(manifest=None):
+    """一次性遷移：將舊的單一 journal.parquet 轉成分區段檔"""
+    if not os.path.exists(LEGACY_PARQUET_PATH):
+        return False
+    if manifest is None:
+        manifest = load_manifest()
+    if manifest["segments"]:
+        return False
+
+    try:
+        df_legacy = pd.read_parquet(LEGACY_PARQUET_PATH)
+    except Exception as e:
+        print(f"Warning: Could not read legacy parquet, skipping migration. {e}")
+        return False
+
+    append_entries(df_legacy, manifest)
+    os.remove(LEGACY_PARQUET_PATH)
+    print(f"📦 Migrated {len(df_legacy)} rows from {LEGACY_PARQUET_PATH} into segments.")
+    return True
+
+
+def externalize_segment_embeddings(manifest=None):
+    """一次性遷移：把舊段檔案中的 embedding 欄位搬進 embedding_store 並改寫該段"""
+    if manifest is None:
+        manifest = load_manifest()
+    if manifest.get("embeddings_externalized"):
+        return 0
+
+    moved = 0
+    for seg in list_segments(manifest):
+        path = os.path.join(ARCHIVE_DIR, seg["path"])
+        if 'embedding' not in pq.read_schema(path).names:
+            continue
+        df = pd.read_parquet(path)
+        df, pairs = embedding_store.split_embeddings(df)
+        moved += embedding_store.append_embeddings(pairs)
+        df.to_parquet(path, compression='snappy', index=False)
+        seg["bytes"] = os.path.getsize(path)
+
+    manifest["embeddings_externalized"] = True
+    manifest["version"] = MANIFEST_VERSION
+    save_manifest(manifest)
+    if moved:
+        print(f"📦 Moved {moved} embeddings from segments into {embedding_store.VECTORS_PATH}")
+    return moved
+
+
+def migrate_archive_schema(manifest=None):
+    """一次性遷移：把自由格式的舊段改寫成固定 schema (逐段原子改寫，中斷後可重跑)"""
+    if manifest is None:
+        manifest = load_manifest()
+    if manifest.get("schema") == archive_schema.SCHEMA_VERSION:
+        return 0
+
+    rewritten = 0
+    for seg in list_segments(manifest):
+        if seg.get("schema") == archive_schema.SCHEMA_VERSION:
+            continue
+        path = os.path.join(ARCHIVE_DIR, seg["path"])
+        before = os.path.getsize(path)
+        df = _read_legacy_segment(path)
+        tmp_path = f"{path}.tmp"
+        pq.write_table(archive_schema.to_table(df), tmp_path, compression='snappy')
+        os.replace(tmp_path, path)
+        seg["schema"] = archive_schema.SCHEMA_VERSION
+        seg["bytes"] = os.path.getsize(path)
+        rewritten += 1
+        print(f"🧱 Rewrote {seg['path']} with schema v{archive_schema.SCHEMA_VERSION} ({before} -> {seg['bytes']} bytes)")
+        save_manifest(manifest)
+
+    manifest["schema"] = archive_schema.SCHEMA_VERSION
+    manifest["version"] = MANIFEST_VERSION
+    save_manifest(manifest)
+    return rewritten
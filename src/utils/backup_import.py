@@ -0,0 +1,276 @@
+import os
+import re
+import json
+import uuid
+import hashlib
+import datetime
+import frontmatter
+from src.utils.inbox_reader import INBOX_DIR, filename_date, load_inbox_record
+from src.utils.response_cache import CACHE_DIR
+
+# 定義路徑
+CHECKPOINT_PATH = os.path.join(CACHE_DIR, "import_checkpoint.json")
+
+CHECKPOINT_VERSION = 1
+DEFAULT_BATCH_SIZE = 200
+CHUNK_SIZE = 1 << 16
+
+# 穩定 uuid 的命名空間：同一篇日記重複匯入時得到相同 uuid，歸檔去重時後者覆蓋前者
+UUID_NAMESPACE = uuid.uuid5(uuid.NAMESPACE_URL, "lifeos/backfill")
+
+# 儀表板以 1970-01-01_<index> 代替缺少的日期，這類紀錄不匯入
+_DATE_RE = re.compile(r"^\d{4}-\d{2}-\d{2}(?:$|[T ])")
+_WS = " \t\r\n"
+# 數字可能延續的字元：值結束在緩衝中這些字元之前時，數字可能被分塊切斷
+_NUMBER_CHARS = frozenset("0123456789+-.eE")
+
+
+def stable_uuid(key):
+    return uuid.uuid5(UUID_NAMESPACE, key).hex[:12]
+
+
+# --- 串流讀取 JSON ---
+
+class _JSONStream:
+    """在分塊讀入的文字緩衝上逐一解碼 JSON 值 (raw_decode)，不把整份檔案載入記憶體"""
+
+    def __init__(self, f, chunk_size=CHUNK_SIZE):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self, size):
+        chunk = self.f.read(size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """略過空白並回傳下一個字元 (檔尾為空字串)"""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in _WS:
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill(self.chunk_size):
+                return ""
+
+    def expect(self, chars):
+        ch = self.peek()
+        if not ch or ch not in chars:
+            raise ValueError(f"Expected one of {chars!r} in backup bundle, got {ch or 'EOF'!r}")
+        self.pos += 1
+        return ch
+
+    def value(self):
+        """解碼下一個值；值剛好結束在緩衝尾端時可能被截斷 (例如數字)，需再讀一塊確認"""
+        self.peek()
+        size = self.chunk_size
+        while True:
+            try:
+                obj, end = self.decoder.raw_decode(self.buf, self.pos)
+                truncated = (isinstance(obj, (int, float)) and not isinstance(obj, bool)
+                             and all(ch in _NUMBER_CHARS for ch in self.buf[end:]))
+                if self.eof or (end < len(self.buf) and not truncated):
+                    self.pos = end
+                    return obj
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            # 大型值反覆重試時加倍讀取量，避免重複解碼造成平方成本
+            self._fill(size)
+            size *= 2
+
+
+def iter_bundle_logs(path, key="logs", chunk_size=CHUNK_SIZE):
+    """逐筆產生 life_os_backup_*.json 中 logs 陣列的元素 (其他頂層欄位略過)"""
+    with open(path, 'r', encoding='utf-8-sig') as f:
+        stream = _JSONStream(f, chunk_size)
+        stream.expect('{')
+        if stream.peek() == '}':
+            return
+        while True:
+            name = stream.value()
+            stream.expect(':')
+            if name != key:
+                stream.value()
+            else:
+                stream.expect('[')
+                if stream.peek() == ']':
+                    return
+                while True:
+                    yield stream.value()
+                    if stream.expect(',]') == ']':
+                        return
+            if stream.expect(',}') == '}':
+                return
+
+
+# --- 來源 -> Inbox 紀錄 ---
+
+def _tags(value):
+    if isinstance(value, list):
+        items = value
+    else:
+        items = re.split(r"[\s,，]+", str(value or ""))
+    return [str(t).strip().lstrip('#') for t in items if str(t).strip().lstrip('#')]
+
+
+def _number(value):
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    return int(number) if number.is_integer() else number
+
+
+def content_hash(text):
+    """正規化換行與首尾空白後的內容雜湊"""
+    normalized = str(text or '').replace('\r\n', '\n').strip()
+    return hashlib.sha1(normalized.encode('utf-8')).hexdigest()[:16]
+
+
+def load_archive_keys(manifest=None):
+    """
+    已歸檔紀錄的 {(日期, 內容雜湊): uuid}。
+    儀表板 logs 不帶 uuid；同一篇日記重新匯入時以此對回原本的 uuid，歸檔去重後不會多出一筆。
+    """
+    from src.utils import archive_store
+    df = archive_store.read_archive(columns=['uuid', 'date', 'content'], manifest=manifest)
+    if df.empty or 'uuid' not in df.columns:
+        return {}
+    dates = df['date'].dt.strftime('%Y-%m-%d')
+    contents = df['content'] if 'content' in df.columns else [''] * len(df)
+    keys = {}
+    for uuid_str, date, content in zip(df['uuid'], dates, contents):
+        if isinstance(uuid_str, str) and isinstance(date, str):
+            keys[(date, content_hash(content if isinstance(content, str) else ''))] = uuid_str
+    return keys
+
+
+def log_to_entry(log, archive_keys=None):
+    """
+    儀表板 logs 元素 (sanitizeLogEntry 形狀) -> (metadata, content)；日期無效時回傳 None。
+    uuid 依序取：log 本身的 uuid、archive_keys 中同日期同內容的歸檔紀錄、由日期推得的穩定 uuid
+    (儀表板以日期為鍵，每天一筆；同一天內容改過的備份重新匯入時覆蓋前一次匯入的紀錄)。
+    """
+    if not isinstance(log, dict):
+        return None
+    date = str(log.get('date') or '')
+    if not _DATE_RE.match(date):
+        return None
+    date = date[:10]
+    metrics = log.get('metrics') if isinstance(log.get('metrics'), dict) else {}
+    seeds = log.get('graphSeeds') if isinstance(log.get('graphSeeds'), dict) else {}
+
+    content = log.get('note') if isinstance(log.get('note'), str) else ''
+    uuid_str = log.get('uuid') if isinstance(log.get('uuid'), str) and log.get('uuid') else None
+    if uuid_str is None and archive_keys:
+        uuid_str = archive_keys.get((date, content_hash(content)))
+    metadata = {"uuid": uuid_str or stable_uuid(f"log:{date}"), "date": date, "source": "backup"}
+    for name in ('mood', 'focus', 'energy', 'deepWork'):
+        value = _number(metrics.get(name, log.get(name)))
+        if value is not None:
+            metadata[name] = value
+    tags = _tags(seeds.get('tags') or log.get('tags'))
+    if tags:
+        metadata['tags'] = tags
+    habits = {k: v for k, v in (log.get('habits') or {}).items() if v} if isinstance(log.get('habits'), dict) else {}
+    if habits:
+        metadata['habits'] = habits
+    return metadata, content
+
+
+def markdown_to_entry(md_path, root):
+    """Markdown 日記 -> (metadata, content)；uuid 保留 front matter 中的值，否則由相對路徑推得"""
+    record = load_inbox_record(md_path)
+    if record["error"]:
+        raise record["error"]
+    metadata = dict(record["metadata"])
+    date = metadata.get('date', filename_date(md_path))
+    if isinstance(date, (datetime.date, datetime.datetime)):
+        date = date.isoformat()
+    metadata['date'] = str(date)[:10]
+    rel_path = os.path.relpath(md_path, root).replace(os.sep, '/')
+    metadata['uuid'] = str(metadata.get('uuid') or stable_uuid(f"md:{rel_path}"))
+    metadata.setdefault('source', 'markdown')
+    return metadata, record["content"]
+
+
+def iter_markdown(root):
+    """依相對路徑排序逐一產生 (相對路徑, md 路徑)"""
+    paths = []
+    for dirpath, _, files in os.walk(root):
+        paths.extend(os.path.join(dirpath, name) for name in files if name.endswith('.md'))
+    for md_path in sorted(paths, key=lambda p: os.path.relpath(p, root)):
+        yield os.path.relpath(md_path, root).replace(os.sep, '/'), md_path
+
+
+# --- 寫入與斷點 ---
+
+def write_entries(entries, inbox_dir=INBOX_DIR):
+    """
+    一批 (metadata, content) 寫成 Inbox 的 .md 紀錄 (檔名 YYYY-MM-DD_uuid.md，與 process_inbox 相同)。
+    檔名由 uuid 決定，重寫同一批是冪等的；每個檔案先寫暫存檔再 os.replace。回傳寫入的位元組數。
+    """
+    os.makedirs(inbox_dir, exist_ok=True)
+    written = 0
+    for metadata, content in entries:
+        path = os.path.join(inbox_dir, f"{metadata['date']}_{metadata['uuid']}.md")
+        text = frontmatter.dumps(frontmatter.Post(content or '', **metadata))
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+        written += len(text.encode('utf-8'))
+    return written
+
+
+def fingerprint(path):
+    """
+    備份檔以大小與修改時間辨識；內容改變時從頭匯入 (uuid 穩定，重複寫入無害)。
+    資料夾不以指紋判斷，改為逐檔比對修改時間 (見 source_state)。
+    """
+    if os.path.isdir(path):
+        return {"kind": "markdown"}
+    stat = os.stat(path)
+    return {"kind": "bundle", "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def load_checkpoint(path=CHECKPOINT_PATH):
+    if not os.path.exists(path):
+        return {"version": CHECKPOINT_VERSION, "sources": {}, "pending_compaction": False}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_checkpoint(checkpoint, path=CHECKPOINT_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(checkpoint, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def source_state(checkpoint, path):
+    """
+    取得 (必要時重設) 來源的進度：done 為 bundle 已處理的 logs 數，
+    或 markdown 資料夾 {相對路徑: 已匯入時的 mtime_ns} (每次執行只匯入新增或修改過的檔案)。
+    """
+    key = os.path.abspath(path)
+    current = fingerprint(path)
+    state = checkpoint["sources"].get(key)
+    if state is None or state.get("fingerprint") != current:
+        state = {"fingerprint": current, "done": 0 if current["kind"] == "bundle" else {},
+                 "imported": 0, "skipped": 0, "finished": False}
+        checkpoint["sources"][key] = state
+    elif current["kind"] == "markdown" and not isinstance(state["done"], dict):
+        # 舊版斷點只記錄最後處理的相對路徑：重新比對整個資料夾一次 (uuid 穩定，不會重複)
+        state["done"] = {}
+    return state
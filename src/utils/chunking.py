@@ -0,0 +1,69 @@
+import re
+import math
+from src.utils.outline import parse_outline
+
+# text-embedding-004 單次輸入上限 2048 tokens；中文約一字一 token，保守切在 1500 字
+MAX_CHUNK_CHARS = 1500
+
+
+def split_sections(text):
+    """
+    依 Markdown 標題切段 (outline.parse_outline)，回傳 [(標題路徑, 內文)]；標題路徑如 "2024-01-01 Journal > 1. Project Track"。
+    程式碼區塊中的 # 不視為標題，沒有內文的標題 (例如只有子標題的上層標題) 不產生段落。
+    """
+    return [(" > ".join(s["trail"]), s["body"]) for s in parse_outline(text)["sections"] if s["body"]]
+
+
+def _split_long(content, max_chars):
+    """過長的段落依空行、換行、最後硬切，貪婪合併成不超過 max_chars 的片段"""
+    pieces = []
+    for para in re.split(r"\n\s*\n", content):
+        if len(para) <= max_chars:
+            pieces.append(para)
+            continue
+        for line in para.split("\n"):
+            pieces.extend(line[i:i + max_chars] for i in range(0, max(len(line), 1), max_chars))
+
+    chunks = []
+    current = ""
+    for piece in pieces:
+        joined = f"{current}\n\n{piece}" if current else piece
+        if len(joined) <= max_chars:
+            current = joined
+        else:
+            chunks.append(current)
+            current = piece
+    if current.strip():
+        chunks.append(current)
+    return [c.strip() for c in chunks if c.strip()]
+
+
+def chunk_entry(text, max_chars=MAX_CHUNK_CHARS):
+    """
+    日記 -> [{"heading", "text"}]：每個標題段落一塊 (過長再切)，
+    送去 embedding 的文字前置標題路徑，讓短段落也帶有所屬區塊的語境。
+    """
+    chunks = []
+    for heading, content in split_sections(text):
+        budget = max(1, max_chars - len(heading) - 1) if heading else max_chars
+        for piece in _split_long(content, budget):
+            chunks.append({"heading": heading, "text": f"{heading}\n{piece}" if heading else piece})
+    return chunks
+
+
+def pool(vectors, weights=None):
+    """
+    段落向量 L2 正規化後依權重 (段落長度) 平均，回傳正規化的整篇向量 (list)；沒有段落時回傳 []。
+    純 Python 實作：Intake 工作只安裝 google-generativeai 與 python-frontmatter，沒有 numpy。
+    """
+    if not vectors:
+        return []
+    weights = [1.0] * len(vectors) if weights is None else weights
+    pooled = [0.0] * len(vectors[0])
+    for vector, weight in zip(vectors, weights):
+        norm = math.sqrt(sum(x * x for x in vector)) or 1.0
+        scale = weight / norm
+        for i, x in enumerate(vector):
+            pooled[i] += x * scale
+    norm = math.sqrt(sum(x * x for x in pooled))
+    return [x / norm for x in pooled] if norm else pooled
@@ -0,0 +1,122 @@
+import os
+import time
+import threading
+import concurrent.futures
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from src.utils.rate_limit import TokenBucket, backoff_delay
+
+# 預設值 (可用環境變數調整)：取代舊版固定 sleep(0.5)
+DEFAULT_RATE_PER_SEC = float(os.getenv("WEBHOOK_RATE_PER_SEC", "10"))
+DEFAULT_BURST = int(os.getenv("WEBHOOK_BURST", "10"))
+DEFAULT_CONCURRENCY = int(os.getenv("WEBHOOK_CONCURRENCY", "4"))
+DEFAULT_MAX_RETRIES = 4
+DEFAULT_TIMEOUT = 10
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+class WebhookDelivery:
+    """
+    Webhook 投遞引擎：共用連線池的 Session + Token Bucket 限速 + 有界並行 + 429/5xx 退避重試。
+    """
+
+    def __init__(self, url, rate_per_sec=DEFAULT_RATE_PER_SEC, burst=DEFAULT_BURST,
+                 concurrency=DEFAULT_CONCURRENCY, max_retries=DEFAULT_MAX_RETRIES,
+                 timeout=DEFAULT_TIMEOUT, session=None):
+        self.url = url
+        self.concurrency = max(1, concurrency)
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.limiter = TokenBucket(rate_per_sec, burst)
+        self.session = session or self._build_session()
+        self._lock = threading.Lock()
+
+    def _build_session(self):
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.concurrency, max_retries=0)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+
+    @staticmethod
+    def _retry_after(response):
+        value = response.headers.get("Retry-After") if response is not None else None
+        try:
+            return min(float(value), 60.0) if value else None
+        except ValueError:
+            return None
+
+    def send(self, payload):
+        """投遞單筆，回傳 {ok, status, attempts, error}"""
+        attempt = 0
+        while True:
+            self.limiter.acquire()
+            response = None
+            error = None
+            try:
+                response = self.session.post(self.url, json=payload, timeout=self.timeout)
+                if response.status_code < 400:
+                    return {"ok": True, "status": response.status_code, "attempts": attempt + 1, "error": None}
+                retryable = response.status_code in RETRYABLE_STATUS
+                error = f"HTTP {response.status_code}"
+            except requests.RequestException as e:
+                retryable = True
+                error = f"{type(e).__name__}: {e}"
+
+            if not retryable or attempt >= self.max_retries:
+                return {
+                    "ok": False,
+                    "status": response.status_code if response is not None else None,
+                    "attempts": attempt + 1,
+                    "error": error,
+                }
+            delay = self._retry_after(response)
+            if delay is None:
+                delay = backoff_delay(attempt, base=0.5, cap=30.0)
+            time.sleep(delay)
+            attempt += 1
+
+    def deliver(self, payloads, on_result=None, label=None):
+        """
+        並行投遞多筆 payload，回傳投遞報告。
+        on_result(index, payload, result) 在每筆完成時呼叫 (可用於落地狀態)。
+        """
+        payloads = list(payloads)
+        label = label or (lambda p: p.get("title", ""))
+        started = time.monotonic()
+        results = [None] * len(payloads)
+        done = [0]
+
+        def _run(index):
+            result = self.send(payloads[index])
+            results[index] = result
+            with self._lock:
+                done[0] += 1
+                count = done[0]
+                if result["ok"]:
+                    print(f"📨 Sent ({count}/{len(payloads)}): {label(payloads[index])}")
+                else:
+                    print(f"❌ Send Failed ({count}/{len(payloads)}): {label(payloads[index])} -> {result['error']}")
+                if on_result:
+                    on_result(index, payloads[index], result)
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            list(pool.map(_run, range(len(payloads))))
+
+        sent = sum(1 for r in results if r["ok"])
+        return {
+            "total": len(payloads),
+            "sent": sent,
+            "failed": len(payloads) - sent,
+            "retries": sum(r["attempts"] - 1 for r in results),
+            "seconds": round(time.monotonic() - started, 3),
+            "results": results,
+        }
+
+
+def print_report(report):
+    print(f"📬 Delivery report: {report['sent']}/{report['total']} sent, "
+          f"{report['failed']} failed, {report['retries']} retries, {report['seconds']}s")
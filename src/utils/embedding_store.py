@@ -0,0 +1,263 @@
+import os
+import json
+import numpy as np
+
+# 定義路徑
+EMBEDDING_DIR = "data/archive/embeddings"
+VECTORS_PATH = os.path.join(EMBEDDING_DIR, "vectors.f32")
+INDEX_PATH = os.path.join(EMBEDDING_DIR, "index.json")
+# 選用的 int8 量化副本 (L2 正規化後每列一個 float32 scale)，與 float32 矩陣同列序
+CODES_PATH = os.path.join(EMBEDDING_DIR, "vectors.i8")
+SCALES_PATH = os.path.join(EMBEDDING_DIR, "scales.f32")
+
+# 段落 (chunk) 向量另存一份同格式的矩陣，鍵為 "uuid#序號"
+CHUNK_DIR = os.path.join(EMBEDDING_DIR, "chunks")
+CHUNK_HEADINGS_PATH = os.path.join(CHUNK_DIR, "headings.json")
+
+INDEX_VERSION = 1
+DTYPE = np.float32
+CODE_DTYPE = np.int8
+
+# 啟用後 compaction 建立 int8 副本，語意搜尋改在 codes 上計分
+QUANTIZE = os.getenv("LIFEOS_EMBEDDING_QUANTIZE", "0") == "1"
+QUANT_CHUNK_ROWS = 4096
+
+
+def _empty_index():
+    # quantized: 已量化的列數 (None 表示沒有 int8 副本)
+    return {"version": INDEX_VERSION, "dtype": "float32", "dim": None, "count": 0, "uuids": [], "quantized": None}
+
+
+def _path(root, default):
+    """root 下與預設路徑同名的檔案 (root 為 EMBEDDING_DIR 時即預設路徑)"""
+    return os.path.join(root, os.path.basename(default))
+
+
+def load_index(root=EMBEDDING_DIR):
+    """讀取 uuid -> row 索引 (uuids[i] 即第 i 列)"""
+    path = _path(root, INDEX_PATH)
+    if not os.path.exists(path):
+        return _empty_index()
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_index(index, root=EMBEDDING_DIR):
+    os.makedirs(root, exist_ok=True)
+    path = _path(root, INDEX_PATH)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(index, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def row_lookup(index):
+    return {u: i for i, u in enumerate(index["uuids"])}
+
+
+def open_matrix(index=None, mode='r', root=EMBEDDING_DIR):
+    """
+    以 memmap 零拷貝開啟 (count, dim) 的 float32 矩陣。
+    列數以索引為準，檔尾若有中斷寫入殘留的資料會被忽略。
+    """
+    if index is None:
+        index = load_index(root)
+    path = _path(root, VECTORS_PATH)
+    if not index["count"] or not os.path.exists(path):
+        return np.empty((0, index["dim"] or 0), dtype=DTYPE)
+    return np.memmap(path, dtype=DTYPE, mode=mode, shape=(index["count"], index["dim"]))
+
+
+def get_vector(uuid_str, index=None, root=EMBEDDING_DIR):
+    if index is None:
+        index = load_index(root)
+    row = row_lookup(index).get(uuid_str)
+    if row is None:
+        return None
+    return np.array(open_matrix(index, root=root)[row])
+
+
+def quantize(vectors):
+    """
+    float 向量 -> (int8 codes, float32 scales)。先做 L2 正規化，scale = max|v| / 127，
+    因此 codes · query * scale 即為 cosine 相似度的近似值。
+    """
+    vectors = np.atleast_2d(np.asarray(vectors, dtype=DTYPE))
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    unit = vectors / norms
+    scales = np.abs(unit).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.rint(unit / scales[:, None]).astype(CODE_DTYPE)
+    return codes, scales.astype(DTYPE)
+
+
+def open_quantized(index=None, mode='r', root=EMBEDDING_DIR):
+    """以 memmap 開啟 int8 副本，回傳 (codes (n, dim), scales (n,))；n 以索引記錄的量化列數為準"""
+    if index is None:
+        index = load_index(root)
+    n = index.get("quantized") or 0
+    codes_path = _path(root, CODES_PATH)
+    if not n or not os.path.exists(codes_path):
+        return np.empty((0, index["dim"] or 0), dtype=CODE_DTYPE), np.empty(0, dtype=DTYPE)
+    codes = np.memmap(codes_path, dtype=CODE_DTYPE, mode=mode, shape=(n, index["dim"]))
+    scales = np.memmap(_path(root, SCALES_PATH), dtype=DTYPE, mode=mode, shape=(n,))
+    return codes, scales
+
+
+def build_quantized(index, rows=(), root=EMBEDDING_DIR):
+    """
+    由 float32 矩陣補齊 int8 副本：量化尚未涵蓋的尾端列，以及 rows 指定 (原地覆寫過) 的列。
+    與 append_embeddings 相同，先寫資料再由呼叫端寫索引。
+    """
+    done = index.get("quantized") or 0
+    if index["dim"] is None:
+        index["quantized"] = 0
+        return 0
+    os.makedirs(root, exist_ok=True)
+    matrix = open_matrix(index, root=root)
+    dim = index["dim"]
+
+    rows = sorted(r for r in set(rows) if r < done)
+    if rows:
+        codes, scales = open_quantized(index, mode='r+', root=root)
+        new_codes, new_scales = quantize(matrix[rows])
+        codes[rows] = new_codes
+        scales[rows] = new_scales
+        codes.flush()
+        scales.flush()
+        del codes, scales
+
+    if index["count"] > done:
+        with open(_path(root, CODES_PATH), 'ab') as f_codes, open(_path(root, SCALES_PATH), 'ab') as f_scales:
+            # 截掉上次中斷留下的不完整資料
+            f_codes.truncate(done * dim * np.dtype(CODE_DTYPE).itemsize)
+            f_scales.truncate(done * np.dtype(DTYPE).itemsize)
+            for start in range(done, index["count"], QUANT_CHUNK_ROWS):
+                codes, scales = quantize(matrix[start:start + QUANT_CHUNK_ROWS])
+                f_codes.write(codes.tobytes())
+                f_scales.write(scales.tobytes())
+    del matrix
+
+    index["quantized"] = index["count"]
+    return len(rows) + index["count"] - done
+
+
+def ensure_quantized(root=EMBEDDING_DIR):
+    """QUANTIZE 啟用且尚未建立 int8 副本時，由現有 float32 矩陣一次建立"""
+    index = load_index(root)
+    if not QUANTIZE or index.get("quantized") is not None:
+        return 0
+    index["quantized"] = 0
+    written = build_quantized(index, root=root)
+    save_index(index, root)
+    return written
+
+
+def _to_vector(values):
+    # DataFrame 中缺少向量的列為 NaN 等純量，不視為向量
+    if not isinstance(values, (list, tuple, np.ndarray)):
+        return None
+    try:
+        vec = np.asarray(values, dtype=DTYPE).reshape(-1)
+    except (TypeError, ValueError):
+        return None
+    return vec if vec.size else None
+
+
+def append_embeddings(items, root=EMBEDDING_DIR):
+    """
+    增量寫入 (uuid, vector)。新 uuid 附加在檔尾；已存在的 uuid 原地覆寫該列。
+    先寫資料再寫索引，中斷時索引仍指向完整的列。
+    """
+    index = load_index(root)
+    rows = row_lookup(index)
+
+    updates = {}
+    appends = {}
+    for uuid_str, values in items:
+        vec = _to_vector(values)
+        if vec is None or uuid_str is None or uuid_str != uuid_str:
+            continue
+        if index["dim"] is None:
+            index["dim"] = int(vec.size)
+        if vec.size != index["dim"]:
+            print(f"⚠️ Embedding dim mismatch for {uuid_str}: {vec.size} != {index['dim']}, skipped.")
+            continue
+        uuid_str = str(uuid_str)
+        if uuid_str in rows:
+            updates[rows[uuid_str]] = vec
+        else:
+            appends[uuid_str] = vec  # 同一批內重複時後者勝
+
+    if not updates and not appends:
+        return 0
+
+    os.makedirs(root, exist_ok=True)
+    row_bytes = index["dim"] * np.dtype(DTYPE).itemsize
+
+    if updates:
+        matrix = open_matrix(index, mode='r+', root=root)
+        for row, vec in updates.items():
+            matrix[row] = vec
+        matrix.flush()
+        del matrix
+
+    if appends:
+        with open(_path(root, VECTORS_PATH), 'ab') as f:
+            # 截掉上次中斷留下的不完整資料
+            f.truncate(index["count"] * row_bytes)
+            f.write(np.stack(list(appends.values())).astype(DTYPE, copy=False).tobytes())
+        index["uuids"].extend(appends.keys())
+        index["count"] = len(index["uuids"])
+
+    # 已有 int8 副本時同步更新，避免與 float32 矩陣不一致
+    if index.get("quantized") is not None:
+        build_quantized(index, rows=updates.keys(), root=root)
+
+    save_index(index, root)
+    return len(updates) + len(appends)
+
+
+def split_embeddings(df):
+    """從 DataFrame 取出 embedding 欄位，回傳 (不含向量的 df, [(uuid, vector), ...])"""
+    if 'embedding' not in df.columns:
+        return df, []
+    pairs = []
+    if 'uuid' in df.columns:
+        pairs = list(zip(df['uuid'].tolist(), df['embedding'].tolist()))
+    return df.drop(columns=['embedding']), pairs
+
+
+def load_chunk_headings():
+    """uuid -> 各段落的標題路徑；清單長度即該紀錄目前有效的段落數"""
+    if not os.path.exists(CHUNK_HEADINGS_PATH):
+        return {}
+    with open(CHUNK_HEADINGS_PATH, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def append_chunks(items):
+    """
+    寫入段落向量 [(uuid, [{"heading", "embedding"}, ...])]，鍵為 "uuid#序號"。
+    同一 uuid 重新寫入時以新的段落數為準，多出來的舊列由 headings 清單長度排除。
+    """
+    headings = load_chunk_headings()
+    pairs = []
+    for uuid_str, chunks in items:
+        if uuid_str is None or uuid_str != uuid_str or not isinstance(chunks, list):
+            continue
+        valid = [c for c in chunks if isinstance(c, dict) and _to_vector(c.get('embedding')) is not None]
+        if not valid:
+            continue
+        pairs.extend((f"{uuid_str}#{i}", c['embedding']) for i, c in enumerate(valid))
+        headings[str(uuid_str)] = [c.get('heading') or '' for c in valid]
+    if not pairs:
+        return 0
+
+    written = append_embeddings(pairs, root=CHUNK_DIR)
+    tmp_path = f"{CHUNK_HEADINGS_PATH}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(headings, f, ensure_ascii=False)
+    os.replace(tmp_path, CHUNK_HEADINGS_PATH)
+    return written
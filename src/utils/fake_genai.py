@@ -0,0 +1,82 @@
+import hashlib
+import json
+import random
+import threading
+import time
+
+import numpy as np
+
+
+class FakeQuotaError(Exception):
+    """模擬 Gemini 的 429 RESOURCE_EXHAUSTED"""
+    code = 429
+
+
+class _Response:
+    def __init__(self, text):
+        self.text = text
+
+
+class _Embedding:
+    def __init__(self, values):
+        self.values = values
+
+
+class _EmbedResponse:
+    def __init__(self, embeddings):
+        self.embeddings = embeddings
+
+
+class _FakeModels:
+    def __init__(self, owner):
+        self._owner = owner
+
+    def generate_content(self, model, contents, config=None):
+        self._owner._call('generate')
+        digest = hashlib.sha256(contents.encode('utf-8')).digest()
+        analysis = {
+            "mood": float(1 + digest[0] % 10),
+            "focus": float(1 + digest[1] % 10),
+            "tags": [["lifeos", "trading", "health", "reading", "family"][digest[2] % 5]],
+            "action_items": [],
+            "project_data": {"signals": [], "blind_spots": [], "open_nodes": []},
+            "life_data": {"energy_stability": "Stable", "baseline_safety": "Stable"},
+            "summary": "Fake analysis",
+        }
+        return _Response("```json\n" + json.dumps(analysis) + "\n```")
+
+    def embed_content(self, model, contents, config=None):
+        self._owner._call('embed')
+        texts = contents if isinstance(contents, list) else [contents]
+        return _EmbedResponse([_Embedding(self._owner.vector_for(t)) for t in texts])
+
+
+class FakeGenaiClient:
+    """
+    離線替身：介面與 google.genai.Client 的 models.generate_content / embed_content 相同。
+    latency: 每次呼叫的延遲秒數；quota_error_rate: 拋出 429 的機率 (用來測試退避重試)。
+    """
+
+    def __init__(self, latency=0.0, quota_error_rate=0.0, dim=768, seed=0):
+        self.latency = latency
+        self.quota_error_rate = quota_error_rate
+        self.dim = dim
+        self.models = _FakeModels(self)
+        self.calls = {"generate": 0, "embed": 0, "quota_errors": 0}
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _call(self, kind):
+        with self._lock:
+            self.calls[kind] += 1
+            fail = self._rng.random() < self.quota_error_rate
+            if fail:
+                self.calls["quota_errors"] += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if fail:
+            raise FakeQuotaError("429 RESOURCE_EXHAUSTED (fake)")
+
+    def vector_for(self, text):
+        seed = int.from_bytes(hashlib.sha256(text.encode('utf-8')).digest()[:8], 'little')
+        return np.random.default_rng(seed).standard_normal(self.dim).astype(np.float32).tolist()
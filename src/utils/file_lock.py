@@ -0,0 +1,83 @@
+import os
+import time
+import threading
+from contextlib import contextmanager
+from src.utils.response_cache import CACHE_DIR
+from src.utils import metrics
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# 定義路徑 (鎖檔不進 git；同一台機器上的 worker 共用)
+LOCK_DIR = os.path.join(CACHE_DIR, "locks")
+
+# 等待鎖的上限秒數；逾時丟出 TimeoutError 而不是無限期卡住 CI
+LOCK_TIMEOUT = float(os.getenv("LIFEOS_LOCK_TIMEOUT", "900"))
+POLL_SECONDS = 0.05
+ANNOUNCE_AFTER = 1.0
+
+# 同一行程內可重入：外層已持有時內層直接通過 (例如 compaction 持有 archive 鎖時呼叫 append_entries)
+_held = {}
+_guard = threading.Lock()
+
+
+def _try_lock(f):
+    try:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+        return True
+    except OSError:
+        return False
+
+
+def _unlock(f):
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+    else:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def _entry(name):
+    with _guard:
+        return _held.setdefault(name, {"rlock": threading.RLock(), "depth": 0, "file": None})
+
+
+@contextmanager
+def file_lock(name, timeout=LOCK_TIMEOUT):
+    """
+    跨行程的獨占鎖 (flock)，用來保護「讀取 -> 修改 -> 寫回」的共用檔案。
+    持有者結束或當掉時由作業系統釋放，不會留下過期的鎖；等待時間記在 lock.<name> span。
+    """
+    entry = _entry(name)
+    with entry["rlock"]:
+        if entry["depth"] == 0:
+            os.makedirs(LOCK_DIR, exist_ok=True)
+            f = open(os.path.join(LOCK_DIR, f"{name}.lock"), 'a+b')
+            with metrics.span(f"lock.{name}"):
+                started = time.monotonic()
+                announced = False
+                while not _try_lock(f):
+                    waited = time.monotonic() - started
+                    if waited > timeout:
+                        f.close()
+                        raise TimeoutError(f"Timed out after {timeout:.0f}s waiting for the {name} lock")
+                    if not announced and waited > ANNOUNCE_AFTER:
+                        print(f"⏳ Waiting for the {name} lock (held by another worker)...")
+                        announced = True
+                    time.sleep(POLL_SECONDS)
+            entry["file"] = f
+        entry["depth"] += 1
+        try:
+            yield
+        finally:
+            entry["depth"] -= 1
+            if entry["depth"] == 0:
+                f, entry["file"] = entry["file"], None
+                _unlock(f)
+                f.close()
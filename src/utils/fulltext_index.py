@@ -0,0 +1,253 @@
+import os
+import re
+import json
+import math
+import uuid
+import datetime
+from collections import Counter
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# 定義路徑
+INDEX_DIR = "data/archive/fulltext"
+INDEX_MANIFEST_PATH = os.path.join(INDEX_DIR, "manifest.json")
+
+# v2: CJK 另外索引單字 (單字查詢才能命中)
+INDEX_VERSION = 2
+
+# 與 archive_store 相同的段策略：小段累積到一定數量就合併
+SMALL_SEGMENT_DOCS = 2000
+MERGE_TRIGGER = 8
+
+# postings 依 token 排序後分成小 row group，查詢時靠 row group 統計值跳過不相關的區塊
+ROW_GROUP_SIZE = 16384
+
+# BM25 參數
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# CJK (中日韓) 字元連續出現時切成兩字一組 (bigram)，其餘以英數字詞為單位
+# (CJK 擴充 A、基本區、相容表意字、假名、韓文音節)
+CJK_RANGES = "\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\u3040-\u30ff\uac00-\ud7af"
+TOKEN_PATTERN = re.compile(f"([{CJK_RANGES}]+)|([0-9a-z]+(?:['_][0-9a-z]+)*)")
+
+
+def tokenize(text, unigrams=False):
+    """
+    CJK 連續字元切成 bigram (單字時保留單字)，英文與數字以詞為單位並轉小寫。
+    unigrams=True (建立索引時) 另外加上每個 CJK 單字，讓單字查詢 (例如「累」) 也能命中；
+    查詢本身不加單字，多字查詢的排序仍由 bigram 決定。
+    """
+    tokens = []
+    for cjk, word in TOKEN_PATTERN.findall(str(text or "").lower()):
+        if word:
+            tokens.append(word)
+        elif len(cjk) == 1:
+            tokens.append(cjk)
+        else:
+            tokens.extend(cjk[i:i + 2] for i in range(len(cjk) - 1))
+            if unigrams:
+                tokens.extend(cjk)
+    return tokens
+
+
+def _empty_manifest():
+    return {"version": INDEX_VERSION, "next_seq": 1, "segments": []}
+
+
+def load_manifest():
+    if not os.path.exists(INDEX_MANIFEST_PATH):
+        return _empty_manifest()
+    with open(INDEX_MANIFEST_PATH, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_manifest(manifest):
+    os.makedirs(INDEX_DIR, exist_ok=True)
+    tmp_path = f"{INDEX_MANIFEST_PATH}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, INDEX_MANIFEST_PATH)
+
+
+def _doc_rows(df):
+    """DataFrame (uuid / date / content) -> [(key, date, content)]，同一鍵保留最後一筆"""
+    dates = pd.to_datetime(df['date'], errors='coerce').dt.strftime('%Y-%m-%d').fillna('1970-01-01')
+    uuids = df['uuid'] if 'uuid' in df.columns else pd.Series([None] * len(df), index=df.index)
+    contents = df['content'] if 'content' in df.columns else pd.Series([""] * len(df), index=df.index)
+    docs = {}
+    for u, d, content in zip(uuids.values, dates.values, contents.values):
+        key = str(u) if pd.notna(u) else d
+        docs[key] = (key, d, content if isinstance(content, str) else "")
+    return list(docs.values())
+
+
+def _write_segment(manifest, docs, postings):
+    seq = manifest["next_seq"]
+    manifest["next_seq"] = seq + 1
+    seg_id = f"seg-{seq:06d}-{uuid.uuid4().hex[:6]}"
+    os.makedirs(INDEX_DIR, exist_ok=True)
+
+    postings = postings.sort_values(['token', 'uuid'], kind='stable')
+    postings_path = f"{seg_id}.postings.parquet"
+    docs_path = f"{seg_id}.docs.parquet"
+    pq.write_table(pa.Table.from_pandas(postings, preserve_index=False), os.path.join(INDEX_DIR, postings_path),
+                   row_group_size=ROW_GROUP_SIZE, compression='snappy')
+    pq.write_table(pa.Table.from_pandas(docs, preserve_index=False), os.path.join(INDEX_DIR, docs_path), compression='snappy')
+
+    segment = {
+        "id": seg_id,
+        "seq": seq,
+        "postings": postings_path,
+        "docs": docs_path,
+        "doc_count": int(len(docs)),
+        "rows": int(len(postings)),
+        "bytes": os.path.getsize(os.path.join(INDEX_DIR, postings_path)) + os.path.getsize(os.path.join(INDEX_DIR, docs_path)),
+        "created": datetime.datetime.now().isoformat(timespec='seconds'),
+    }
+    manifest["segments"].append(segment)
+    return segment
+
+
+def add_documents(df, manifest=None):
+    """
+    增量索引：新紀錄寫成一個新段 (不改寫既有段)。
+    同一 uuid 重新索引時，查詢只採用最新段中的版本。
+    """
+    if df.empty:
+        return None
+    if manifest is None:
+        manifest = load_manifest()
+
+    doc_records, posting_records = [], []
+    for key, date, content in _doc_rows(df):
+        counts = Counter(tokenize(content, unigrams=True))
+        doc_records.append((key, date, sum(counts.values())))
+        posting_records.extend((token, key, date, tf) for token, tf in counts.items())
+
+    docs = pd.DataFrame(doc_records, columns=['uuid', 'date', 'length'])
+    postings = pd.DataFrame(posting_records, columns=['token', 'uuid', 'date', 'tf'])
+    postings['tf'] = postings['tf'].astype('int32')
+    segment = _write_segment(manifest, docs, postings)
+    merge_small_segments(manifest)
+    save_manifest(manifest)
+    return segment
+
+
+def rebuild(df, manifest=None):
+    """整份重建 (第一次建立或索引格式改變時)：先寫新段並存 Manifest，再刪除舊段"""
+    if manifest is None:
+        manifest = load_manifest()
+    old_segments = manifest["segments"]
+    manifest["segments"] = []
+    manifest["version"] = INDEX_VERSION
+    segment = add_documents(df, manifest)
+    if segment is None:
+        save_manifest(manifest)
+    for seg in old_segments:
+        for name in (seg["postings"], seg["docs"]):
+            path = os.path.join(INDEX_DIR, name)
+            if os.path.exists(path):
+                os.remove(path)
+    return segment
+
+
+def is_current(manifest):
+    """已有索引且格式為目前版本 (否則 compaction 由完整歸檔重建)"""
+    return bool(manifest["segments"]) and manifest.get("version") == INDEX_VERSION
+
+
+def _live_docs(manifest):
+    """所有段的文件表，每個 uuid 只保留最新段的版本"""
+    frames = []
+    for seg in manifest["segments"]:
+        docs = pd.read_parquet(os.path.join(INDEX_DIR, seg["docs"]))
+        docs['seq'] = seg["seq"]
+        frames.append(docs)
+    if not frames:
+        return pd.DataFrame(columns=['uuid', 'date', 'length', 'seq'])
+    docs = pd.concat(frames, ignore_index=True)
+    return docs.sort_values('seq', kind='stable').drop_duplicates('uuid', keep='last')
+
+
+def _read_postings(seg, tokens=None):
+    path = os.path.join(INDEX_DIR, seg["postings"])
+    filters = [('token', 'in', sorted(tokens))] if tokens is not None else None
+    table = pq.read_table(path, columns=['token', 'uuid', 'date', 'tf'], filters=filters)
+    df = table.to_pandas()
+    df['seq'] = seg["seq"]
+    return df
+
+
+def merge_small_segments(manifest, trigger=MERGE_TRIGGER, force=False):
+    """合併小段並丟棄已被新版本取代的 postings (呼叫端負責 save_manifest)"""
+    small = [s for s in manifest["segments"] if s["doc_count"] < SMALL_SEGMENT_DOCS]
+    if len(small) < 2 or (len(small) < trigger and not force):
+        return False
+
+    live = _live_docs(manifest)
+    latest = dict(zip(live['uuid'], live['seq']))
+    docs_frames, postings_frames = [], []
+    for seg in small:
+        docs = pd.read_parquet(os.path.join(INDEX_DIR, seg["docs"]))
+        docs_frames.append(docs[docs['uuid'].map(latest) == seg["seq"]])
+        postings = _read_postings(seg)
+        postings_frames.append(postings[postings['uuid'].map(latest) == seg["seq"]].drop(columns='seq'))
+
+    old_ids = {s["id"] for s in small}
+    max_seq = max(s["seq"] for s in small)
+    manifest["segments"] = [s for s in manifest["segments"] if s["id"] not in old_ids]
+    merged = _write_segment(manifest, pd.concat(docs_frames, ignore_index=True), pd.concat(postings_frames, ignore_index=True))
+    # 合併段承接被合併段中最大的 seq，確保「較新版本勝出」的判斷不變
+    merged["seq"] = max_seq
+    manifest["segments"].sort(key=lambda s: s["seq"])
+    save_manifest(manifest)
+
+    for seg in small:
+        for name in (seg["postings"], seg["docs"]):
+            path = os.path.join(INDEX_DIR, name)
+            if os.path.exists(path):
+                os.remove(path)
+    return True
+
+
+def search(query, limit=20, date_from=None, date_to=None, manifest=None):
+    """
+    BM25 排序的全文查詢，回傳 [(uuid, date, score)]。
+    只讀取各段中包含查詢 token 的 row group，不掃描整個歸檔。
+    """
+    tokens = Counter(tokenize(query))
+    if not tokens:
+        return []
+    if manifest is None:
+        manifest = load_manifest()
+    if not manifest["segments"]:
+        return []
+
+    live = _live_docs(manifest)
+    n_docs = len(live)
+    avg_len = max(live['length'].mean(), 1.0) if n_docs else 1.0
+
+    frames = [_read_postings(seg, tokens) for seg in manifest["segments"]]
+    postings = pd.concat([f for f in frames if not f.empty], ignore_index=True) if any(not f.empty for f in frames) else None
+    if postings is None:
+        return []
+    # 只保留每個 uuid 最新段中的 postings
+    postings = postings.merge(live[['uuid', 'seq', 'length']], on=['uuid', 'seq'], how='inner')
+    if date_from:
+        postings = postings[postings['date'] >= str(date_from)]
+    if date_to:
+        postings = postings[postings['date'] <= str(date_to)]
+    if postings.empty:
+        return []
+
+    doc_freq = postings.groupby('token')['uuid'].nunique()
+    idf = doc_freq.map(lambda df: math.log(1 + (n_docs - df + 0.5) / (df + 0.5)))
+    norm = BM25_K1 * (1 - BM25_B + BM25_B * postings['length'] / avg_len)
+    postings['score'] = (postings['token'].map(idf) * postings['token'].map(tokens)
+                         * postings['tf'] * (BM25_K1 + 1) / (postings['tf'] + norm))
+
+    ranked = (postings.groupby(['uuid', 'date'], sort=False)['score'].sum()
+              .reset_index().sort_values(['score', 'date'], ascending=[False, False]).head(limit))
+    return [(row.uuid, row.date, round(float(row.score), 4)) for row in ranked.itertuples(index=False)]
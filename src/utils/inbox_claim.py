@@ -0,0 +1,186 @@
+import os
+import re
+import json
+import time
+import socket
+from contextlib import contextmanager
+from src.utils.inbox_reader import INBOX_DIR
+from src.utils.file_lock import file_lock
+
+# 每個 worker 的暫存區：data/inbox/.claims/<worker>/ (不在 Inbox 的 *.md glob 範圍內，其他 worker 看不到)
+CLAIMS_DIRNAME = ".claims"
+LEASE_FILE = ".lease"  # 不是 *.json，讀取暫存區時不會被當成 Sidecar
+
+# 其他主機的租約超過此秒數未更新視為過期 (同一台機器直接檢查行程是否還在)
+LEASE_TTL = float(os.getenv("LIFEOS_CLAIM_TTL", "1800"))
+# 沒有對應 .md 的 Sidecar 要放置超過此秒數才認領 (process_inbox 先寫 .json 再寫 .md)
+ORPHAN_GRACE = 60
+
+
+def claims_root(inbox_dir=INBOX_DIR):
+    return os.path.join(inbox_dir, CLAIMS_DIRNAME)
+
+
+def default_worker_id():
+    worker = os.getenv("LIFEOS_WORKER_ID") or f"{socket.gethostname()}-{os.getpid()}"
+    return re.sub(r"[^A-Za-z0-9_.-]", "_", worker)
+
+
+def _pid_alive(pid):
+    if os.name != "posix":
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _read_lease(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _lease_expired(lease, claim_dir):
+    if lease is None:
+        # 租約尚未寫入或已損毀：以目錄的修改時間判斷
+        return time.time() - os.path.getmtime(claim_dir) > LEASE_TTL
+    if lease.get("host") == socket.gethostname():
+        return not _pid_alive(int(lease.get("pid", 0)))
+    return time.time() - float(lease.get("heartbeat", 0)) > LEASE_TTL
+
+
+def _move_back(claim_dir, inbox_dir):
+    """把暫存區剩下的紀錄放回 Inbox；Inbox 已有同名檔時保留在暫存區並提示"""
+    moved = 0
+    for name in sorted(os.listdir(claim_dir)):
+        if name == LEASE_FILE or not name.endswith(('.md', '.json')):
+            continue
+        target = os.path.join(inbox_dir, name)
+        if os.path.exists(target):
+            print(f"⚠️ {name} exists in both {claim_dir} and the inbox; left in place.")
+            continue
+        os.rename(os.path.join(claim_dir, name), target)
+        moved += 1
+    return moved
+
+
+def _remove_dir(claim_dir):
+    lease = os.path.join(claim_dir, LEASE_FILE)
+    if os.path.exists(lease):
+        os.remove(lease)
+    try:
+        os.rmdir(claim_dir)
+    except OSError:
+        pass
+
+
+def recover_stale(inbox_dir=INBOX_DIR):
+    """把過期租約 (worker 當掉或被取消) 暫存區中的紀錄放回 Inbox，回傳放回的檔案數"""
+    root = claims_root(inbox_dir)
+    if not os.path.isdir(root):
+        return 0
+    recovered = 0
+    with file_lock("inbox"):
+        for worker in sorted(os.listdir(root)):
+            claim_dir = os.path.join(root, worker)
+            if not os.path.isdir(claim_dir):
+                continue
+            if not _lease_expired(_read_lease(os.path.join(claim_dir, LEASE_FILE)), claim_dir):
+                continue
+            moved = _move_back(claim_dir, inbox_dir)
+            _remove_dir(claim_dir)
+            if moved:
+                print(f"♻️ Recovered {moved} file(s) from stale claim {worker}")
+            recovered += moved
+    return recovered
+
+
+class InboxClaim:
+    """
+    以 rename 認領 Inbox 紀錄：.md (連同同名 Sidecar) 移進 worker 自己的暫存區後，只有這個 worker 會處理與刪除它。
+    rename 在同一個檔案系統上是原子操作；認領本身持有 inbox 鎖，確保 .md 與 Sidecar 一起移動。
+    """
+
+    def __init__(self, inbox_dir=INBOX_DIR, worker=None):
+        self.inbox_dir = inbox_dir
+        self.worker = worker or default_worker_id()
+        self.dir = os.path.join(claims_root(inbox_dir), self.worker)
+        self.files = []
+
+    def heartbeat(self):
+        """更新租約 (長時間的階段之間呼叫，避免被其他主機視為過期)；沒有認領任何東西時不做事"""
+        if not os.path.isdir(self.dir):
+            return
+        lease = {"worker": self.worker, "host": socket.gethostname(), "pid": os.getpid(), "heartbeat": time.time()}
+        path = os.path.join(self.dir, LEASE_FILE)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(lease, f)
+        os.replace(tmp_path, path)
+
+    def _take(self, name):
+        try:
+            os.rename(os.path.join(self.inbox_dir, name), os.path.join(self.dir, name))
+        except FileNotFoundError:
+            return False
+        self.files.append(name)
+        return True
+
+    def claim(self, limit=None):
+        """認領至多 limit 筆 .md (依檔名排序)，回傳認領的 .md 數"""
+        if not os.path.isdir(self.inbox_dir):
+            return 0
+        with file_lock("inbox"):
+            os.makedirs(self.dir, exist_ok=True)
+            self.heartbeat()
+            names = sorted(os.listdir(self.inbox_dir))
+            present = set(names)
+            taken = 0
+            for name in names:
+                if limit is not None and taken >= limit:
+                    break
+                if name.endswith('.md') and self._take(name):
+                    taken += 1
+                    # 與 inbox_reader.load_inbox_record 相同的 Sidecar 命名
+                    sidecar = name.replace('.md', '.json')
+                    if sidecar in present:
+                        self._take(sidecar)
+            if limit is None or taken < limit:
+                now = time.time()
+                for name in names:
+                    if not name.endswith('.json') or name[:-5] + '.md' in present:
+                        continue
+                    # 清單是認領前取得的：其間被其他 worker 認領或被 compaction 刪除的檔案直接略過
+                    try:
+                        if now - os.path.getmtime(os.path.join(self.inbox_dir, name)) > ORPHAN_GRACE:
+                            self._take(name)
+                    except OSError:
+                        continue
+        return taken
+
+    def release(self):
+        """處理結束：沒被刪除的紀錄 (歸檔失敗、孤立 Sidecar) 放回 Inbox，並移除暫存區"""
+        if not os.path.isdir(self.dir):
+            return 0
+        with file_lock("inbox"):
+            moved = _move_back(self.dir, self.inbox_dir)
+            _remove_dir(self.dir)
+        return moved
+
+
+@contextmanager
+def claimed(inbox_dir=INBOX_DIR, limit=None, worker=None):
+    """先回收過期租約，再認領一批紀錄；離開時 (包含例外) 把剩下的檔案放回 Inbox"""
+    recover_stale(inbox_dir)
+    claim = InboxClaim(inbox_dir, worker)
+    claim.claim(limit)
+    try:
+        yield claim
+    finally:
+        claim.release()
@@ -0,0 +1,150 @@
+import os
+import re
+import json
+import glob
+import yaml
+import frontmatter
+from src.utils import metrics
+
+# 定義路徑
+INBOX_DIR = "data/inbox"
+
+# 平行讀取：LIFEOS_INBOX_WORKERS=1 時逐一讀取；LIFEOS_INBOX_EXECUTOR=process 改用多行程
+DEFAULT_WORKERS = int(os.getenv("LIFEOS_INBOX_WORKERS", str(min(8, os.cpu_count() or 1))))
+EXECUTOR = os.getenv("LIFEOS_INBOX_EXECUTOR", "thread")
+
+# 檔案數少於此值時直接逐一讀取 (建立執行緒池不划算)
+PARALLEL_MIN_FILES = 64
+
+# 有 libyaml 時使用 C 版 SafeLoader (解析結果與純 Python 版相同)
+YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+
+class _FastYAMLHandler(frontmatter.YAMLHandler):
+    def load(self, fm, **kwargs):
+        kwargs.setdefault("Loader", YAML_LOADER)
+        return super().load(fm, **kwargs)
+
+
+_YAML_HANDLER = _FastYAMLHandler()
+
+
+def _load_post(md_path):
+    """等同 frontmatter.load(md_path)，YAML front matter 改用 YAML_LOADER 解析"""
+    with open(md_path, 'r', encoding='utf-8') as f:
+        text = f.read()
+    handler = frontmatter.detect_format(text, frontmatter.handlers)
+    if isinstance(handler, frontmatter.YAMLHandler):
+        handler = _YAML_HANDLER
+    return frontmatter.loads(text, handler=handler)
+
+
+def filename_date(md_path):
+    """
+    front matter 沒有 date 時由檔名推得日期：
+    YYYYMMDD*.md、process_inbox 產生的 YYYY-MM-DD_uuid.md，其餘為 1970-01-01
+    """
+    filename = os.path.basename(md_path)
+    if filename[:8].isdigit():
+        return f"{filename[:4]}-{filename[4:6]}-{filename[6:8]}"
+    if re.match(r"\d{4}-\d{2}-\d{2}", filename):
+        return filename[:10]
+    return "1970-01-01"
+
+
+def _load_sidecar(record, json_path):
+    try:
+        with open(json_path, 'r', encoding='utf-8') as f:
+            record["sidecar"] = json.load(f)
+    except Exception as e:
+        record["sidecar_error"] = e
+
+
+def load_inbox_record(md_path):
+    """
+    讀取一筆 Inbox 紀錄 (.md + 同名 .json Sidecar)，只解析一次供所有階段共用。
+    解析失敗不拋出，而是記錄在 error / sidecar_error，由各階段自行決定如何處理。
+    """
+    json_path = md_path.replace('.md', '.json')
+    record = {
+        "md_path": md_path,
+        "json_path": json_path if os.path.exists(json_path) else None,
+        "metadata": None,
+        "content": None,
+        "sidecar": None,
+        "error": None,
+        "sidecar_error": None,
+    }
+    try:
+        post = _load_post(md_path)
+        record["metadata"] = post.metadata
+        record["content"] = post.content
+    except Exception as e:
+        record["error"] = e
+
+    if record["json_path"]:
+        _load_sidecar(record, record["json_path"])
+    return record
+
+
+def _load_orphan_sidecar(json_path):
+    record = {
+        "md_path": None, "json_path": json_path, "metadata": None, "content": None,
+        "sidecar": None, "error": None, "sidecar_error": None,
+    }
+    _load_sidecar(record, json_path)
+    return record
+
+
+def _map_ordered(func, paths, workers, executor):
+    """依輸入順序逐筆產出結果；檔案少或 workers <= 1 時不開執行緒池"""
+    if workers <= 1 or len(paths) < PARALLEL_MIN_FILES:
+        yield from map(func, paths)
+        return
+    # 只在需要時載入 (concurrent.futures 會拖慢 classify / sync 等輕量指令的啟動)
+    from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+    if executor == "process":
+        with ProcessPoolExecutor(workers) as pool:
+            yield from pool.map(func, paths, chunksize=max(1, len(paths) // (workers * 4)))
+    else:
+        with ThreadPoolExecutor(workers) as pool:
+            yield from pool.map(func, paths)
+
+
+def iter_inbox(inbox_dir=INBOX_DIR, workers=None, executor=None):
+    """
+    平行解析 Inbox，依檔名排序逐筆產出紀錄 (順序與 workers 數無關)：
+    先是每個 .md (含同名 Sidecar)，再是沒有對應 .md 的 .json Sidecar (md_path 為 None)。
+    """
+    workers = DEFAULT_WORKERS if workers is None else workers
+    executor = executor or EXECUTOR
+    md_files = sorted(glob.glob(os.path.join(inbox_dir, "*.md")))
+    paired = set()
+    for record in _map_ordered(load_inbox_record, md_files, workers, executor):
+        if record["json_path"]:
+            paired.add(record["json_path"])
+        yield record
+
+    orphans = [p for p in sorted(glob.glob(os.path.join(inbox_dir, "*.json"))) if p not in paired]
+    yield from _map_ordered(_load_orphan_sidecar, orphans, workers, executor)
+
+
+def load_inbox(inbox_dir=INBOX_DIR, workers=None, executor=None):
+    """
+    載入整個 Inbox：每個 .md 一筆；沒有對應 .md 的 .json Sidecar 也各自成為一筆 (md_path 為 None)。
+    """
+    with metrics.span("inbox.load") as span:
+        records = list(iter_inbox(inbox_dir, workers, executor))
+
+        span.items = len(records)
+        span.bytes_read = sum(metrics.file_size(p) for r in records for p in (r["md_path"], r["json_path"]) if p)
+        metrics.count("inbox.parse_errors", sum(1 for r in records if r["error"] or r["sidecar_error"]))
+    return records
+
+
+def markdown_records(records):
+    return [r for r in records if r["md_path"]]
+
+
+def sidecar_records(records):
+    return [r for r in records if r["json_path"]]
@@ -0,0 +1,124 @@
+import os
+import json
+import hashlib
+import datetime
+from src.utils import archive_store
+from src.utils import archive_schema
+
+# 定義路徑
+EXPORT_DIR = os.path.join(archive_store.ARCHIVE_DIR, "export")
+EXPORT_MANIFEST_PATH = os.path.join(EXPORT_DIR, "manifest.json")
+LEGACY_JSON_PATH = os.path.join(archive_store.ARCHIVE_DIR, "lifeos_db.json")
+
+EXPORT_VERSION = 2
+
+# 前端 (toArchivedLog) 用得到的欄位；extra 會展開成原本的 frontmatter 欄位
+EXPORT_COLUMNS = ['uuid', 'date', 'content', 'mood', 'focus', 'summary', 'entry_tags', 'life_energy', 'life_safety', 'extra']
+
+
+def _empty_export_manifest():
+    return {"version": EXPORT_VERSION, "generated": None, "total_rows": 0, "shards": {}}
+
+
+def load_export_manifest():
+    if not os.path.exists(EXPORT_MANIFEST_PATH):
+        return _empty_export_manifest()
+    with open(EXPORT_MANIFEST_PATH, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _atomic_write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def entry_index(manifest=None):
+    """
+    只讀 uuid / date 兩欄並套用全域去重，得到每筆紀錄最終所屬的月份。
+    (同一 uuid 被改寫到其他月份時，只會出現在新月份的分片)
+    """
+    index = archive_store.read_archive(columns=['uuid', 'date'], manifest=manifest)
+    if index.empty:
+        return index
+    return index.assign(month=archive_store._month_keys(index['date']).values)
+
+
+def to_records(df):
+    """歸檔 DataFrame -> 前端 (toArchivedLog) 使用的紀錄陣列 JSON 字串 (分片與查詢服務共用)"""
+    df = archive_schema.expand_extra(df.rename(columns={'entry_tags': 'tags'}))
+    if 'date' in df.columns:
+        df['date'] = df['date'].dt.strftime('%Y-%m-%d')
+    return df.to_json(orient='records', force_ascii=False, date_format='iso')
+
+
+def _render_shard(month, index, manifest):
+    df = archive_store.read_archive(months=[month], columns=EXPORT_COLUMNS, manifest=manifest)
+    if 'uuid' in df.columns and 'uuid' in index.columns:
+        owned = set(index.loc[index['month'] == month, 'uuid'].dropna())
+        df = df[df['uuid'].isna() | df['uuid'].isin(owned)]
+    return to_records(df).encode('utf-8'), len(df)
+
+
+def export_shards(touched_months=(), manifest=None, index=None):
+    """
+    依月份輸出前端用 JSON 分片 (export/YYYY-MM.json) 與含內容雜湊的 manifest。
+    只重寫 touched_months 與筆數對不上的月份；內容雜湊相同的分片不會被改寫。
+    """
+    if manifest is None:
+        manifest = archive_store.load_manifest()
+    if index is None:
+        index = entry_index(manifest)
+    export = load_export_manifest()
+    shards = export["shards"]
+
+    counts = index['month'].value_counts().to_dict() if not index.empty else {}
+    todo = {m for m in touched_months if m in counts}
+    todo.update(m for m, rows in counts.items() if m not in shards or shards[m]["rows"] != rows)
+    if export.get("version") != EXPORT_VERSION:
+        # 分片格式改變 (例如歸檔 schema 升級)：全部重寫一次
+        todo.update(counts)
+
+    written = []
+    for month in sorted(todo):
+        data, rows = _render_shard(month, index, manifest)
+        digest = hashlib.sha256(data).hexdigest()
+        rel_path = f"{month}.json"
+        if shards.get(month, {}).get("sha256") == digest and os.path.exists(os.path.join(EXPORT_DIR, rel_path)):
+            continue
+        _atomic_write(os.path.join(EXPORT_DIR, rel_path), data)
+        shards[month] = {
+            "path": rel_path,
+            "rows": rows,
+            "bytes": len(data),
+            "sha256": digest,
+            "updated": datetime.datetime.now().isoformat(timespec='seconds'),
+        }
+        written.append(month)
+
+    removed = [m for m in shards if m not in counts]
+    for month in removed:
+        path = os.path.join(EXPORT_DIR, shards.pop(month)["path"])
+        if os.path.exists(path):
+            os.remove(path)
+
+    if written or removed or not os.path.exists(EXPORT_MANIFEST_PATH):
+        export["version"] = EXPORT_VERSION
+        export["generated"] = datetime.datetime.now().isoformat(timespec='seconds')
+        export["total_rows"] = int(sum(s["rows"] for s in shards.values()))
+        export["shards"] = dict(sorted(shards.items()))
+        _atomic_write(EXPORT_MANIFEST_PATH, json.dumps(export, ensure_ascii=False, indent=2).encode('utf-8'))
+
+    # 舊版單一 JSON 已由分片取代，留著只會是過期資料
+    if shards and os.path.exists(LEGACY_JSON_PATH):
+        os.remove(LEGACY_JSON_PATH)
+
+    return {
+        "written": written,
+        "removed": removed,
+        "bytes": sum(shards[m]["bytes"] for m in written),
+        "shards": len(shards),
+        "rows": export["total_rows"],
+    }
@@ -0,0 +1,146 @@
+import os
+import json
+import time
+import uuid
+import datetime
+import threading
+from contextlib import contextmanager
+
+# 定義路徑
+METRICS_PATH = "data/archive/metrics.jsonl"
+
+# LIFEOS_METRICS=off 時不寫入 metrics 檔 (span / count 仍可呼叫)
+ENABLED = os.getenv("LIFEOS_METRICS", "on").lower() not in ("0", "off", "false")
+
+_lock = threading.Lock()
+_state = {"run": None, "depth": 0}
+
+
+class Span:
+    """單一階段的量測：耗時、處理筆數、讀寫位元組 (由呼叫端填入 items / bytes_*)"""
+
+    def __init__(self, name, items=0):
+        self.name = name
+        self.items = items
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.seconds = 0.0
+
+
+def _new_run(command):
+    return {
+        "run_id": uuid.uuid4().hex[:12],
+        "command": command,
+        "started": datetime.datetime.now().isoformat(timespec='seconds'),
+        "spans": {},
+        "counters": {},
+    }
+
+
+@contextmanager
+def run(command):
+    """
+    一次執行 = 一筆 metrics 紀錄。可巢狀呼叫 (例如 pipeline 內的各階段)，只有最外層會寫檔。
+    呼叫端可自行設定 record["status"] (例如 pipeline 有階段失敗時設為 "failed")。
+    """
+    with _lock:
+        outer = _state["depth"] == 0
+        if outer:
+            _state["run"] = _new_run(command)
+        _state["depth"] += 1
+    started = time.perf_counter()
+    status = "ok"
+    try:
+        yield _state["run"]
+    except SystemExit as e:
+        status = "ok" if e.code in (0, None) else "error"
+        raise
+    except BaseException as e:
+        status = "interrupted" if isinstance(e, KeyboardInterrupt) else "error"
+        raise
+    finally:
+        with _lock:
+            _state["depth"] -= 1
+            record = _state["run"] if outer else None
+            if outer:
+                _state["run"] = None
+        if record is not None:
+            record["seconds"] = round(time.perf_counter() - started, 4)
+            record["status"] = record.get("status") or status
+            _write(record)
+
+
+def _write(record):
+    if not ENABLED:
+        return
+    try:
+        os.makedirs(os.path.dirname(METRICS_PATH), exist_ok=True)
+        with open(METRICS_PATH, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    except OSError as e:
+        print(f"⚠️ Could not write metrics: {e}")
+
+
+@contextmanager
+def span(name, items=0):
+    """量測一個階段；同一次執行中同名的 span 會累加 (calls 記錄次數)"""
+    s = Span(name, items)
+    started = time.perf_counter()
+    try:
+        yield s
+    finally:
+        s.seconds = time.perf_counter() - started
+        with _lock:
+            current = _state["run"]
+            if current is not None:
+                agg = current["spans"].setdefault(name, {"calls": 0, "seconds": 0.0, "items": 0, "bytes_read": 0, "bytes_written": 0})
+                agg["calls"] += 1
+                agg["seconds"] = round(agg["seconds"] + s.seconds, 4)
+                agg["items"] += int(s.items or 0)
+                agg["bytes_read"] += int(s.bytes_read or 0)
+                agg["bytes_written"] += int(s.bytes_written or 0)
+
+
+def count(name, n=1):
+    """累加計數器 (例如快取命中、重試、略過的重複項目)"""
+    if not n:
+        return
+    with _lock:
+        current = _state["run"]
+        if current is not None:
+            current["counters"][name] = current["counters"].get(name, 0) + n
+
+
+def file_size(path):
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+def load_runs(path=METRICS_PATH, command=None, last=None):
+    """讀取 metrics 紀錄 (可依指令過濾，只取最後 last 筆)"""
+    runs = []
+    if not os.path.exists(path):
+        return runs
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if command is None or record.get("command") == command:
+                runs.append(record)
+    return runs[-last:] if last else runs
+
+
+def percentile(values, q):
+    """最近排名法 (nearest-rank) 百分位數，不依賴 numpy"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * q // 100))
+    return ordered[int(rank) - 1]
@@ -0,0 +1,111 @@
+import re
+
+# 逐行單次掃描：每行只做字串操作與錨定在行首、不含巢狀量詞的比對，整體耗時與輸入長度成線性
+
+_FENCES = ("```", "~~~")
+_BULLETS = ("-", "*", "+")
+MIT_HEADING_RE = re.compile(r"tomorrow.s\s*mit", re.IGNORECASE)
+_CHECKBOX_RE = re.compile(r"\[([ xX]?)\]")
+_ORDERED_RE = re.compile(r"\d{1,9}[.)]")
+
+
+def _heading(line):
+    """ATX 標題 (1-6 個 # 後接空白) -> (level, title)，否則 None；標題尾端的 # 一併去除"""
+    if not line.startswith('#'):
+        return None
+    level = len(line) - len(line.lstrip('#'))
+    if level > 6 or len(line) == level or not line[level].isspace():
+        return None
+    return level, line[level:].strip().rstrip('#').rstrip()
+
+
+def _list_item(stripped):
+    """清單項目 (- / * / + / 1. / TODO) -> (checked, text)，否則 None；checked 為 None 表示沒有勾選框"""
+    # 清單符號後需接空白 (或直接接勾選框 "-[ ]")，避免把 **粗體** 當成清單
+    if stripped[:1] in _BULLETS and (len(stripped) == 1 or stripped[1].isspace() or stripped[1] == '['):
+        rest = stripped[1:].lstrip()
+    else:
+        match = _ORDERED_RE.match(stripped)
+        if match:
+            rest = stripped[match.end():].lstrip()
+        elif stripped[:4].upper() == "TODO":
+            rest = stripped[4:].lstrip().lstrip(':').lstrip()
+            return None, rest
+        else:
+            return None
+    box = _CHECKBOX_RE.match(rest)
+    if box:
+        return box.group(1) in ('x', 'X'), rest[box.end():].strip()
+    return None, rest.strip()
+
+
+def parse_outline(text):
+    """
+    Markdown 日記的大綱，一次掃描產生：
+    - headings: [{"level", "title", "line"}]
+    - sections: [{"level", "title", "trail", "line", "body"}] (第一個標題之前的內容為 level 0 的前言)
+    - checkboxes: [{"text", "checked", "line", "section"}]
+    - mit: "Tomorrow's MIT" 區塊內未完成的清單項目文字
+    MIT 區塊從含 Tomorrow's MIT 的標題開始到下一個標題為止；若只是一般文字行 (例如 **Tomorrow's MIT:**)，
+    則視為段落，到下一個標題或清單後的空行為止。程式碼區塊中的內容不解析。
+    """
+    headings = []
+    sections = [{"level": 0, "title": "", "trail": [], "line": 0, "body": []}]
+    checkboxes = []
+    mit = []
+    trail = []
+    in_fence = False
+    in_mit = False
+    mit_label = False
+    mit_started = False
+
+    for line_no, line in enumerate((text or "").splitlines()):
+        stripped = line.strip()
+        section = sections[-1]
+        if stripped.startswith(_FENCES):
+            in_fence = not in_fence
+            section["body"].append(line)
+            continue
+        if in_fence:
+            section["body"].append(line)
+            continue
+
+        heading = _heading(line)
+        if heading:
+            level, title = heading
+            headings.append({"level": level, "title": title, "line": line_no})
+            trail[:] = [(lv, t) for lv, t in trail if lv < level] + [(level, title)]
+            sections.append({"level": level, "title": title, "trail": [t for _, t in trail], "line": line_no, "body": []})
+            in_mit = bool(MIT_HEADING_RE.search(title))
+            mit_label = False
+            mit_started = False
+            continue
+
+        section["body"].append(line)
+        if not stripped:
+            if in_mit and mit_label and mit_started:
+                in_mit = False
+            continue
+
+        item = _list_item(stripped)
+        if item is None:
+            if not in_mit and MIT_HEADING_RE.search(stripped):
+                in_mit, mit_label, mit_started = True, True, False
+            continue
+        checked, item_text = item
+        if checked is not None and item_text:
+            checkboxes.append({"text": item_text, "checked": checked, "line": line_no, "section": len(sections) - 1})
+        if in_mit:
+            mit_started = True
+            if item_text and not checked:
+                mit.append(item_text)
+
+    for section in sections:
+        section["body"] = "\n".join(section["body"]).strip()
+    return {"headings": headings, "sections": sections, "checkboxes": checkboxes, "mit": mit}
+
+
+def open_tasks(outline):
+    """MIT 項目加上所有未勾選的 checkbox，依出現順序去重"""
+    tasks = list(outline["mit"]) + [c["text"] for c in outline["checkboxes"] if not c["checked"]]
+    return list(dict.fromkeys(tasks))
@@ -0,0 +1,73 @@
+import asyncio
+import random
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    Token Bucket 限速器 (執行緒安全)。
+    rate: 每秒補充的 token 數；capacity: 允許的瞬間突發量。
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(1.0, rate))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def per_minute(cls, rpm, burst=None):
+        return cls(rpm / 60.0, burst if burst is not None else max(1, min(rpm, 10)))
+
+    def _reserve(self):
+        """預約一個 token，回傳需要等待的秒數 (0 表示可立即執行)"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1.0
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+    def acquire(self):
+        wait = self._reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self):
+        wait = self._reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+def backoff_delay(attempt, base=1.0, cap=60.0):
+    """指數退避 + full jitter：attempt 從 0 開始"""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+# google-genai APIError.status 中可重試的狀態
+RETRYABLE_STATUSES = frozenset({'RESOURCE_EXHAUSTED', 'UNAVAILABLE'})
+
+
+def _status_code(exc):
+    """例外 (或其 response) 帶的 HTTP 狀態碼，沒有時回傳 None"""
+    for holder in (exc, getattr(exc, 'response', None)):
+        for name in ('code', 'status_code'):
+            code = getattr(holder, name, None)
+            if isinstance(code, int) and not isinstance(code, bool):
+                return code
+    return None
+
+
+def is_quota_error(exc):
+    """
+    判斷是否為配額 / 限流錯誤 (HTTP 429、RESOURCE_EXHAUSTED 或 5xx 暫時性錯誤)。
+    只看例外帶的狀態碼，不比對錯誤訊息 (例如 JSON 解析錯誤的 "char 429" 不是配額錯誤)。
+    """
+    code = _status_code(exc)
+    if code is not None:
+        return code == 429 or 500 <= code < 600
+    return getattr(exc, 'status', None) in RETRYABLE_STATUSES
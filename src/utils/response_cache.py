@@ -0,0 +1,162 @@
+import os
+import json
+import atexit
+import hashlib
+import threading
+from collections import OrderedDict
+
+# 快取根目錄 (不進 git；CI 以 actions/cache 保存)
+CACHE_DIR = os.getenv("LIFEOS_CACHE_DIR", ".cache/lifeos")
+DEFAULT_MAX_BYTES = int(float(os.getenv("LIFEOS_CACHE_MAX_MB", "256")) * 1024 * 1024)
+
+# 每累積多少次寫入就把 LRU 索引落地一次 (其餘在 flush / 程式結束時寫入)
+INDEX_FLUSH_EVERY = 32
+
+
+def cache_key(*parts):
+    """以 (model, prompt 版本, text, ...) 的內容雜湊作為 key"""
+    h = hashlib.sha256()
+    for part in parts:
+        data = str(part).encode('utf-8')
+        h.update(len(data).to_bytes(8, 'little'))
+        h.update(data)
+    return h.hexdigest()
+
+
+def _tmp_name(path):
+    """每個行程 / 執行緒各自的暫存檔名 (平行的 worker 共用同一個快取目錄)"""
+    return f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+
+class ResponseCache:
+    """
+    內容定址的磁碟快取，每個 namespace (generation / embedding) 各自一個目錄。
+    以 LRU 順序記錄每筆大小，超過 max_bytes 時淘汰最久未使用的項目。
+    """
+
+    def __init__(self, namespace, cache_dir=None, max_bytes=DEFAULT_MAX_BYTES):
+        self.namespace = namespace
+        self.root = os.path.join(cache_dir or CACHE_DIR, namespace)
+        self.index_path = os.path.join(self.root, "index.json")
+        self.max_bytes = max_bytes
+        self.stats = {"hits": 0, "misses": 0, "writes": 0, "evictions": 0}
+        self._lock = threading.Lock()
+        # 索引落地另外序列化：寫檔不佔用 _lock，get / put 不必等待磁碟
+        self._flush_lock = threading.Lock()
+        self._dirty = 0
+        self._entries = OrderedDict()
+        self._total = 0
+        self._load_index()
+
+    def _load_index(self):
+        if not os.path.exists(self.index_path):
+            return
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            for key, size in data.get("entries", []):
+                self._entries[key] = size
+                self._total += size
+        except Exception as e:
+            print(f"⚠️ Cache index for {self.namespace} unreadable, starting empty: {e}")
+
+    def _path(self, key):
+        return os.path.join(self.root, key[:2], f"{key}.json")
+
+    def get(self, key):
+        """命中時回傳反序列化後的值並更新 LRU 順序，未命中回傳 None"""
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                value = json.load(f)
+        except (OSError, ValueError):
+            with self._lock:
+                self.stats["misses"] += 1
+                if key in self._entries:
+                    self._total -= self._entries.pop(key)
+            return None
+
+        with self._lock:
+            self.stats["hits"] += 1
+            if key in self._entries:
+                self._entries.move_to_end(key)
+            else:
+                # 索引未及時落地的項目，補登記
+                size = os.path.getsize(path)
+                self._entries[key] = size
+                self._total += size
+        return value
+
+    def put(self, key, value):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        payload = json.dumps(value, ensure_ascii=False, separators=(',', ':'))
+        tmp_path = _tmp_name(path)
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(payload)
+        os.replace(tmp_path, path)
+        size = os.path.getsize(path)
+
+        with self._lock:
+            if key in self._entries:
+                self._total -= self._entries.pop(key)
+            self._entries[key] = size
+            self._total += size
+            self.stats["writes"] += 1
+            self._evict_locked()
+            self._dirty += 1
+            should_flush = self._dirty >= INDEX_FLUSH_EVERY
+        if should_flush:
+            self.flush()
+
+    def _evict_locked(self):
+        while self._total > self.max_bytes and len(self._entries) > 1:
+            old_key, size = self._entries.popitem(last=False)
+            self._total -= size
+            self.stats["evictions"] += 1
+            try:
+                os.remove(self._path(old_key))
+            except OSError:
+                pass
+
+    def flush(self):
+        """把 LRU 索引寫回磁碟 (多個執行緒同時觸發時依序寫入，最後一次的快照勝出)"""
+        with self._flush_lock:
+            with self._lock:
+                entries = [[k, s] for k, s in self._entries.items()]
+                self._dirty = 0
+            os.makedirs(self.root, exist_ok=True)
+            tmp_path = _tmp_name(self.index_path)
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({"namespace": self.namespace, "entries": entries}, f)
+            os.replace(tmp_path, self.index_path)
+
+    def summary(self):
+        s = self.stats
+        total = s["hits"] + s["misses"]
+        rate = (s["hits"] / total * 100) if total else 0.0
+        return (f"{self.namespace}: {s['hits']} hits / {s['misses']} misses ({rate:.0f}%), "
+                f"{s['writes']} writes, {s['evictions']} evictions, {self._total / 1024:.0f} KB")
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_cache(namespace):
+    """取得共用的 namespace 快取；LIFEOS_CACHE=off 時回傳 None"""
+    if os.getenv("LIFEOS_CACHE", "on").lower() in ("off", "0", "false"):
+        return None
+    with _caches_lock:
+        if namespace not in _caches:
+            _caches[namespace] = ResponseCache(namespace)
+        return _caches[namespace]
+
+
+@atexit.register
+def flush_all():
+    for cache in list(_caches.values()):
+        try:
+            cache.flush()
+        except Exception as e:
+            print(f"⚠️ Cache flush failed for {cache.namespace}: {e}")
@@ -0,0 +1,208 @@
+import os
+import json
+import datetime
+import pandas as pd
+from src.utils import archive_store
+from src.utils.analytics import flat_columns
+
+# 定義路徑
+ROLLUP_PATH = os.path.join(archive_store.ARCHIVE_DIR, "rollups.json")
+
+ROLLUP_VERSION = 1
+
+# 計算彙總只需要的欄位 (不讀 content)
+ROLLUP_COLUMNS = ['uuid', 'date', 'mood', 'focus', 'entry_tags', 'life_energy', 'life_safety']
+
+GRANULARITIES = ("daily", "weekly", "monthly")
+
+# 可直接相加的欄位 (週 / 月由日彙總相加而來)
+_SUM_FIELDS = ("entries", "mood_sum", "mood_n", "focus_sum", "focus_n", "governor_triggers")
+_COUNT_FIELDS = ("energy", "safety", "tags")
+
+
+def _empty_rollups():
+    return {"version": ROLLUP_VERSION, "generated": None, "daily": {}, "weekly": {}, "monthly": {}}
+
+
+def load_rollups(path=ROLLUP_PATH):
+    if not os.path.exists(path):
+        return _empty_rollups()
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_rollups(rollups, path=ROLLUP_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    rollups["version"] = ROLLUP_VERSION
+    rollups["generated"] = datetime.datetime.now().isoformat(timespec='seconds')
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(rollups, f, ensure_ascii=False, separators=(',', ':'))
+    os.replace(tmp_path, path)
+
+
+def week_key(day):
+    """'YYYY-MM-DD' -> ISO 週 'YYYY-Www'"""
+    year, week, _ = datetime.date.fromisoformat(day).isocalendar()
+    return f"{year}-W{week:02d}"
+
+
+def _metric(df, name):
+    # 歸檔 schema 中的 mood / focus 已套用 ai_analysis 後備值
+    if name not in df.columns:
+        return pd.Series(float('nan'), index=df.index)
+    return pd.to_numeric(df[name], errors='coerce').astype('float64')
+
+
+def _finish(bucket):
+    bucket["mood_avg"] = round(bucket["mood_sum"] / bucket["mood_n"], 2) if bucket["mood_n"] else None
+    bucket["focus_avg"] = round(bucket["focus_sum"] / bucket["focus_n"], 2) if bucket["focus_n"] else None
+    return bucket
+
+
+def daily_buckets(df):
+    """
+    歸檔紀錄 -> {日期: 日彙總}。
+    mood / focus 以總和與筆數保存，週、月彙總可直接相加；
+    governor_triggers 為觸發 Governor 降速條件 (Intervene 或 Low energy) 的紀錄數。
+    """
+    if df.empty:
+        return {}
+    days = pd.to_datetime(df['date'], errors='coerce').dt.strftime('%Y-%m-%d').fillna('1970-01-01')
+    flat = flat_columns(df, ['entry_tags', 'life_energy', 'life_safety'])
+    frame = pd.DataFrame({
+        'day': days.values,
+        'mood': _metric(df, 'mood').values,
+        'focus': _metric(df, 'focus').values,
+        'energy': flat['life_energy'].values,
+        'safety': flat['life_safety'].values,
+        'tags': flat['entry_tags'].values,
+    })
+    frame['trigger'] = (frame['safety'] == 'Intervene') | (frame['energy'] == 'Low')
+
+    grouped = frame.groupby('day', sort=True)
+    stats = pd.DataFrame({
+        'entries': grouped.size(),
+        'mood_sum': grouped['mood'].sum(),
+        'mood_n': grouped['mood'].count(),
+        'focus_sum': grouped['focus'].sum(),
+        'focus_n': grouped['focus'].count(),
+        'governor_triggers': grouped['trigger'].sum(),
+    })
+
+    buckets = {}
+    for day, row in stats.iterrows():
+        buckets[day] = {
+            "entries": int(row['entries']),
+            "mood_sum": float(row['mood_sum']), "mood_n": int(row['mood_n']),
+            "focus_sum": float(row['focus_sum']), "focus_n": int(row['focus_n']),
+            "governor_triggers": int(row['governor_triggers']),
+            "energy": {}, "safety": {}, "tags": {},
+        }
+    for field in ("energy", "safety"):
+        counts = frame.dropna(subset=[field]).groupby(['day', field]).size()
+        for (day, value), n in counts.items():
+            buckets[day][field][str(value)] = int(n)
+    tags = frame[['day', 'tags']].explode('tags').dropna(subset=['tags'])
+    for (day, tag), n in tags.groupby(['day', 'tags']).size().items():
+        buckets[day]["tags"][tag] = int(n)
+    return {day: _finish(bucket) for day, bucket in buckets.items()}
+
+
+def _combine(days):
+    """多個日彙總相加成週 / 月彙總"""
+    bucket = {field: 0 for field in _SUM_FIELDS}
+    for field in _COUNT_FIELDS:
+        bucket[field] = {}
+    bucket["days"] = len(days)
+    bucket["maintenance_days"] = 0
+    for day in days:
+        for field in _SUM_FIELDS:
+            bucket[field] += day[field]
+        for field in _COUNT_FIELDS:
+            counts = bucket[field]
+            for key, n in day[field].items():
+                counts[key] = counts.get(key, 0) + n
+        bucket["maintenance_days"] += 1 if day["governor_triggers"] else 0
+    bucket["mood_sum"] = round(bucket["mood_sum"], 4)
+    bucket["focus_sum"] = round(bucket["focus_sum"], 4)
+    return _finish(bucket)
+
+
+def _month_counts(daily):
+    counts = {}
+    for day, bucket in daily.items():
+        counts[day[:7]] = counts.get(day[:7], 0) + bucket["entries"]
+    return counts
+
+
+def update_rollups(touched_months=(), manifest=None, index=None, path=ROLLUP_PATH):
+    """
+    只重算受影響的月份：touched_months 加上日彙總筆數與歸檔索引對不上的月份
+    (第一次建立、或紀錄被改寫到其他月份時)。週 / 月彙總只重算涵蓋這些日子的桶。
+    """
+    if manifest is None:
+        manifest = archive_store.load_manifest()
+    if index is None:
+        index = archive_store.read_archive(columns=['uuid', 'date'], manifest=manifest)
+        index = index.assign(month=archive_store._month_keys(index['date']).values)
+    rollups = load_rollups(path)
+    daily = rollups["daily"]
+
+    counts = index['month'].value_counts().to_dict() if not index.empty else {}
+    existing = _month_counts(daily)
+    todo = {m for m in touched_months if m in counts}
+    todo.update(m for m, rows in counts.items() if existing.get(m) != rows)
+    todo.update(m for m in existing if m not in counts)
+    if not todo:
+        return {"months": [], "days": 0}
+
+    changed_days = {day for day in daily if day[:7] in todo}
+    for day in changed_days:
+        del daily[day]
+
+    months = sorted(m for m in todo if m in counts)
+    if months:
+        df = archive_store.read_archive(months=months, columns=ROLLUP_COLUMNS, manifest=manifest)
+        if 'uuid' in df.columns and 'uuid' in index.columns:
+            # 與 JSON 分片相同：同一 uuid 只計入它最終所屬的月份
+            owned = set(index.loc[index['month'].isin(months), 'uuid'].dropna())
+            df = df[df['uuid'].isna() | df['uuid'].isin(owned)]
+        fresh = daily_buckets(df)
+        daily.update(fresh)
+        changed_days.update(fresh)
+
+    for granularity, key_fn in (("weekly", week_key), ("monthly", lambda day: day[:7])):
+        keys = {key_fn(day) for day in changed_days}
+        members = {}
+        for day, bucket in daily.items():
+            key = key_fn(day)
+            if key in keys:
+                members.setdefault(key, []).append(bucket)
+        table = rollups[granularity]
+        for key in keys:
+            if key in members:
+                table[key] = _combine(members[key])
+            else:
+                table.pop(key, None)
+
+    for granularity in GRANULARITIES:
+        rollups[granularity] = dict(sorted(rollups[granularity].items()))
+    save_rollups(rollups, path)
+    return {"months": sorted(todo), "days": len(changed_days)}
+
+
+def series(granularity="daily", start=None, end=None, rollups=None):
+    """依時間排序回傳 [(鍵, 彙總)]，start / end 為含端點的鍵 (例如 '2024-01-01'、'2024-W05'、'2024-01')"""
+    if rollups is None:
+        rollups = load_rollups()
+    return [(key, bucket) for key, bucket in sorted(rollups.get(granularity, {}).items())
+            if (start is None or key >= start) and (end is None or key <= end)]
+
+
+def top_tags(buckets, limit=10):
+    counts = {}
+    for _, bucket in buckets:
+        for tag, n in bucket["tags"].items():
+            counts[tag] = counts.get(tag, 0) + n
+    return sorted(counts.items(), key=lambda kv: (-kv[1], kv[0]))[:limit]
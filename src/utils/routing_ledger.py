@@ -0,0 +1,67 @@
+import os
+import re
+import json
+
+# 定義路徑
+LEDGER_PATH = "data/archive/routing_ledger.json"
+
+LEDGER_VERSION = 1
+
+# classify_inbox 寫入的段落標頭: "### 2026-01-21 (Ref: 1a2b3c4d)"
+REF_PATTERN = re.compile(r"^### .*\(Ref: ([^)\s]+)\)\s*$", re.MULTILINE)
+
+
+class RoutingLedger:
+    """
+    持久化的路由帳本：記錄「uuid X 已寫入檔案 Y」。
+    查詢為 O(1)，不論目標 Markdown 檔案多大都正確 (取代讀取檔尾的比對方式)。
+    """
+
+    def __init__(self, path=LEDGER_PATH):
+        self.path = path
+        self.reload()
+
+    def reload(self):
+        """重新讀取磁碟上的帳本 (持有 routing 鎖後呼叫，看到其他 worker 已寫入的紀錄)"""
+        self._files = {}
+        self._dirty = False
+        if os.path.exists(self.path):
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self._files = {k: set(v) for k, v in data.get("files", {}).items()}
+
+    @staticmethod
+    def _key(filepath):
+        return os.path.normpath(filepath).replace(os.sep, '/')
+
+    def _entries_for(self, filepath):
+        key = self._key(filepath)
+        if key not in self._files:
+            # 第一次遇到帳本外的既有檔案：完整掃描一次標頭作為初始資料
+            seeded = set()
+            if os.path.exists(filepath):
+                with open(filepath, 'r', encoding='utf-8') as f:
+                    seeded.update(REF_PATTERN.findall(f.read()))
+            self._files[key] = seeded
+            self._dirty = True
+        return self._files[key]
+
+    def has(self, filepath, source_uuid):
+        return str(source_uuid) in self._entries_for(filepath)
+
+    def add(self, filepath, source_uuid):
+        self._entries_for(filepath).add(str(source_uuid))
+        self._dirty = True
+
+    def save(self):
+        if not self._dirty:
+            return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                "version": LEDGER_VERSION,
+                "files": {k: sorted(v) for k, v in sorted(self._files.items())},
+            }, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, self.path)
+        self._dirty = False
@@ -0,0 +1,299 @@
+import os
+import json
+import datetime
+import numpy as np
+from src.utils import embedding_store
+
+# 定義路徑
+NEIGHBORS_PATH = "data/archive/neighbors.json"
+
+DEFAULT_K = 10
+QUERY_BATCH_SIZE = 1024
+# 每批分數矩陣最多 32M 個 float32 (約 128MB)
+MAX_SCORE_CELLS = 32 * 1024 * 1024
+# int8 掃描時每次轉成 float32 的列數 (768 維約 12MB)
+SCAN_ROWS = 4096
+EMBEDDING_MODEL = "text-embedding-004"
+
+
+def load_normalized_matrix(index=None, root=embedding_store.EMBEDDING_DIR):
+    """載入歸檔向量並做 L2 正規化，回傳 (uuids, matrix)；內積即為 cosine 相似度"""
+    if index is None:
+        index = embedding_store.load_index(root)
+    raw = embedding_store.open_matrix(index, root=root)
+    matrix = np.array(raw, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    matrix /= norms
+    return list(index["uuids"]), matrix
+
+
+class Int8Matrix:
+    """
+    int8 量化的歸檔矩陣 (見 embedding_store.quantize)。
+    分數直接由 codes 計算：query · codes 逐塊轉 float32 相乘，再乘上每列 scale，不還原整個 float32 矩陣。
+    以列切片取用時回傳還原後的向量 (作為 query)。
+    """
+
+    def __init__(self, codes, scales):
+        self.codes = codes
+        self.scales = np.asarray(scales, dtype=np.float32)
+
+    @property
+    def shape(self):
+        return self.codes.shape
+
+    def __len__(self):
+        return self.codes.shape[0]
+
+    def __getitem__(self, rows):
+        return np.atleast_2d(self.codes[rows]).astype(np.float32) * np.atleast_1d(self.scales[rows])[:, None]
+
+    def scores(self, queries):
+        n = self.codes.shape[0]
+        out = np.empty((len(queries), n), dtype=np.float32)
+        for start in range(0, n, SCAN_ROWS):
+            block = self.codes[start:start + SCAN_ROWS].astype(np.float32)
+            np.matmul(queries, block.T, out=out[:, start:start + SCAN_ROWS])
+        out *= self.scales
+        return out
+
+
+def load_search_matrix(index=None, root=embedding_store.EMBEDDING_DIR):
+    """啟用量化且 int8 副本完整時使用 Int8Matrix，否則載入 float32 矩陣"""
+    if index is None:
+        index = embedding_store.load_index(root)
+    if embedding_store.QUANTIZE and index["count"] and index.get("quantized") == index["count"]:
+        codes, scales = embedding_store.open_quantized(index, root=root)
+        return list(index["uuids"]), Int8Matrix(np.array(codes), np.array(scales))
+    return load_normalized_matrix(index, root)
+
+
+def normalize(vectors):
+    vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def top_k(matrix, queries, k=DEFAULT_K, exclude_rows=None, batch_size=QUERY_BATCH_SIZE):
+    """
+    批次矩陣乘法 + argpartition 部分排序。
+    matrix: float32 矩陣或 Int8Matrix；queries: (q, dim) 已正規化；exclude_rows: 每個 query 要排除的列 (例如自己)，可為 None。
+    回傳 [(rows, scores), ...]，依分數由高到低。
+    """
+    n = matrix.shape[0]
+    results = []
+    if n == 0:
+        return [(np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)) for _ in range(len(queries))]
+
+    batch_size = max(1, min(batch_size, MAX_SCORE_CELLS // n))
+    for start in range(0, len(queries), batch_size):
+        batch = queries[start:start + batch_size]
+        scores = matrix.scores(batch) if isinstance(matrix, Int8Matrix) else batch @ matrix.T
+        if exclude_rows is not None:
+            for offset, row in enumerate(exclude_rows[start:start + batch_size]):
+                if row is not None and row >= 0:
+                    scores[offset, row] = -np.inf
+
+        kk = min(k, n)
+        if kk < n:
+            part = np.argpartition(-scores, kk - 1, axis=1)[:, :kk]
+        else:
+            part = np.tile(np.arange(n), (len(batch), 1))
+        part_scores = np.take_along_axis(scores, part, axis=1)
+        order = np.argsort(-part_scores, axis=1, kind='stable')
+        rows = np.take_along_axis(part, order, axis=1)
+        row_scores = np.take_along_axis(part_scores, order, axis=1)
+
+        for r, s in zip(rows, row_scores):
+            keep = np.isfinite(s)
+            results.append((r[keep], s[keep]))
+    return results
+
+
+def related_by_uuid(uuid_str, k=DEFAULT_K):
+    uuids, matrix = load_search_matrix()
+    rows = {u: i for i, u in enumerate(uuids)}
+    if uuid_str not in rows:
+        return []
+    row = rows[uuid_str]
+    (hits, scores), = top_k(matrix, matrix[row:row + 1], k, exclude_rows=[row])
+    return [(uuids[i], float(s)) for i, s in zip(hits, scores)]
+
+
+def embed_query(text, client=None):
+    """以 RETRIEVAL_QUERY 任務型別取得查詢向量 (google-genai 延遲載入)"""
+    if client is None:
+        from google import genai
+        api_key = os.getenv("GEMINI_API_KEY")
+        if not api_key:
+            raise ValueError("FATAL: GEMINI_API_KEY is not set.")
+        client = genai.Client(api_key=api_key)
+    resp = client.models.embed_content(
+        model=EMBEDDING_MODEL,
+        contents=text,
+        config={'task_type': 'RETRIEVAL_QUERY'}
+    )
+    return resp.embeddings[0].values
+
+
+def related_by_text(text, k=DEFAULT_K, client=None):
+    uuids, matrix = load_search_matrix()
+    query = normalize(embed_query(text, client))
+    if query.shape[1] != matrix.shape[1]:
+        raise ValueError(f"Query dim {query.shape[1]} != archive dim {matrix.shape[1]}")
+    (hits, scores), = top_k(matrix, query, k)
+    return [(uuids[i], float(s)) for i, s in zip(hits, scores)]
+
+
+def related_chunks_by_text(text, k=DEFAULT_K, client=None):
+    """
+    段落層級檢索：在段落向量中找最相近的段落，每篇紀錄只保留最高分的段落。
+    回傳 [(uuid, score, 段落標題)]。
+    """
+    keys, matrix = load_search_matrix(root=embedding_store.CHUNK_DIR)
+    if not keys:
+        return []
+    headings = embedding_store.load_chunk_headings()
+    query = normalize(embed_query(text, client))
+    if query.shape[1] != matrix.shape[1]:
+        raise ValueError(f"Query dim {query.shape[1]} != chunk dim {matrix.shape[1]}")
+    # 同一篇的多個段落可能同時上榜，多取一些候選再依紀錄去重
+    (hits, scores), = top_k(matrix, query, k * 4)
+    results = {}
+    for row, score in zip(hits, scores):
+        uuid_str, _, position = keys[row].rpartition('#')
+        titles = headings.get(uuid_str, [])
+        if not position.isdigit() or int(position) >= len(titles) or uuid_str in results:
+            continue
+        results[uuid_str] = (uuid_str, float(score), titles[int(position)])
+    return list(results.values())[:k]
+
+
+def compute_neighbors(k=DEFAULT_K, batch_size=QUERY_BATCH_SIZE):
+    """每筆歸檔的 top-k 近鄰 (排除自己)，回傳 {uuid: [(uuid, score), ...]}"""
+    uuids, matrix = load_search_matrix()
+    hits = top_k(matrix, matrix, k, exclude_rows=list(range(len(uuids))), batch_size=batch_size)
+    return {
+        uuids[i]: [(uuids[r], float(s)) for r, s in zip(rows, scores)]
+        for i, (rows, scores) in enumerate(hits)
+    }
+
+
+def _score_batches(matrix, rows, batch_size=QUERY_BATCH_SIZE):
+    """依序產生 (起始位置, 分數矩陣)：rows 這些列對整個矩陣的分數，每批不超過 MAX_SCORE_CELLS"""
+    n = matrix.shape[0]
+    batch_size = max(1, min(batch_size, MAX_SCORE_CELLS // max(n, 1)))
+    for start in range(0, len(rows), batch_size):
+        batch = matrix[np.asarray(rows[start:start + batch_size])]
+        yield start, matrix.scores(batch) if isinstance(matrix, Int8Matrix) else batch @ matrix.T
+
+
+def update_neighbors(previous, changed, k=DEFAULT_K, batch_size=QUERY_BATCH_SIZE):
+    """
+    增量更新近鄰清單：只對 changed (新增或向量改變的 uuid) 計算分數，O(c·n·d) 而不是 O(n²·d)。
+    previous: {uuid: [(uuid, score), ...]} (上次的結果)；回傳與 compute_neighbors 相同格式。
+    - changed 的列：整列 top-k。
+    - 其他列：移除指向 changed / 已不存在 uuid 的舊分數，併入 changed 的新分數後取 top-k。
+      只有「舊清單中被移除的鄰居掉出 top-k」時才無法確定第 k 名之後的順序，這些列整列重算。
+    """
+    uuids, matrix = load_search_matrix()
+    n = len(uuids)
+    rows = {u: i for i, u in enumerate(uuids)}
+    changed_rows = sorted({rows[u] for u in changed if u in rows} | {i for i, u in enumerate(uuids) if u not in previous})
+    changed_set = {uuids[i] for i in changed_rows}
+
+    # changed 列對每一欄的前 k 名候選 (每批合併，不保留完整的 c x n 分數)
+    kk = min(k, len(changed_rows))
+    cand_rows = np.empty((0, n), dtype=np.int64)
+    cand_scores = np.empty((0, n), dtype=np.float32)
+    result = {}
+    for start, scores in _score_batches(matrix, changed_rows, batch_size):
+        batch_rows = np.asarray(changed_rows[start:start + len(scores)])
+        scores[np.arange(len(scores)), batch_rows] = -np.inf
+
+        for row, row_scores in zip(batch_rows, scores):
+            top = min(k, n)
+            part = np.argpartition(-row_scores, top - 1)[:top] if top < n else np.arange(n)
+            part = part[np.argsort(-row_scores[part], kind='stable')]
+            result[uuids[row]] = [(uuids[r], float(row_scores[r])) for r in part if np.isfinite(row_scores[r])]
+
+        merged_rows = np.concatenate([cand_rows, np.broadcast_to(batch_rows[:, None], scores.shape)])
+        merged_scores = np.concatenate([cand_scores, scores])
+        if len(merged_scores) > kk:
+            keep = np.argpartition(-merged_scores, kk - 1, axis=0)[:kk]
+            merged_rows = np.take_along_axis(merged_rows, keep, axis=0)
+            merged_scores = np.take_along_axis(merged_scores, keep, axis=0)
+        cand_rows, cand_scores = merged_rows, merged_scores
+
+    # 其他列的舊清單只保證是「未改變的列」中的前 len(kept) 名；合併後的第 k 名不低於其中最低分時才確定正確
+    unchanged_pool = n - 1 - len(changed_set)
+    best = cand_scores.max(axis=0) if len(cand_scores) else np.full(n, -np.inf, dtype=np.float32)
+    refill = []
+    for j, uuid_str in enumerate(uuids):
+        if uuid_str in changed_set:
+            continue
+        old = previous.get(uuid_str, [])
+        kept = [(u, s) for u, s in old if u in rows and u not in changed_set]
+        if len(kept) == len(old) == k and best[j] <= kept[-1][1]:
+            result[uuid_str] = kept
+            continue
+        candidates = [(uuids[r], float(s)) for r, s in zip(cand_rows[:, j], cand_scores[:, j]) if np.isfinite(s)]
+        merged = sorted(kept + candidates, key=lambda item: -item[1])[:k]
+        complete = len(kept) >= unchanged_pool or (
+            len(merged) == k and kept and merged[-1][1] >= min(s for _, s in kept))
+        if complete:
+            result[uuid_str] = merged
+        else:
+            refill.append(j)
+
+    if refill:
+        for j, (hits, scores) in zip(refill, top_k(matrix, matrix[np.asarray(refill)], k, exclude_rows=refill, batch_size=batch_size)):
+            result[uuids[j]] = [(uuids[r], float(s)) for r, s in zip(hits, scores)]
+    return {u: result[u] for u in uuids}
+
+
+def load_neighbors(path=NEIGHBORS_PATH):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_neighbors(uuid_to_date, k=DEFAULT_K, path=NEIGHBORS_PATH, changed=None):
+    """
+    預先計算近鄰清單給前端讀取，取代瀏覽器端 O(n²) 的 tag 比對。
+    changed 為本次新增 / 改寫的 uuid 時，沿用上次的結果只做增量更新；
+    沒有上次的結果或設定 (k、模型、是否 int8) 改變時整份重算。
+    """
+    quantized = bool(embedding_store.QUANTIZE)
+    previous = load_neighbors(path) if changed is not None else None
+    if previous and previous.get("k") == k and previous.get("model") == EMBEDDING_MODEL \
+            and previous.get("quantized", False) == quantized and isinstance(previous.get("entries"), dict):
+        old = {u: [(hit[0], hit[2]) for hit in e.get("neighbors", [])] for u, e in previous["entries"].items()}
+        neighbors = update_neighbors(old, set(changed), k)
+    else:
+        neighbors = compute_neighbors(k)
+
+    entries = {}
+    for uuid_str, hits in neighbors.items():
+        entries[uuid_str] = {
+            "date": uuid_to_date.get(uuid_str),
+            "neighbors": [[u, uuid_to_date.get(u), round(s, 4)] for u, s in hits],
+        }
+    payload = {
+        "k": k,
+        "model": EMBEDDING_MODEL,
+        "quantized": quantized,
+        "generated": datetime.datetime.now().isoformat(timespec='seconds'),
+        "entries": entries,
+    }
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # json.dumps 一次編碼走 C 編碼器 (json.dump 逐段寫入時是純 Python，數萬筆時慢數倍)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(json.dumps(payload, ensure_ascii=False, separators=(',', ':')))
+    os.replace(tmp_path, path)
+    return len(entries)
@@ -0,0 +1,301 @@
+import os
+import json
+import bisect
+import heapq
+import itertools
+import datetime
+import pandas as pd
+from src.utils.analytics import flat_columns
+
+# 定義路徑
+GRAPH_PATH = "data/archive/tag_graph.json"
+
+# v2: 另存每個標籤組合的相關清單，載入時不必重算
+GRAPH_VERSION = 2
+
+# 每筆紀錄保留的相關紀錄數
+DEFAULT_RELATED = 10
+
+
+def entry_keys(df):
+    """紀錄鍵：uuid (與歸檔去重規則一致)，沒有 uuid 時退回日期"""
+    dates = pd.to_datetime(df['date'], errors='coerce').dt.strftime('%Y-%m-%d').fillna('1970-01-01')
+    if 'uuid' in df.columns:
+        keys = [str(u) if pd.notna(u) else d for u, d in zip(df['uuid'].values, dates.values)]
+    else:
+        keys = list(dates.values)
+    return keys, list(dates.values)
+
+
+def _clean_tags(tags):
+    seen = []
+    for t in tags:
+        t = str(t).strip()
+        if t and t not in seen:
+            seen.append(t)
+    return sorted(seen)
+
+
+def _neg_date(date):
+    # 'YYYY-MM-DD' -> 可排序的負值，讓較新的日期排在前面
+    return -int(date.replace('-', '')) if date[:4].isdigit() else 0
+
+
+class TagGraph:
+    """
+    標籤共現圖：標籤節點 (出現次數)、加權共現邊、每筆紀錄的相關紀錄清單。
+
+    相關紀錄依「共用標籤數 → 較新 → 鍵」排序。排序只取決於標籤組合 (signature)，
+    因此以組合為單位維護一份前 k+1 名清單 (多一名留給自己)，
+    新紀錄只需與共用標籤的組合比較門檻，不必掃描所有紀錄。
+    重算清單時，共用 2 個以上標籤的組合由標籤對索引取得，共用 1 個標籤的部分
+    直接依新舊合併各標籤的紀錄清單，取滿即停。
+    """
+
+    def __init__(self, path=GRAPH_PATH, k=DEFAULT_RELATED):
+        self.path = path
+        self.k = k
+        self.entries = {}
+        self.tag_counts = {}
+        self.edges = {}
+        self._order = {}
+        self._members = {}
+        self._tag_sigs = {}
+        self._pair_sigs = {}
+        self._tag_members = {}
+        self._ranked_members = {}
+        self._ranked_tags = {}
+        self._sig_related = {}
+        self.exists = os.path.exists(path)
+        if self.exists:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self.k = data.get("k", k)
+            for key, item in data.get("entries", {}).items():
+                self._insert(key, {"date": item["date"], "tags": item["tags"]})
+            if data.get("version") == GRAPH_VERSION:
+                self._restore_related(data.get("signatures", []))
+            # 舊版檔案 (沒有組合清單) 或清單缺漏的組合才重算
+            for sig in self._members:
+                if sig not in self._sig_related:
+                    self._sig_related[sig] = self._compute_related(sig)
+
+    def _restore_related(self, saved):
+        """載入存檔的組合清單；列出已不存在紀錄的清單略過 (交給重算)"""
+        order = self._order
+        for tags, items in saved:
+            sig = tuple(tags)
+            if sig not in self._members:
+                continue
+            try:
+                # 存檔時已依排序寫出
+                self._sig_related[sig] = [(-shared, order[key], key) for key, shared in items]
+            except KeyError:
+                continue
+
+    # --- 計數與索引 ---
+
+    def _insert(self, key, entry):
+        self.entries[key] = entry
+        self._order[key] = _neg_date(entry["date"])
+        tags = entry["tags"]
+        for i, tag in enumerate(tags):
+            self.tag_counts[tag] = self.tag_counts.get(tag, 0) + 1
+            for other in tags[i + 1:]:
+                self.edges[(tag, other)] = self.edges.get((tag, other), 0) + 1
+        for tag in tags:
+            self._tag_members.setdefault(tag, set()).add(key)
+            self._ranked_tags.pop(tag, None)
+        if tags:
+            sig = tuple(tags)
+            if sig not in self._members:
+                self._members[sig] = set()
+                for tag in sig:
+                    self._tag_sigs.setdefault(tag, set()).add(sig)
+                for pair in itertools.combinations(sig, 2):
+                    self._pair_sigs.setdefault(pair, set()).add(sig)
+            self._members[sig].add(key)
+            self._ranked_members.pop(sig, None)
+
+    def _remove(self, key):
+        entry = self.entries.pop(key)
+        del self._order[key]
+        tags = entry["tags"]
+        for i, tag in enumerate(tags):
+            self.tag_counts[tag] -= 1
+            if not self.tag_counts[tag]:
+                del self.tag_counts[tag]
+            for other in tags[i + 1:]:
+                self.edges[(tag, other)] -= 1
+                if not self.edges[(tag, other)]:
+                    del self.edges[(tag, other)]
+        for tag in tags:
+            self._tag_members[tag].discard(key)
+            self._ranked_tags.pop(tag, None)
+            if not self._tag_members[tag]:
+                del self._tag_members[tag]
+        if tags:
+            sig = tuple(tags)
+            self._members[sig].discard(key)
+            self._ranked_members.pop(sig, None)
+            if not self._members[sig]:
+                del self._members[sig]
+                self._sig_related.pop(sig, None)
+                for tag in sig:
+                    self._tag_sigs[tag].discard(sig)
+                    if not self._tag_sigs[tag]:
+                        del self._tag_sigs[tag]
+                for pair in itertools.combinations(sig, 2):
+                    self._pair_sigs[pair].discard(sig)
+                    if not self._pair_sigs[pair]:
+                        del self._pair_sigs[pair]
+
+    # --- 相關紀錄 ---
+
+    def _rank_keys(self, keys):
+        return sorted(((self._order[key], key) for key in keys))
+
+    def _ranked(self, sig):
+        """組合內的紀錄依新舊排序 (快取到成員改變為止)"""
+        ranked = self._ranked_members.get(sig)
+        if ranked is None:
+            ranked = [key for _, key in self._rank_keys(self._members[sig])]
+            self._ranked_members[sig] = ranked
+        return ranked
+
+    def _ranked_tag(self, tag):
+        """含此標籤的紀錄依新舊排序，元素為 (排序值, 鍵)"""
+        ranked = self._ranked_tags.get(tag)
+        if ranked is None:
+            ranked = self._rank_keys(self._tag_members[tag])
+            self._ranked_tags[tag] = ranked
+        return ranked
+
+    def _overlaps(self, sig):
+        overlaps = {}
+        for tag in sig:
+            for other in self._tag_sigs.get(tag, ()):
+                overlaps[other] = overlaps.get(other, 0) + 1
+        return overlaps
+
+    def _compute_related(self, sig):
+        """由共用標籤數最高的組合開始合併，湊滿 k+1 名即停止"""
+        limit = self.k + 1
+        tags = set(sig)
+        by_level = {}
+        others = set()
+        for pair in itertools.combinations(sig, 2):
+            others.update(self._pair_sigs.get(pair, ()))
+        for other in others:
+            by_level.setdefault(len(tags.intersection(other)), []).append(other)
+
+        result = []
+        for shared in sorted(by_level, reverse=True):
+            candidates = []
+            for other in by_level[shared]:
+                candidates.extend((-shared, self._order[key], key) for key in self._ranked(other)[:limit - len(result)])
+            candidates.sort()
+            result.extend(candidates[:limit - len(result)])
+            if len(result) >= limit:
+                return result
+
+        # 只共用 1 個標籤：共用更多者此時都已在清單中，依新舊取到滿為止
+        taken = {item[2] for item in result}
+        for order, key in heapq.merge(*(self._ranked_tag(tag) for tag in sig)):
+            if key in taken:
+                continue
+            taken.add(key)
+            result.append((-1, order, key))
+            if len(result) >= limit:
+                break
+        return result
+
+    def _offer(self, sig, key, shared):
+        """把 key 放入組合的清單 (若排得進前 k+1 名)"""
+        ranked = self._sig_related.setdefault(sig, [])
+        item = (-shared, self._order[key], key)
+        if len(ranked) > self.k and item >= ranked[-1]:
+            return
+        bisect.insort(ranked, item)
+        del ranked[self.k + 1:]
+
+    def related_for(self, key):
+        tags = self.entries[key]["tags"]
+        if not tags:
+            return []
+        return [(other, -neg) for neg, _, other in self._sig_related.get(tuple(tags), []) if other != key][:self.k]
+
+    def update(self, df):
+        """
+        合併新紀錄 (同一鍵以最後一筆為準)。回傳實際新增或改變的紀錄數。
+        """
+        if df.empty:
+            return 0
+        keys, dates = entry_keys(df)
+        tags = flat_columns(df, ['entry_tags'])['entry_tags'].values
+
+        incoming = {}
+        for key, date, entry_tags in zip(keys, dates, tags):
+            incoming[key] = {"date": date, "tags": _clean_tags(entry_tags)}
+
+        changed = []
+        modified = set()
+        for key, entry in incoming.items():
+            old = self.entries.get(key)
+            if old == entry:
+                continue
+            if old is not None:
+                self._remove(key)
+                modified.add(key)
+            self._insert(key, entry)
+            changed.append(key)
+
+        if len(changed) >= len(self._members):
+            # 大批匯入 (含第一次建立)：整體重算比逐筆比較門檻便宜
+            stale = set(self._members)
+        else:
+            # 既有紀錄改變：所有列出它的清單都需要重算；新出現的組合也需要完整計算
+            stale = {sig for sig, ranked in self._sig_related.items() if any(item[2] in modified for item in ranked)}
+            stale.update(tuple(self.entries[key]["tags"]) for key in changed
+                         if self.entries[key]["tags"] and tuple(self.entries[key]["tags"]) not in self._sig_related)
+            stale &= set(self._members)
+
+            for key in changed:
+                sig = tuple(self.entries[key]["tags"])
+                if not sig:
+                    continue
+                for other, shared in self._overlaps(sig).items():
+                    if other not in stale:
+                        self._offer(other, key, shared)
+        for sig in stale:
+            self._sig_related[sig] = self._compute_related(sig)
+        return len(changed)
+
+    def to_dict(self):
+        edges = sorted(([a, b, w] for (a, b), w in self.edges.items()), key=lambda e: (-e[2], e[0], e[1]))
+        related = {}
+        for key in self.entries:
+            items = self.related_for(key)
+            if items:
+                related[key] = [[other, self.entries[other]["date"], shared] for other, shared in items]
+        signatures = [[list(sig), [[key, -neg] for neg, _, key in ranked]]
+                      for sig, ranked in sorted(self._sig_related.items()) if sig in self._members]
+        return {
+            "version": GRAPH_VERSION,
+            "generated": datetime.datetime.now().isoformat(timespec='seconds'),
+            "k": self.k,
+            "tags": dict(sorted(self.tag_counts.items(), key=lambda kv: (-kv[1], kv[0]))),
+            "edges": edges,
+            "entries": self.entries,
+            "related": related,
+            "signatures": signatures,
+        }
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        # json.dumps 一次編碼走 C 編碼器 (json.dump 逐段寫入時是純 Python)
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(json.dumps(self.to_dict(), ensure_ascii=False, separators=(',', ':')))
+        os.replace(tmp_path, self.path)
+        self.exists = True
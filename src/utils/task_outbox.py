@@ -0,0 +1,113 @@
+import os
+import re
+import json
+import hashlib
+import datetime
+
+# 定義路徑
+OUTBOX_PATH = "data/archive/task_outbox.jsonl"
+
+PENDING = "pending"
+SENT = "sent"
+FAILED = "failed"
+
+# 失敗超過此次數後不再自動重送 (仍保留在 outbox 供人工檢查)
+MAX_ATTEMPTS = 5
+
+
+def normalize_task_text(text):
+    """正規化任務文字：去除 checkbox/項目符號、統一大小寫與空白"""
+    text = str(text or "")
+    text = re.sub(r"^\s*(?:[-*]\s*)?(?:\[\s*[xX ]?\s*\]\s*)?", "", text)
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+
+def task_id(entry_uuid, task_text):
+    """穩定的任務 id：entry uuid + 正規化任務文字"""
+    raw = f"{entry_uuid}\x1f{normalize_task_text(task_text)}"
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()[:16]
+
+
+class TaskOutbox:
+    """
+    持久化的任務 Outbox (append-only JSONL 事件紀錄)。
+    每次狀態變化立即落地一行，程式中斷後重新載入即可從中斷處繼續。
+    """
+
+    def __init__(self, path=OUTBOX_PATH):
+        self.path = path
+        self.records = {}
+        self._lines = 0
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        event = json.loads(line)
+                    except ValueError:
+                        # 中斷時寫了一半的最後一行
+                        continue
+                    self._apply(event)
+                    self._lines += 1
+
+    def _apply(self, event):
+        record = self.records.get(event["id"])
+        if record is None:
+            record = {"id": event["id"], "uuid": None, "payload": None, "state": PENDING, "attempts": 0, "error": None}
+            self.records[event["id"]] = record
+        for field in ("uuid", "payload", "state", "attempts", "error", "updated"):
+            if field in event:
+                record[field] = event[field]
+
+    def _append(self, event):
+        event["updated"] = datetime.datetime.now().isoformat(timespec='seconds')
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(event, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self._lines += 1
+        self._apply(event)
+
+    def enqueue(self, entry_uuid, task_text, payload):
+        """登記任務；已存在的 id 不會重複加入 (不論狀態)"""
+        tid = task_id(entry_uuid, task_text)
+        if tid not in self.records:
+            self._append({"id": tid, "uuid": entry_uuid, "payload": payload, "state": PENDING, "attempts": 0})
+            return True
+        return False
+
+    def pending(self):
+        """尚未送達的任務 (pending，或失敗次數未達上限的 failed)"""
+        return [
+            r for r in self.records.values()
+            if r["state"] == PENDING or (r["state"] == FAILED and r["attempts"] < MAX_ATTEMPTS)
+        ]
+
+    def mark(self, tid, ok, error=None):
+        record = self.records[tid]
+        self._append({
+            "id": tid,
+            "state": SENT if ok else FAILED,
+            "attempts": record["attempts"] + 1,
+            "error": None if ok else error,
+        })
+
+    def counts(self):
+        counts = {PENDING: 0, SENT: 0, FAILED: 0}
+        for r in self.records.values():
+            counts[r["state"]] = counts.get(r["state"], 0) + 1
+        return counts
+
+    def compact(self):
+        """事件紀錄過長時改寫為每個任務一行的快照"""
+        if self._lines <= 2 * max(len(self.records), 1):
+            return
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for record in self.records.values():
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        os.replace(tmp_path, self.path)
+        self._lines = len(self.records)